@@ -0,0 +1,74 @@
+"""compress version payload columns
+
+Revision ID: 4f8a2b6e1c93
+Revises: 9b1e4c2d7f60
+Create Date: 2026-10-19 11:48:05.274113
+"""
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '4f8a2b6e1c93'
+down_revision = '9b1e4c2d7f60'
+branch_labels = None
+depends_on = None
+
+# Header layout mirrors app/compression.py at the time of this revision.
+MAGIC = b"\x00"
+RAW = b"r"
+ZLIB = b"z"
+MIN_COMPRESS_BYTES = 128
+
+TABLES = (
+    ("agreement_versions", ("data_json", "sla_items_json")),
+    ("proposal_versions", ("data_json", "requirements_json", "attachments_json")),
+)
+
+
+def _compress(value):
+    data = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+    if data.startswith(MAGIC):
+        return data
+    if len(data) < MIN_COMPRESS_BYTES:
+        return MAGIC + RAW + data
+    return MAGIC + ZLIB + zlib.compress(data, 6)
+
+
+def _decompress(value):
+    if isinstance(value, str):
+        return value
+    data = bytes(value)
+    if data.startswith(MAGIC + ZLIB):
+        data = zlib.decompress(data[2:])
+    elif data.startswith(MAGIC + RAW):
+        data = data[2:]
+    elif data.startswith(MAGIC):
+        raise RuntimeError("Decompress zstd payloads (VERSION_COMPRESSION=zstd) before downgrading.")
+    return data.decode("utf-8")
+
+
+def _rewrite(table, columns, convert):
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(f"SELECT id, {', '.join(columns)} FROM {table}")).mappings().all()
+    assignments = ", ".join(f"{column} = :{column}" for column in columns)
+    statement = sa.text(f"UPDATE {table} SET {assignments} WHERE id = :id")
+    for row in rows:
+        bind.execute(statement, {"id": row["id"], **{column: convert(row[column]) for column in columns}})
+
+
+def upgrade():
+    for table, columns in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, type_=sa.LargeBinary(), existing_nullable=False)
+        _rewrite(table, columns, _compress)
+
+
+def downgrade():
+    for table, columns in TABLES:
+        _rewrite(table, columns, _decompress)
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, type_=sa.Text(), existing_nullable=False)
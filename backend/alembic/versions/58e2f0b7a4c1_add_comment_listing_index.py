@@ -0,0 +1,33 @@
+"""add comment listing index
+
+Revision ID: 58e2f0b7a4c1
+Revises: d3a7c5e91b28
+Create Date: 2026-10-19 13:05:12.448190
+"""
+from alembic import op
+
+
+revision = '58e2f0b7a4c1'
+down_revision = 'd3a7c5e91b28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_agreement_version_comments_version_field_created',
+        'agreement_version_comments',
+        ['agreement_version_id', 'field_key', 'created_at'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_proposal_version_comments_version_field_created',
+        'proposal_version_comments',
+        ['proposal_version_id', 'field_key', 'created_at'],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_proposal_version_comments_version_field_created', table_name='proposal_version_comments')
+    op.drop_index('ix_agreement_version_comments_version_field_created', table_name='agreement_version_comments')
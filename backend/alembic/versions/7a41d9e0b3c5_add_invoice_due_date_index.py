@@ -0,0 +1,22 @@
+"""add invoice due date index
+
+Revision ID: 7a41d9e0b3c5
+Revises: 0e77c50c92f1
+Create Date: 2026-10-19 10:02:17.530611
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '7a41d9e0b3c5'
+down_revision = '0e77c50c92f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_invoices_due_date_status', 'invoices', ['due_date', 'status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_invoices_due_date_status', table_name='invoices')
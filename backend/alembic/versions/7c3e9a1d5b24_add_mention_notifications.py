@@ -0,0 +1,54 @@
+"""add mention notifications
+
+Revision ID: 7c3e9a1d5b24
+Revises: 58e2f0b7a4c1
+Create Date: 2026-10-19 14:20:41.905337
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '7c3e9a1d5b24'
+down_revision = '58e2f0b7a4c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'notifications',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('entity_type', sa.String(length=30), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('version_id', sa.Integer(), nullable=False),
+        sa.Column('comment_id', sa.Integer(), nullable=False),
+        sa.Column('field_key', sa.String(length=200), nullable=False),
+        sa.Column('excerpt', sa.Text(), nullable=False),
+        sa.Column('actor_user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('read_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['actor_user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_notifications_id'), 'notifications', ['id'], unique=False)
+    op.create_index(
+        'ix_notifications_user_read_created',
+        'notifications',
+        ['user_id', 'read_at', 'created_at'],
+        unique=False,
+    )
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(
+            sa.Column('unread_notifications', sa.Integer(), server_default='0', nullable=False)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('unread_notifications')
+    op.drop_index('ix_notifications_user_read_created', table_name='notifications')
+    op.drop_index(op.f('ix_notifications_id'), table_name='notifications')
+    op.drop_table('notifications')
@@ -0,0 +1,129 @@
+"""delta encode agreement and proposal versions
+
+Revision ID: 9b1e4c2d7f60
+Revises: 7a41d9e0b3c5
+Create Date: 2026-10-19 11:02:17.530912
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '9b1e4c2d7f60'
+down_revision = '7a41d9e0b3c5'
+branch_labels = None
+depends_on = None
+
+# Mirrors app/versioning.py at the time of this revision.
+CHECKPOINT_INTERVAL = 20
+TABLES = (
+    ("agreement_versions", "agreement_id", ("data_json",), ("sla_items_json",)),
+    ("proposal_versions", "proposal_id", ("data_json",), ("requirements_json", "attachments_json")),
+)
+
+
+def _dump(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _encode(previous, snapshot, record_columns, list_columns):
+    values = {}
+    for column in record_columns:
+        old, new = previous[column], snapshot[column]
+        delta = {}
+        changed = {key: value for key, value in new.items() if key not in old or old[key] != value}
+        removed = [key for key in old if key not in new]
+        if changed:
+            delta["set"] = changed
+        if removed:
+            delta["unset"] = removed
+        values[column] = _dump(delta)
+    for column in list_columns:
+        values[column] = "null" if snapshot[column] == previous[column] else _dump(snapshot[column])
+    return values
+
+
+def _apply(state, row, record_columns, list_columns):
+    state = dict(state)
+    for column in record_columns:
+        delta = json.loads(row[column])
+        record = dict(state[column])
+        record.update(delta.get("set", {}))
+        for key in delta.get("unset", []):
+            record.pop(key, None)
+        state[column] = record
+    for column in list_columns:
+        value = json.loads(row[column])
+        if value is not None:
+            state[column] = value
+    return state
+
+
+def _rows(bind, table, parent_column, columns):
+    return bind.execute(
+        sa.text(
+            f"SELECT id, {parent_column} AS parent_id, is_checkpoint, {', '.join(columns)} "
+            f"FROM {table} ORDER BY {parent_column}, version_number"
+        )
+    ).mappings()
+
+
+def _update(bind, table, row_id, values):
+    assignments = ", ".join(f"{column} = :{column}" for column in values)
+    bind.execute(sa.text(f"UPDATE {table} SET {assignments} WHERE id = :id"), {**values, "id": row_id})
+
+
+def _compact(bind, table, parent_column, record_columns, list_columns):
+    columns = record_columns + list_columns
+    parent_id = None
+    previous = None
+    since_checkpoint = 0
+    for row in list(_rows(bind, table, parent_column, columns)):
+        snapshot = {column: json.loads(row[column] or ("{}" if column in record_columns else "[]")) for column in columns}
+        if row["parent_id"] != parent_id or since_checkpoint >= CHECKPOINT_INTERVAL:
+            parent_id = row["parent_id"]
+            since_checkpoint = 0
+        elif previous is not None:
+            values = _encode(previous, snapshot, record_columns, list_columns)
+            values["is_checkpoint"] = False
+            _update(bind, table, row["id"], values)
+        previous = snapshot
+        since_checkpoint += 1
+
+
+def _expand(bind, table, parent_column, record_columns, list_columns):
+    columns = record_columns + list_columns
+    state = None
+    for row in list(_rows(bind, table, parent_column, columns)):
+        if row["is_checkpoint"]:
+            state = {column: json.loads(row[column]) for column in columns}
+            continue
+        state = _apply(state, row, record_columns, list_columns)
+        _update(bind, table, row["id"], {column: _dump(state[column]) for column in columns})
+
+
+def upgrade():
+    for table, parent_column, _record_columns, _list_columns in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(
+                sa.Column("is_checkpoint", sa.Boolean(), nullable=False, server_default=sa.true())
+            )
+        op.create_index(
+            f"ix_{table}_{parent_column.removesuffix('_id')}_version",
+            table,
+            [parent_column, "version_number"],
+            unique=False,
+        )
+    bind = op.get_bind()
+    for table, parent_column, record_columns, list_columns in TABLES:
+        _compact(bind, table, parent_column, record_columns, list_columns)
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table, parent_column, record_columns, list_columns in TABLES:
+        _expand(bind, table, parent_column, record_columns, list_columns)
+        op.drop_index(f"ix_{table}_{parent_column.removesuffix('_id')}_version", table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("is_checkpoint")
@@ -0,0 +1,41 @@
+"""add backup catalog
+
+Revision ID: 9d4b2f6e8a13
+Revises: 7c3e9a1d5b24
+Create Date: 2026-10-19 16:05:12.418306
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '9d4b2f6e8a13'
+down_revision = '7c3e9a1d5b24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'backup_catalog',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=200), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('trigger', sa.String(length=20), nullable=False),
+        sa.Column('parent', sa.String(length=200), nullable=True),
+        sa.Column('requires', sa.JSON(), nullable=True),
+        sa.Column('size_bytes', sa.Integer(), nullable=False),
+        sa.Column('duration_seconds', sa.Float(), nullable=True),
+        sa.Column('checksum', sa.String(length=64), nullable=True),
+        sa.Column('new_objects', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('filename'),
+    )
+    op.create_index(op.f('ix_backup_catalog_id'), 'backup_catalog', ['id'], unique=False)
+    op.create_index(op.f('ix_backup_catalog_created_at'), 'backup_catalog', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_backup_catalog_created_at'), table_name='backup_catalog')
+    op.drop_index(op.f('ix_backup_catalog_id'), table_name='backup_catalog')
+    op.drop_table('backup_catalog')
@@ -0,0 +1,42 @@
+"""add upload blobs
+
+Revision ID: b6e1d8c3f402
+Revises: 9d4b2f6e8a13
+Create Date: 2026-10-19 17:42:03.551920
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'b6e1d8c3f402'
+down_revision = '9d4b2f6e8a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'upload_blobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('file_path', sa.String(length=500), nullable=False),
+        sa.Column('size_bytes', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('file_path'),
+    )
+    op.create_index(op.f('ix_upload_blobs_id'), 'upload_blobs', ['id'], unique=False)
+    op.create_index(op.f('ix_upload_blobs_sha256'), 'upload_blobs', ['sha256'], unique=False)
+    op.create_index(
+        op.f('ix_proposal_attachments_file_path'), 'proposal_attachments', ['file_path'], unique=False
+    )
+    op.create_index(op.f('ix_expense_receipts_file_path'), 'expense_receipts', ['file_path'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_expense_receipts_file_path'), table_name='expense_receipts')
+    op.drop_index(op.f('ix_proposal_attachments_file_path'), table_name='proposal_attachments')
+    op.drop_index(op.f('ix_upload_blobs_sha256'), table_name='upload_blobs')
+    op.drop_index(op.f('ix_upload_blobs_id'), table_name='upload_blobs')
+    op.drop_table('upload_blobs')
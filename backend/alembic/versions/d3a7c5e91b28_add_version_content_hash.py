@@ -0,0 +1,32 @@
+"""add version content hash
+
+Revision ID: d3a7c5e91b28
+Revises: 4f8a2b6e1c93
+Create Date: 2026-10-19 12:20:41.906337
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'd3a7c5e91b28'
+down_revision = '4f8a2b6e1c93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('agreement_versions') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+    with op.batch_alter_table('proposal_versions') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_agreement_versions_agreement_hash', 'agreement_versions', ['agreement_id', 'content_hash'], unique=False)
+    op.create_index('ix_proposal_versions_proposal_hash', 'proposal_versions', ['proposal_id', 'content_hash'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_proposal_versions_proposal_hash', table_name='proposal_versions')
+    op.drop_index('ix_agreement_versions_agreement_hash', table_name='agreement_versions')
+    with op.batch_alter_table('proposal_versions') as batch_op:
+        batch_op.drop_column('content_hash')
+    with op.batch_alter_table('agreement_versions') as batch_op:
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,32 @@
+"""add upload gc columns
+
+Revision ID: e2a7c4b9d615
+Revises: b6e1d8c3f402
+Create Date: 2026-10-19 18:31:47.203114
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'e2a7c4b9d615'
+down_revision = 'b6e1d8c3f402'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('upload_blobs') as batch_op:
+        batch_op.add_column(sa.Column('last_uploaded_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE upload_blobs SET last_uploaded_at = created_at')
+    op.create_index(
+        'ix_upload_blobs_ref_count_uploaded',
+        'upload_blobs',
+        ['ref_count', 'last_uploaded_at'],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_upload_blobs_ref_count_uploaded', table_name='upload_blobs')
+    with op.batch_alter_table('upload_blobs') as batch_op:
+        batch_op.drop_column('last_uploaded_at')
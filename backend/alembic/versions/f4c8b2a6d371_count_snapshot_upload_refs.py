@@ -0,0 +1,68 @@
+"""count version snapshot upload references
+
+Revision ID: f4c8b2a6d371
+Revises: e2a7c4b9d615
+Create Date: 2026-10-19 20:12:09.418326
+"""
+import json
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+revision = 'f4c8b2a6d371'
+down_revision = 'e2a7c4b9d615'
+branch_labels = None
+depends_on = None
+
+# Header layout mirrors app/compression.py at the time of this revision.
+MAGIC = b"\x00"
+RAW = b"r"
+ZLIB = b"z"
+ZSTD = b"s"
+
+
+def _decompress(value):
+    if value is None or isinstance(value, str):
+        return value
+    data = bytes(value)
+    if data.startswith(MAGIC + ZLIB):
+        data = zlib.decompress(data[2:])
+    elif data.startswith(MAGIC + RAW):
+        data = data[2:]
+    elif data.startswith(MAGIC + ZSTD):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed version payloads.")
+        data = zstandard.ZstdDecompressor().decompress(data[2:])
+    return data.decode("utf-8")
+
+
+def _recount(include_snapshots):
+    bind = op.get_bind()
+    expected = {}
+    for table in ('proposal_attachments', 'expense_receipts'):
+        rows = bind.execute(sa.text(f"SELECT file_path, COUNT(id) FROM {table} GROUP BY file_path"))
+        for path, count in rows:
+            expected[path] = expected.get(path, 0) + count
+    if include_snapshots:
+        for (stored,) in bind.execute(sa.text("SELECT attachments_json FROM proposal_versions")):
+            items = json.loads(_decompress(stored) or "null") or []
+            for path in {item["file_path"] for item in items}:
+                expected[path] = expected.get(path, 0) + 1
+    statement = sa.text("UPDATE upload_blobs SET ref_count = :count WHERE id = :id")
+    for blob_id, path in bind.execute(sa.text("SELECT id, file_path FROM upload_blobs")).all():
+        bind.execute(statement, {"id": blob_id, "count": expected.get(path, 0)})
+
+
+def upgrade():
+    _recount(include_snapshots=True)
+
+
+def downgrade():
+    _recount(include_snapshots=False)
@@ -0,0 +1,1039 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Iterator
+from uuid import uuid4
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from . import models, versioning
+from .config import settings
+from .db import SessionLocal, engine
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+logger = logging.getLogger("backups")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+UPLOADS_DIR = BACKEND_DIR / "public" / "uploads"
+BACKUP_DIR = BACKEND_DIR.parent / "backups"
+
+# The online backup copies this many pages per step and releases its read
+# lock in between, so API writes are never held up for the whole copy.
+_SNAPSHOT_PAGES = 1024
+_SNAPSHOT_SHARE = 0.5
+_CHUNK_BYTES = 1024 * 1024
+_MANIFEST = "manifest.json"
+_OBJECTS = "objects"
+
+# Format 2 archives are plain tars whose members are compressed one by one,
+# so content that is already compressed can be stored as-is. Compressed
+# members carry the codec's suffix. Format 1 was a gzip-compressed tar, and
+# older archives have no manifest at all.
+BACKUP_FORMAT = 2
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz")
+_CODEC_SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+# Members are padded to whole blocks, so nothing smaller can shrink.
+_MIN_COMPRESS_BYTES = tarfile.BLOCKSIZE
+_SPOOL_BYTES = 8 * _CHUNK_BYTES
+# Leading bytes of formats that are already compressed.
+_COMPRESSED_SIGNATURES = (
+    b"\xff\xd8\xff",  # JPEG
+    b"\x89PNG",
+    b"GIF8",
+    b"%PDF-",
+    b"PK\x03\x04",  # zip, docx, xlsx
+    b"\x1f\x8b",  # gzip
+    b"\x28\xb5\x2f\xfd",  # zstd
+    b"BZh",
+    b"\xfd7zXZ\x00",
+    b"7z\xbc\xaf\x27\x1c",
+    b"Rar!",
+    b"ID3",  # mp3
+    b"OggS",
+    b"\x1a\x45\xdf\xa3",  # webm, mkv
+)
+_JOB_RETENTION = timedelta(days=1)
+_restore_lock = threading.Lock()
+_SCHEDULER_POLL_SECONDS = 60
+
+Progress = Callable[[str, float], None]
+
+
+@dataclass
+class BackupJob:
+    id: str
+    filename: str
+    status: str = "running"
+    stage: str = "snapshot"
+    progress: float = 0.0
+    size_bytes: int | None = None
+    parent: str | None = None
+    new_objects: int = 0
+    error: str | None = None
+    trigger: str = "manual"
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: datetime | None = None
+
+
+_jobs: dict[str, BackupJob] = {}
+_jobs_lock = threading.RLock()
+_scheduler: threading.Thread | None = None
+_scheduler_stop = threading.Event()
+_last_scheduled_attempt: datetime | None = None
+
+
+def resolve_db_path() -> Path | None:
+    if engine.url.get_backend_name() != "sqlite" or not engine.url.database:
+        return None
+    return Path(engine.url.database).resolve()
+
+
+def backup_filename(reserve: bool = True) -> str:
+    """Pick a name for a new backup.
+
+    Incremental backups refer to their parents by name, so names must never
+    be reused. With ``reserve`` the name is claimed by creating its
+    ``.partial`` file, which build_backup then writes into, so concurrent
+    backups in the same second cannot pick the same name.
+    """
+    stamp = datetime.utcnow().strftime("%Y-%m-%d-%H%M%S")
+    name = f"cms-{stamp}.tar"
+    suffix = 1
+    with _jobs_lock:
+        while True:
+            if not (BACKUP_DIR / name).exists():
+                if not reserve:
+                    return name
+                try:
+                    (BACKUP_DIR / f"{name}.partial").open("xb").close()
+                    return name
+                except FileExistsError:
+                    pass
+            suffix += 1
+            name = f"cms-{stamp}-{suffix}.tar"
+
+
+def stored_archives() -> list[Path]:
+    """Stored backups, newest first."""
+    if not BACKUP_DIR.exists():
+        return []
+    archives = [path for path in BACKUP_DIR.iterdir() if path.is_file() and path.name.endswith(ARCHIVE_SUFFIXES)]
+    return sorted(archives, key=lambda path: path.stat().st_mtime, reverse=True)
+
+
+def backup_codec() -> str:
+    codec = settings.backup_codec
+    if codec == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed; falling back to gzip backup compression.")
+        return "gzip"
+    if codec in ("zstd", "none", "gzip"):
+        return codec
+    logger.warning("Unknown BACKUP_CODEC %r; using gzip backup compression.", codec)
+    return "gzip"
+
+
+def snapshot_database(destination: Path, progress: Callable[[float], None] | None = None):
+    """Copy the live database to ``destination`` and verify the copy."""
+    source_path = resolve_db_path()
+    if source_path is None or not source_path.exists():
+        raise ValueError("Database file not found.")
+
+    def _step(_status, remaining, total):
+        if progress and total:
+            progress((total - remaining) / total)
+
+    source = sqlite3.connect(f"{source_path.as_uri()}?mode=ro", uri=True)
+    try:
+        target = sqlite3.connect(destination)
+        try:
+            source.backup(target, pages=_SNAPSHOT_PAGES, progress=_step)
+            _check_integrity(target, "Database snapshot")
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+
+def _check_integrity(connection: sqlite3.Connection, label: str):
+    result = connection.execute("PRAGMA integrity_check").fetchall()
+    if [row[0] for row in result] != ["ok"]:
+        raise ValueError(f"{label} failed integrity check: {result[0][0]}")
+
+
+def _upload_files() -> list[Path]:
+    if not UPLOADS_DIR.exists():
+        return []
+    return sorted(path for path in UPLOADS_DIR.rglob("*") if path.is_file())
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(archive_path: Path) -> dict | None:
+    """Return the manifest of a backup, or None for legacy/unreadable archives.
+
+    The manifest is the first member, so only the start of the archive is read.
+    """
+    try:
+        with tarfile.open(archive_path, "r:*") as tar:
+            member = tar.next()
+            if member is None or member.name != _MANIFEST:
+                return None
+            return json.loads(tar.extractfile(member).read())
+    except (OSError, tarfile.TarError, ValueError):
+        return None
+
+
+def _latest_stored() -> tuple[str, dict] | None:
+    db = SessionLocal()
+    try:
+        names = [
+            name
+            for (name,) in db.query(models.BackupRecord.filename).order_by(models.BackupRecord.created_at.desc())
+        ]
+    finally:
+        db.close()
+    for name in names:
+        manifest = read_manifest(BACKUP_DIR / name)
+        if manifest is not None:
+            return name, manifest
+    return None
+
+
+def plan_backup(snapshot: Path, incremental: bool = True) -> tuple[dict, dict[str, Path]]:
+    """Build the manifest for a new backup and pick the upload objects it must store.
+
+    Every upload path is listed with its content hash and the archive holding
+    that content: None for this archive, otherwise an ancestor in the chain.
+    Hashes are reused from the latest manifest for files whose size and mtime
+    are unchanged, so a run only reads files that are new or modified. The
+    database snapshot's hash is recorded so restores can verify it.
+    """
+    latest = _latest_stored()
+    cached = latest[1]["uploads"] if latest else {}
+    parent = None
+    depth = 0
+    stored: dict[str, str] = {}
+    if incremental and latest:
+        name, manifest = latest
+        referenced = {entry["archive"] for entry in manifest["uploads"].values() if entry["archive"]}
+        if manifest.get("depth", 0) + 1 < settings.backup_full_every and all(
+            (BACKUP_DIR / archive).exists() for archive in referenced
+        ):
+            parent = name
+            depth = manifest.get("depth", 0) + 1
+            stored = {entry["sha256"]: entry["archive"] or name for entry in manifest["uploads"].values()}
+
+    uploads = {}
+    objects: dict[str, Path] = {}
+    for path in _upload_files():
+        relative = path.relative_to(UPLOADS_DIR).as_posix()
+        stat = path.stat()
+        previous = cached.get(relative)
+        if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+            digest = previous["sha256"]
+        else:
+            digest = _hash_file(path)
+        archive = stored.get(digest)
+        if archive is None:
+            objects.setdefault(digest, path)
+        uploads[relative] = {
+            "sha256": digest,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "archive": archive,
+        }
+    manifest = {
+        "format": BACKUP_FORMAT,
+        "codec": backup_codec(),
+        "created_at": datetime.utcnow().isoformat(),
+        "parent": parent,
+        "depth": depth,
+        "database": {"sha256": _hash_file(snapshot)},
+        "uploads": uploads,
+    }
+    return manifest, objects
+
+
+def _tar_header(name: str, size: int = 0, mtime: float = 0, directory: bool = False) -> bytes:
+    info = tarfile.TarInfo(name)
+    info.type = tarfile.DIRTYPE if directory else tarfile.REGTYPE
+    info.mode = 0o755 if directory else 0o644
+    info.size = size
+    info.mtime = int(mtime)
+    return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+
+def _tar_bytes(name: str, data: bytes) -> Iterator[bytes]:
+    yield _tar_header(name, len(data), datetime.utcnow().timestamp())
+    yield data
+    padding = -len(data) % tarfile.BLOCKSIZE
+    if padding:
+        yield b"\0" * padding
+
+
+def _tar_file(handle, name: str, size: int, mtime: float) -> Iterator[bytes]:
+    yield _tar_header(name, size, mtime)
+    remaining = size
+    while remaining > 0:
+        chunk = handle.read(min(_CHUNK_BYTES, remaining))
+        if not chunk:
+            # The file shrank after it was listed; keep the archive well-formed.
+            chunk = b"\0" * remaining
+        remaining -= len(chunk)
+        yield chunk
+    padding = -size % tarfile.BLOCKSIZE
+    if padding:
+        yield b"\0" * padding
+
+
+def _is_compressed_media(path: Path) -> bool:
+    with path.open("rb") as handle:
+        head = handle.read(16)
+    return (
+        head.startswith(_COMPRESSED_SIGNATURES)
+        or head[4:8] == b"ftyp"  # mp4, mov, heic, avif
+        or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+    )
+
+
+def _compress_file(path: Path, codec: str, size: int):
+    """Compress ``path`` into a spooled temp file; returns None when that would not shrink it."""
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES, prefix="cms-backup-")
+    try:
+        with path.open("rb") as source:
+            if codec == "zstd":
+                compressor = zstandard.ZstdCompressor(level=settings.backup_compression_level, threads=-1)
+                compressor.copy_stream(source, spool, read_size=_CHUNK_BYTES, write_size=_CHUNK_BYTES)
+            else:
+                compressor = zlib.compressobj(settings.backup_compression_level, zlib.DEFLATED, 31)
+                for chunk in iter(lambda: source.read(_CHUNK_BYTES), b""):
+                    spool.write(compressor.compress(chunk))
+                spool.write(compressor.flush())
+    except BaseException:
+        spool.close()
+        raise
+    if spool.tell() >= size:
+        spool.close()
+        return None
+    return spool
+
+
+def _pack_member(path: Path, name: str, codec: str, sniff: bool):
+    """Pick how a member is stored: returns (member name, compressed spool or None)."""
+    size = path.stat().st_size
+    if codec == "none" or size < _MIN_COMPRESS_BYTES or (sniff and _is_compressed_media(path)):
+        return name, None
+    spool = _compress_file(path, codec, size)
+    if spool is None:
+        return name, None
+    return name + _CODEC_SUFFIXES[codec], spool
+
+
+def _tar_members(
+    snapshot: Path,
+    manifest: dict,
+    objects: dict[str, Path],
+    progress: Callable[[float], None] | None = None,
+) -> Iterator[bytes]:
+    codec = manifest.get("codec", "none")
+    members = [(snapshot, "app.db", False)]
+    members.extend((path, f"{_OBJECTS}/{digest}", True) for digest, path in objects.items())
+    total = sum(path.stat().st_size for path, _name, _sniff in members)
+    done = 0
+    yield from _tar_bytes(_MANIFEST, json.dumps(manifest, separators=(",", ":")).encode("utf-8"))
+    # Members are compressed ahead of the writer on a small pool; the window
+    # bounds how many compressed members wait in memory or temp files.
+    window = max(1, settings.backup_workers) * 2
+    remaining = iter(members)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, settings.backup_workers), thread_name_prefix="backup-pack") as pool:
+        try:
+            while True:
+                while len(pending) < window:
+                    member = next(remaining, None)
+                    if member is None:
+                        break
+                    path, name, sniff = member
+                    pending.append((path, pool.submit(_pack_member, path, name, codec, sniff)))
+                if not pending:
+                    break
+                path, future = pending.popleft()
+                name, spool = future.result()
+                stat = path.stat()
+                if spool is None:
+                    with path.open("rb") as handle:
+                        yield from _tar_file(handle, name, stat.st_size, stat.st_mtime)
+                else:
+                    with spool:
+                        size = spool.tell()
+                        spool.seek(0)
+                        yield from _tar_file(spool, name, size, stat.st_mtime)
+                done += stat.st_size
+                if progress and total:
+                    progress(done / total)
+        finally:
+            for _path, future in pending:
+                if not future.cancel() and future.exception() is None:
+                    spool = future.result()[1]
+                    if spool is not None:
+                        spool.close()
+
+
+def _tar_stream(
+    snapshot: Path,
+    manifest: dict,
+    objects: dict[str, Path],
+    progress: Callable[[float], None] | None = None,
+) -> Iterator[bytes]:
+    # tarfile.add() writes a whole member in one call; emitting the blocks
+    # ourselves lets callers consume the archive a chunk at a time.
+    written = 0
+    for block in _tar_members(snapshot, manifest, objects, progress):
+        written += len(block)
+        yield block
+    trailer = 2 * tarfile.BLOCKSIZE
+    yield b"\0" * (trailer + (-(written + trailer) % tarfile.RECORDSIZE))
+
+
+def iter_archive(
+    snapshot: Path,
+    manifest: dict,
+    objects: dict[str, Path],
+    progress: Callable[[float], None] | None = None,
+) -> Iterator[bytes]:
+    """Yield a backup archive in chunks of about _CHUNK_BYTES."""
+    pending = []
+    pending_bytes = 0
+    for block in _tar_stream(snapshot, manifest, objects, progress):
+        pending.append(block)
+        pending_bytes += len(block)
+        if pending_bytes >= _CHUNK_BYTES:
+            yield b"".join(pending)
+            pending, pending_bytes = [], 0
+    if pending:
+        yield b"".join(pending)
+
+
+def write_archive(
+    snapshot: Path,
+    manifest: dict,
+    objects: dict[str, Path],
+    destination: Path,
+    progress: Callable[[float], None] | None = None,
+) -> str:
+    """Write the archive to ``destination``; returns its SHA-256."""
+    digest = hashlib.sha256()
+    with destination.open("wb") as handle:
+        for chunk in iter_archive(snapshot, manifest, objects, progress):
+            digest.update(chunk)
+            handle.write(chunk)
+    return digest.hexdigest()
+
+
+def stream_backup() -> Iterator[bytes]:
+    """Snapshot the database now and return an iterator over the archive.
+
+    The snapshot is taken before this returns, so failures surface to the
+    caller; the snapshot's temporary directory is removed once the iterator
+    is exhausted or closed.
+    """
+    temp_dir = Path(tempfile.mkdtemp(prefix="cms-snapshot-"))
+    snapshot = temp_dir / "app.db"
+    try:
+        snapshot_database(snapshot)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return _stream_snapshot(snapshot, temp_dir)
+
+
+def _stream_snapshot(snapshot: Path, temp_dir: Path) -> Iterator[bytes]:
+    # Downloads leave the server, so they are always self-contained.
+    try:
+        manifest, objects = plan_backup(snapshot, incremental=False)
+        yield from iter_archive(snapshot, manifest, objects)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def build_backup(
+    destination: Path, progress: Progress | None = None, incremental: bool = True
+) -> tuple[dict, int, str]:
+    """Snapshot the database and archive it with the uploads into ``destination``.
+
+    Returns the manifest, how many upload objects were stored and the archive's
+    SHA-256. The archive is written into ``destination``'s ``.partial`` file,
+    reserved by backup_filename(), and renamed into place, so a failed run
+    never leaves a truncated backup behind.
+    """
+
+    def _report(stage: str, start: float, share: float):
+        return lambda fraction: progress(stage, start + share * fraction) if progress else None
+
+    partial = destination.with_name(f"{destination.name}.partial")
+    try:
+        with tempfile.TemporaryDirectory(prefix="cms-snapshot-") as temp_dir:
+            snapshot = Path(temp_dir) / "app.db"
+            snapshot_database(snapshot, _report("snapshot", 0.0, _SNAPSHOT_SHARE))
+            if progress:
+                progress("manifest", _SNAPSHOT_SHARE)
+            manifest, objects = plan_backup(snapshot, incremental)
+            checksum = write_archive(
+                snapshot,
+                manifest,
+                objects,
+                partial,
+                _report("archive", _SNAPSHOT_SHARE, 1 - _SNAPSHOT_SHARE),
+            )
+        partial.replace(destination)
+    finally:
+        partial.unlink(missing_ok=True)
+    return manifest, len(objects), checksum
+
+
+def _required_archives(manifest: dict | None) -> list[str]:
+    if not manifest:
+        return []
+    return sorted({entry["archive"] for entry in manifest["uploads"].values() if entry["archive"]})
+
+
+def store_backup(
+    filename: str, trigger: str = "manual", incremental: bool = True, progress: Progress | None = None
+) -> models.BackupRecord:
+    """Build a backup into BACKUP_DIR, add it to the catalog and apply retention."""
+    started_at = datetime.utcnow()
+    started = time.monotonic()
+    destination = BACKUP_DIR / filename
+    manifest, new_objects, checksum = build_backup(destination, progress, incremental)
+    record = models.BackupRecord(
+        filename=filename,
+        kind="incremental" if manifest["parent"] else "full",
+        trigger=trigger,
+        parent=manifest["parent"],
+        requires=_required_archives(manifest),
+        size_bytes=destination.stat().st_size,
+        duration_seconds=round(time.monotonic() - started, 2),
+        checksum=checksum,
+        new_objects=new_objects,
+        created_at=started_at,
+    )
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        db.add(record)
+        db.commit()
+        if settings.backup_retention_enabled:
+            apply_retention(db)
+    finally:
+        db.close()
+    return record
+
+
+def list_catalog(db: Session) -> list[models.BackupRecord]:
+    return db.query(models.BackupRecord).order_by(models.BackupRecord.created_at.desc()).all()
+
+
+def sync_catalog():
+    """Bring the catalog in line with the archives in BACKUP_DIR.
+
+    Runs at startup and after a restore, which brings back the catalog as it
+    was when that backup was taken.
+    """
+    db = SessionLocal()
+    try:
+        known = {record.filename: record for record in db.query(models.BackupRecord)}
+        on_disk = {path.name: path for path in stored_archives()}
+        for name, record in known.items():
+            if name not in on_disk:
+                db.delete(record)
+        for name, path in on_disk.items():
+            if name in known:
+                continue
+            manifest = read_manifest(path)
+            stat = path.stat()
+            created_at = datetime.utcfromtimestamp(stat.st_mtime)
+            if manifest and manifest.get("created_at"):
+                created_at = datetime.fromisoformat(manifest["created_at"])
+            db.add(
+                models.BackupRecord(
+                    filename=name,
+                    kind="incremental" if manifest and manifest.get("parent") else "full",
+                    trigger="imported",
+                    parent=manifest.get("parent") if manifest else None,
+                    requires=_required_archives(manifest),
+                    size_bytes=stat.st_size,
+                    checksum=_hash_file(path),
+                    created_at=created_at,
+                )
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _retained(records: list[models.BackupRecord]) -> set[str]:
+    # Grandfather-father-son: the newest backup of each of the most recent
+    # days, ISO weeks and months is kept, along with the very latest one.
+    keep = {records[0].filename} if records else set()
+    buckets = (
+        (settings.backup_keep_daily, lambda moment: moment.date()),
+        (settings.backup_keep_weekly, lambda moment: moment.isocalendar()[:2]),
+        (settings.backup_keep_monthly, lambda moment: (moment.year, moment.month)),
+    )
+    for count, bucket in buckets:
+        seen = set()
+        for record in records:
+            key = bucket(record.created_at)
+            if key in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.add(key)
+            keep.add(record.filename)
+    # Incremental backups cannot be restored without the archives they draw on.
+    by_name = {record.filename: record for record in records}
+    pending = list(keep)
+    while pending:
+        for name in by_name[pending.pop()].requires or []:
+            if name in by_name and name not in keep:
+                keep.add(name)
+                pending.append(name)
+    return keep
+
+
+def apply_retention(db: Session) -> list[str]:
+    """Delete stored backups outside the retention policy; returns their names."""
+    records = list_catalog(db)
+    keep = _retained(records)
+    removed = []
+    for record in records:
+        if record.filename in keep:
+            continue
+        (BACKUP_DIR / record.filename).unlink(missing_ok=True)
+        db.delete(record)
+        removed.append(record.filename)
+    db.commit()
+    if removed:
+        logger.info("Backup retention removed %s.", ", ".join(removed))
+    return removed
+
+
+def _check_member(member: tarfile.TarInfo):
+    member_path = Path(member.name)
+    if member_path.is_absolute() or ".." in member_path.parts:
+        raise ValueError("Unsafe path in backup archive.")
+
+
+def _member_codec(name: str) -> tuple[str, str | None]:
+    for codec, suffix in _CODEC_SUFFIXES.items():
+        if name.endswith(suffix):
+            return name[: -len(suffix)], codec
+    return name, None
+
+
+def _decompressing(source, codec: str | None):
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=source, mode="rb")
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("zstandard is required to restore this backup.")
+        return zstandard.ZstdDecompressor().stream_reader(source)
+    return source
+
+
+_DECOMPRESS_ERRORS = (gzip.BadGzipFile, zlib.error) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def _copy_member(
+    tar: tarfile.TarFile,
+    member: tarfile.TarInfo,
+    target: Path,
+    codec: str | None = None,
+    digest: str | None = None,
+):
+    """Copy one member to ``target``, checking it against ``digest`` when given."""
+    source = tar.extractfile(member)
+    if source is None:
+        raise ValueError(f"Backup member {member.name} is not a file.")
+    hasher = hashlib.sha256() if digest else None
+    with source, target.open("wb") as handle:
+        reader = _decompressing(source, codec)
+        try:
+            for chunk in iter(lambda: reader.read(_CHUNK_BYTES), b""):
+                if hasher:
+                    hasher.update(chunk)
+                handle.write(chunk)
+        except _DECOMPRESS_ERRORS as exc:
+            raise ValueError(f"Backup member {member.name} is corrupt.") from exc
+    if hasher and hasher.hexdigest() != digest:
+        raise ValueError(f"Backup member {member.name} does not match its hash.")
+
+
+def _object_digest(name: str) -> str | None:
+    prefix = f"{_OBJECTS}/"
+    if not name.startswith(prefix):
+        return None
+    digest = name[len(prefix):]
+    if len(digest) != 64 or any(char not in "0123456789abcdef" for char in digest):
+        raise ValueError("Unsafe path in backup archive.")
+    return digest
+
+
+def _open_archive(source) -> tarfile.TarFile:
+    # Archives are only ever read front to back, so a request body works as
+    # well as a file on disk.
+    if isinstance(source, Path):
+        return tarfile.open(source, "r|*")
+    return tarfile.open(fileobj=source, mode="r|*")
+
+
+def _extract_objects(archive_path: Path, wanted: set[str], objects_dir: Path):
+    with _open_archive(archive_path) as tar:
+        for member in tar:
+            name, codec = _member_codec(member.name)
+            digest = _object_digest(name)
+            if digest in wanted:
+                _copy_member(tar, member, objects_dir / digest, codec, digest)
+
+
+def _unpack_legacy(tar: tarfile.TarFile, destination: Path):
+    # Legacy archive: app.db plus a plain copy of the uploads tree. Iterating
+    # a TarFile starts again from its first member.
+    for member in tar:
+        _check_member(member)
+        target = destination / member.name
+        if member.isdir():
+            target.mkdir(parents=True, exist_ok=True)
+        elif member.isfile():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            _copy_member(tar, member, target)
+        else:
+            raise ValueError(f"Unsupported member {member.name} in backup archive.")
+
+
+def unpack_backup(source, destination: Path) -> dict | None:
+    """Rebuild ``destination``/app.db and ``destination``/uploads from a backup.
+
+    ``source`` is an archive path or a readable binary stream; members are
+    checked and written as they are read. The database and each upload object
+    are hashed while they are copied and must match the manifest, and content stored in ancestor
+    backups is fetched from BACKUP_DIR. Returns the manifest, or None for
+    legacy archives.
+    """
+    objects_dir = destination / _OBJECTS
+    with _open_archive(source) as tar:
+        first = tar.next()
+        if first is None:
+            raise ValueError("Backup archive is empty.")
+        if first.name != _MANIFEST:
+            _unpack_legacy(tar, destination)
+            return None
+        manifest = json.loads(tar.extractfile(first).read())
+        if manifest.get("format", 1) > BACKUP_FORMAT:
+            raise ValueError(f"Backup format {manifest['format']} is newer than this version supports.")
+        for relative in manifest["uploads"]:
+            relative_path = Path(relative)
+            if relative_path.is_absolute() or ".." in relative_path.parts:
+                raise ValueError("Unsafe path in backup archive.")
+        database_digest = manifest.get("database", {}).get("sha256")
+        if not database_digest:
+            raise ValueError("Backup manifest has no hash for app.db.")
+        needed = {entry["sha256"] for entry in manifest["uploads"].values()}
+        objects_dir.mkdir()
+        for member in tar:
+            name, codec = _member_codec(member.name)
+            if name == "app.db":
+                _copy_member(tar, member, destination / "app.db", codec, database_digest)
+                continue
+            digest = _object_digest(name)
+            if digest is None:
+                _check_member(member)
+            elif digest in needed:
+                _copy_member(tar, member, objects_dir / digest, codec, digest)
+
+    by_archive: dict[str, set[str]] = {}
+    for entry in manifest["uploads"].values():
+        if entry["archive"] and not (objects_dir / entry["sha256"]).exists():
+            by_archive.setdefault(entry["archive"], set()).add(entry["sha256"])
+    for archive, wanted in by_archive.items():
+        if Path(archive).name != archive:
+            raise ValueError("Unsafe path in backup archive.")
+        ancestor = BACKUP_DIR / archive
+        if not ancestor.exists():
+            raise ValueError(f"Backup depends on {archive}, which is not available.")
+        _extract_objects(ancestor, wanted, objects_dir)
+
+    uploads_dir = destination / "uploads"
+    uploads_dir.mkdir()
+    for relative, entry in manifest["uploads"].items():
+        source_object = objects_dir / entry["sha256"]
+        if not source_object.exists():
+            raise ValueError(f"Backup is missing the content of {relative}.")
+        target = uploads_dir / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source_object, target)
+    shutil.rmtree(objects_dir)
+    return manifest
+
+
+def _alembic_config() -> Config:
+    config = Config()
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    return config
+
+
+def prepare_database(path: Path) -> str:
+    """Validate a restored database and upgrade it to the current schema.
+
+    Returns the revision the backup was taken at. Databases that fail the
+    integrity check or come from an unknown schema are rejected.
+    """
+    try:
+        connection = sqlite3.connect(path)
+        try:
+            _check_integrity(connection, "Backup database")
+            row = connection.execute("SELECT version_num FROM alembic_version").fetchone()
+        finally:
+            connection.close()
+    except sqlite3.DatabaseError as exc:
+        raise ValueError(f"Backup database is not usable: {exc}") from exc
+    revision = row[0] if row else None
+    config = _alembic_config()
+    script = ScriptDirectory.from_config(config)
+    if revision not in {entry.revision for entry in script.walk_revisions()}:
+        raise ValueError(f"Backup database has an unknown schema revision ({revision}).")
+    if revision != script.get_current_head():
+        upgrade_engine = create_engine(f"sqlite:///{path}", poolclass=NullPool)
+        try:
+            with upgrade_engine.begin() as upgrade_connection:
+                config.attributes["connection"] = upgrade_connection
+                command.upgrade(config, "head")
+        finally:
+            upgrade_engine.dispose()
+    return revision
+
+
+def _replace_file(source: Path, target: Path):
+    # Copy next to the target first so the final rename never crosses a
+    # filesystem and readers see either the old or the new file.
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp = target.with_name(f".{target.name}.restore")
+    shutil.copyfile(source, temp)
+    os.replace(temp, target)
+
+
+def _sync_uploads(staged: Path, manifest: dict | None) -> tuple[set[str], int]:
+    """Copy staged uploads whose content differs from the live file; returns (paths, copied)."""
+    expected = {relative: entry["sha256"] for relative, entry in manifest["uploads"].items()} if manifest else {}
+    latest = _latest_stored()
+    cached = latest[1]["uploads"] if latest else {}
+    restored: set[str] = set()
+    copied = 0
+    for source in sorted(path for path in staged.rglob("*") if path.is_file()):
+        relative = source.relative_to(staged).as_posix()
+        restored.add(relative)
+        target = UPLOADS_DIR / relative
+        if target.is_file() and target.stat().st_size == source.stat().st_size:
+            stat = target.stat()
+            previous = cached.get(relative)
+            if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+                current = previous["sha256"]
+            else:
+                current = _hash_file(target)
+            if current == (expected.get(relative) or _hash_file(source)):
+                continue
+        _replace_file(source, target)
+        copied += 1
+    return restored, copied
+
+
+def _prune_uploads(keep: set[str]) -> int:
+    removed = 0
+    for path in sorted(UPLOADS_DIR.rglob("*"), reverse=True):
+        relative = path.relative_to(UPLOADS_DIR).as_posix()
+        if path.is_dir():
+            if not any(path.iterdir()):
+                path.rmdir()
+        elif relative not in keep and relative != ".gitkeep":
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def restore_backup(source) -> dict:
+    """Replace the live database and uploads with the contents of a backup.
+
+    ``source`` is an archive path or a readable binary stream.
+
+    Everything is unpacked and validated in a staging directory beside the
+    database first. Changed uploads are then copied in, the database is
+    swapped in with a single rename, and uploads missing from the backup are
+    removed last, so an interrupted restore never leaves the database pointing
+    at files that are gone.
+    """
+    target_db = resolve_db_path()
+    if target_db is None:
+        raise ValueError("Database file not found.")
+    if not _restore_lock.acquire(blocking=False):
+        raise ValueError("Another restore is already running.")
+    staging = target_db.parent / f".restore-{uuid4().hex}"
+    try:
+        staging.mkdir()
+        manifest = unpack_backup(source, staging)
+        staged_db = staging / "app.db"
+        if not staged_db.is_file():
+            raise ValueError("Backup missing app.db.")
+        revision = prepare_database(staged_db)
+        # Legacy archives without an uploads folder leave uploads untouched.
+        staged_uploads = staging / "uploads"
+        has_uploads = staged_uploads.is_dir()
+        restored, copied, removed = set(), 0, 0
+        if has_uploads:
+            UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+            restored, copied = _sync_uploads(staged_uploads, manifest)
+        engine.dispose()
+        os.replace(staged_db, target_db)
+        versioning.clear_diff_cache()
+        if has_uploads:
+            removed = _prune_uploads(restored)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        _restore_lock.release()
+    threading.Thread(target=_sync_catalog_safely, name="backup-catalog-sync", daemon=True).start()
+    return {
+        "revision": revision,
+        "uploads": len(restored),
+        "uploads_copied": copied,
+        "uploads_removed": removed,
+    }
+
+
+def get_job(job_id: str) -> BackupJob | None:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def start_backup(trigger: str = "manual") -> BackupJob:
+    """Start a stored backup in the background; returns the running job if one exists."""
+    cutoff = datetime.utcnow() - _JOB_RETENTION
+    with _jobs_lock:
+        for job_id, existing in list(_jobs.items()):
+            if existing.status == "running":
+                return existing
+            if existing.finished_at and existing.finished_at < cutoff:
+                del _jobs[job_id]
+        job = BackupJob(id=uuid4().hex, filename=backup_filename(), trigger=trigger)
+        _jobs[job.id] = job
+    thread = threading.Thread(target=_execute, args=(job,), name=f"backup-{job.id[:8]}", daemon=True)
+    thread.start()
+    return job
+
+
+def _execute(job: BackupJob):
+    def _progress(stage: str, fraction: float):
+        job.stage = stage
+        job.progress = round(fraction, 3)
+
+    try:
+        record = store_backup(job.filename, job.trigger, progress=_progress)
+        job.size_bytes = record.size_bytes
+        job.parent = record.parent
+        job.new_objects = record.new_objects
+        job.stage = "done"
+        job.progress = 1.0
+        job.status = "completed"
+    except Exception as exc:
+        logger.exception("Backup %s failed.", job.id)
+        job.status = "failed"
+        job.error = str(exc)
+    finally:
+        job.finished_at = datetime.utcnow()
+
+
+def _sync_catalog_safely():
+    try:
+        sync_catalog()
+    except Exception:
+        logger.exception("Backup catalog sync failed.")
+
+
+def run_due_backup(now: datetime | None = None) -> BackupJob | None:
+    """Start the scheduled backup if none has run since the last scheduled time."""
+    global _last_scheduled_attempt
+    now = now or datetime.utcnow()
+    due = now.replace(hour=settings.backup_schedule_hour, minute=0, second=0, microsecond=0)
+    if now < due:
+        due -= timedelta(days=1)
+    # A failed run is not retried until the next scheduled time.
+    if _last_scheduled_attempt and _last_scheduled_attempt >= due:
+        return None
+    db = SessionLocal()
+    try:
+        last = (
+            db.query(func.max(models.BackupRecord.created_at))
+            .filter(models.BackupRecord.trigger == "scheduled")
+            .scalar()
+        )
+    finally:
+        db.close()
+    if last and last >= due:
+        return None
+    job = start_backup(trigger="scheduled")
+    if job.trigger == "scheduled":
+        _last_scheduled_attempt = now
+    return job
+
+
+def _run_scheduler():
+    _sync_catalog_safely()
+    if not settings.backup_schedule_enabled:
+        return
+    while not _scheduler_stop.wait(_SCHEDULER_POLL_SECONDS):
+        try:
+            run_due_backup()
+        except Exception:
+            logger.exception("Scheduled backup check failed.")
+
+
+def start_scheduler():
+    """Sync the catalog and, when enabled, run scheduled backups in the background."""
+    global _scheduler
+    if _scheduler and _scheduler.is_alive():
+        return
+    _scheduler_stop.clear()
+    _scheduler = threading.Thread(target=_run_scheduler, name="backup-scheduler", daemon=True)
+    _scheduler.start()
+
+
+def stop_scheduler(timeout: float = 10):
+    _scheduler_stop.set()
+    if _scheduler:
+        _scheduler.join(timeout)
@@ -0,0 +1,255 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.orm import Session
+
+from . import models, notifications, schemas, versioning
+
+# Field comments on document versions. Each commentable entity supplies a
+# CommentSpec; listing, counts, reactions and reconciliation are shared.
+
+
+@dataclass(frozen=True)
+class CommentSpec:
+    entity_type: str
+    versions: versioning.VersionSpec
+    comment_model: type
+    reaction_model: type
+    version_column: str
+    out_schema: type
+
+
+AGREEMENT = CommentSpec(
+    entity_type="agreement",
+    versions=versioning.AGREEMENT,
+    comment_model=models.AgreementVersionComment,
+    reaction_model=models.AgreementVersionCommentReaction,
+    version_column="agreement_version_id",
+    out_schema=schemas.AgreementCommentOut,
+)
+PROPOSAL = CommentSpec(
+    entity_type="proposal",
+    versions=versioning.PROPOSAL,
+    comment_model=models.ProposalVersionComment,
+    reaction_model=models.ProposalVersionCommentReaction,
+    version_column="proposal_version_id",
+    out_schema=schemas.ProposalCommentOut,
+)
+
+COMMENT_SPECS = {spec.entity_type: spec for spec in (AGREEMENT, PROPOSAL)}
+
+
+def get_version(db: Session, spec: CommentSpec, version_id: int):
+    model = spec.versions.model
+    return db.query(model).filter(model.id == version_id).first()
+
+
+def get_comment(db: Session, spec: CommentSpec, comment_id: int):
+    model = spec.comment_model
+    return db.query(model).filter(model.id == comment_id).first()
+
+
+def _comment_rows(db: Session, spec: CommentSpec):
+    # One query for comments plus everything the response needs: version
+    # number, whether that version is current, and the author's email.
+    comment_model = spec.comment_model
+    version_model = spec.versions.model
+    parent = spec.versions.parent_model
+    return (
+        db.query(
+            comment_model,
+            version_model.version_number,
+            (version_model.version_number == parent.current_version).label("is_current"),
+            models.User.email.label("created_by_email"),
+        )
+        .join(version_model, version_model.id == getattr(comment_model, spec.version_column))
+        .join(parent, parent.id == getattr(version_model, spec.versions.parent_column))
+        .outerjoin(models.User, models.User.id == comment_model.created_by_user_id)
+    )
+
+
+def _serialize(spec: CommentSpec, rows) -> list[dict]:
+    columns = [column.key for column in spec.comment_model.__table__.columns]
+    return [
+        {
+            **{column: getattr(comment, column) for column in columns},
+            "version_number": version_number,
+            "is_current": bool(is_current),
+            "created_by_email": created_by_email,
+        }
+        for comment, version_number, is_current, created_by_email in rows
+    ]
+
+
+def list_comments(
+    db: Session,
+    spec: CommentSpec,
+    version,
+    field_key: str | None = None,
+    all_versions: bool = False,
+) -> list[dict]:
+    comment_model = spec.comment_model
+    query = _comment_rows(db, spec)
+    if all_versions:
+        parent_column = spec.versions.parent_column
+        query = query.filter(
+            getattr(spec.versions.model, parent_column) == getattr(version, parent_column)
+        )
+    else:
+        query = query.filter(getattr(comment_model, spec.version_column) == version.id)
+    if field_key:
+        query = query.filter(comment_model.field_key == field_key)
+    return _serialize(spec, query.order_by(comment_model.created_at.asc()))
+
+
+def comment_out(db: Session, spec: CommentSpec, comment_id: int) -> dict | None:
+    rows = _serialize(spec, _comment_rows(db, spec).filter(spec.comment_model.id == comment_id))
+    return rows[0] if rows else None
+
+
+def summarize_comments(db: Session, spec: CommentSpec, version, all_versions: bool = False) -> list[dict]:
+    comment_model = spec.comment_model
+    query = db.query(
+        comment_model.field_key,
+        func.count(comment_model.id).label("total"),
+        func.sum(case((comment_model.implemented.is_(True), 1), else_=0)).label("implemented"),
+        func.max(comment_model.created_at).label("last_activity_at"),
+    )
+    comment_version_id = getattr(comment_model, spec.version_column)
+    if all_versions:
+        version_model = spec.versions.model
+        parent_column = spec.versions.parent_column
+        query = query.join(version_model, version_model.id == comment_version_id).filter(
+            getattr(version_model, parent_column) == getattr(version, parent_column)
+        )
+    else:
+        query = query.filter(comment_version_id == version.id)
+    return [
+        {
+            "field_key": field_key,
+            "total": total,
+            "implemented": implemented or 0,
+            "unresolved": total - (implemented or 0),
+            "last_activity_at": last_activity_at,
+        }
+        for field_key, total, implemented, last_activity_at in query.group_by(comment_model.field_key)
+    ]
+
+
+def add_comment(
+    db: Session,
+    spec: CommentSpec,
+    version_id: int,
+    payload: schemas.CommentCreate,
+    user_id: int,
+):
+    comment = spec.comment_model(
+        field_key=payload.field_key,
+        comment=payload.comment,
+        mentions=payload.mentions or [],
+        created_by_user_id=user_id,
+        **{spec.version_column: version_id},
+    )
+    db.add(comment)
+    db.commit()
+    if comment.mentions:
+        notifications.schedule_mentions(spec, comment.id)
+    return comment
+
+
+def set_implemented(db: Session, comment, implemented: bool):
+    comment.implemented = implemented
+    db.commit()
+    return comment
+
+
+def delete_comment(db: Session, spec: CommentSpec, comment):
+    notifications.discard_for_comment(db, spec.entity_type, comment.id)
+    db.delete(comment)
+    db.commit()
+
+
+def _insert_reaction(db: Session, reaction_model, comment_id: int, user_id: int, reaction: str) -> bool:
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = (
+        insert(reaction_model)
+        .values(comment_id=comment_id, user_id=user_id, reaction=reaction, created_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["comment_id", "user_id"])
+    )
+    return db.execute(statement).rowcount == 1
+
+
+def toggle_reaction(db: Session, spec: CommentSpec, comment_id: int, user_id: int, reaction: str):
+    # Every step is a conditional write, so the transaction holds the write
+    # lock from its first statement and counters move by SQL-side deltas.
+    comment_model = spec.comment_model
+    reaction_model = spec.reaction_model
+    other = "dislike" if reaction == "like" else "like"
+    match = (reaction_model.comment_id == comment_id, reaction_model.user_id == user_id)
+    for _attempt in range(3):
+        deltas = {"like": 0, "dislike": 0}
+        removed = (
+            db.query(reaction_model)
+            .filter(*match, reaction_model.reaction == reaction)
+            .delete(synchronize_session=False)
+        )
+        if removed:
+            deltas[reaction] = -1
+        elif db.query(reaction_model).filter(*match).update(
+            {"reaction": reaction}, synchronize_session=False
+        ):
+            deltas[reaction] = 1
+            deltas[other] = -1
+        elif _insert_reaction(db, reaction_model, comment_id, user_id, reaction):
+            deltas[reaction] = 1
+        else:
+            # Another request from the same user inserted first; start over.
+            db.rollback()
+            continue
+        db.query(comment_model).filter(comment_model.id == comment_id).update(
+            {
+                comment_model.like_count: comment_model.like_count + deltas["like"],
+                comment_model.dislike_count: comment_model.dislike_count + deltas["dislike"],
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        return
+    raise ValueError("Reaction could not be saved. Please try again.")
+
+
+def _reaction_count(spec: CommentSpec, reaction: str):
+    reaction_model = spec.reaction_model
+    return (
+        select(func.count(reaction_model.id))
+        .where(reaction_model.comment_id == spec.comment_model.id, reaction_model.reaction == reaction)
+        .scalar_subquery()
+    )
+
+
+def reconcile_reaction_counts(db: Session) -> int:
+    """Recompute like/dislike counters from the reaction tables; returns rows fixed."""
+    fixed = 0
+    for spec in COMMENT_SPECS.values():
+        comment_model = spec.comment_model
+        likes = _reaction_count(spec, "like")
+        dislikes = _reaction_count(spec, "dislike")
+        fixed += (
+            db.query(comment_model)
+            .filter(
+                or_(
+                    func.coalesce(comment_model.like_count, -1) != likes,
+                    func.coalesce(comment_model.dislike_count, -1) != dislikes,
+                )
+            )
+            .update(
+                {comment_model.like_count: likes, comment_model.dislike_count: dislikes},
+                synchronize_session=False,
+            )
+        )
+    db.commit()
+    return fixed
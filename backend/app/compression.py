@@ -0,0 +1,79 @@
+import logging
+import zlib
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+from .config import settings
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+logger = logging.getLogger("compression")
+
+# Stored values start with MAGIC followed by a one-byte codec id. JSON text
+# never starts with a NUL byte, so anything without the header is a legacy,
+# uncompressed row and is returned as-is.
+MAGIC = b"\x00"
+RAW = b"r"
+ZLIB = b"z"
+ZSTD = b"s"
+
+# Below this size the codec overhead outweighs the saving.
+_MIN_COMPRESS_BYTES = 128
+
+
+def _codec_id(name: str) -> bytes:
+    if name == "zstd":
+        if zstandard is not None:
+            return ZSTD
+        logger.warning("zstandard is not installed; falling back to zlib compression.")
+        return ZLIB
+    if name == "none":
+        return RAW
+    return ZLIB
+
+
+def compress(data: bytes, codec: str | None = None) -> bytes:
+    codec_id = _codec_id(codec or settings.version_compression)
+    if codec_id == RAW or len(data) < _MIN_COMPRESS_BYTES:
+        return MAGIC + RAW + data
+    if codec_id == ZSTD:
+        return MAGIC + ZSTD + zstandard.ZstdCompressor(level=3).compress(data)
+    return MAGIC + ZLIB + zlib.compress(data, 6)
+
+
+def decompress(blob: bytes) -> bytes:
+    if not blob.startswith(MAGIC):
+        return blob
+    codec_id, payload = blob[1:2], blob[2:]
+    if codec_id == RAW:
+        return payload
+    if codec_id == ZLIB:
+        return zlib.decompress(payload)
+    if codec_id == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed data.")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    raise ValueError(f"Unknown compression codec {codec_id!r}.")
+
+
+class CompressedText(TypeDecorator):
+    """Text stored as a compressed blob; reads legacy plain-text rows too."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress(value.encode("utf-8"))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return value
+        return decompress(bytes(value)).decode("utf-8")
@@ -19,6 +19,8 @@ class Settings:
     allowed_origins: str = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173")
     enable_docs: bool = os.getenv("ENABLE_DOCS", "true").lower() == "true"
     max_upload_mb: int = int(os.getenv("MAX_UPLOAD_MB", "20"))
+    upload_gc_grace_hours: int = int(os.getenv("UPLOAD_GC_GRACE_HOURS", "24"))
+    upload_gc_batch_size: int = int(os.getenv("UPLOAD_GC_BATCH_SIZE", "500"))
     login_rate_limit_attempts: int = int(os.getenv("LOGIN_RATE_LIMIT_ATTEMPTS", "10"))
     login_rate_limit_window_seconds: int = int(os.getenv("LOGIN_RATE_LIMIT_WINDOW_SECONDS", "900"))
     smtp_host: str | None = os.getenv("SMTP_HOST") or None
@@ -27,5 +29,31 @@ class Settings:
     smtp_password: str | None = os.getenv("SMTP_PASSWORD") or None
     smtp_from: str = os.getenv("SMTP_FROM", "hello@localhost")
     smtp_use_tls: bool = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
+    smtp_pool_size: int = int(os.getenv("SMTP_POOL_SIZE", "2"))
+    smtp_pool_idle_seconds: int = int(os.getenv("SMTP_POOL_IDLE_SECONDS", "60"))
+    outbox_workers: int = int(os.getenv("OUTBOX_WORKERS", "4"))
+    outbox_max_attempts: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+    outbox_retry_base_seconds: int = int(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+    outbox_poll_seconds: float = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+    reminder_rate_per_minute: int = int(os.getenv("REMINDER_RATE_PER_MINUTE", "30"))
+    pdf_cache_max_mb: int = int(os.getenv("PDF_CACHE_MAX_MB", "64"))
+    pdf_render_workers: int = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+    pdf_prerender_enabled: bool = os.getenv("PDF_PRERENDER_ENABLED", "false").lower() == "true"
+    pdf_prerender_debounce_seconds: float = float(os.getenv("PDF_PRERENDER_DEBOUNCE_SECONDS", "5"))
+    pdf_prerender_skip_drafts: bool = os.getenv("PDF_PRERENDER_SKIP_DRAFTS", "true").lower() == "true"
+    version_checkpoint_interval: int = int(os.getenv("VERSION_CHECKPOINT_INTERVAL", "20"))
+    version_compression: str = os.getenv("VERSION_COMPRESSION", "zlib").lower()
+    backup_codec: str = os.getenv("BACKUP_CODEC", "zstd").lower()
+    backup_compression_level: int = int(os.getenv("BACKUP_COMPRESSION_LEVEL", "6"))
+    backup_workers: int = int(os.getenv("BACKUP_WORKERS", "4"))
+    backup_max_upload_mb: int = int(os.getenv("BACKUP_MAX_UPLOAD_MB", "4096"))
+    backup_full_every: int = int(os.getenv("BACKUP_FULL_EVERY", "7"))
+    backup_schedule_enabled: bool = os.getenv("BACKUP_SCHEDULE_ENABLED", "false").lower() == "true"
+    backup_schedule_hour: int = int(os.getenv("BACKUP_SCHEDULE_HOUR", "2"))
+    backup_retention_enabled: bool = os.getenv("BACKUP_RETENTION_ENABLED", "false").lower() == "true"
+    backup_keep_daily: int = int(os.getenv("BACKUP_KEEP_DAILY", "7"))
+    backup_keep_weekly: int = int(os.getenv("BACKUP_KEEP_WEEKLY", "4"))
+    backup_keep_monthly: int = int(os.getenv("BACKUP_KEEP_MONTHLY", "12"))
+    mention_emails_enabled: bool = os.getenv("MENTION_EMAILS_ENABLED", "false").lower() == "true"
 
 settings = Settings()
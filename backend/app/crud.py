@@ -3,9 +3,18 @@ import json
 
 from sqlalchemy.orm import Session
 
-from . import models, schemas
+from . import models, schemas, versioning
+from .pdf_cache import schedule_prerender
 from .security import encrypt_secret, hash_password
 
+DOCUMENT_MODELS = {
+    "invoice": models.Invoice,
+    "quote": models.Quote,
+    "proposal": models.Proposal,
+    "agreement": models.ServiceAgreement,
+    "expense": models.Expense,
+}
+
 
 def build_display_id(prefix: str, numeric_id: int) -> str:
     return f"{prefix}-{numeric_id + 999}"
@@ -21,6 +30,13 @@ def ensure_display_id_unique(db: Session, model, display_id: str, exclude_id: in
         raise ValueError("Display ID already exists.")
 
 
+def get_document(db: Session, entity_type: str, entity_id: int):
+    model = DOCUMENT_MODELS.get(entity_type)
+    if model is None:
+        return None
+    return db.query(model).filter(model.id == entity_id).first()
+
+
 def get_or_create_settings(db: Session) -> models.Settings:
     settings = db.query(models.Settings).first()
     if settings:
@@ -113,54 +129,68 @@ def _proposal_snapshot(proposal: models.Proposal):
     return _json_dump(data), _json_dump(requirements), _json_dump(attachments)
 
 
-def create_agreement_version(db: Session, agreement: models.ServiceAgreement, user_id: int | None):
-    next_version = (agreement.current_version or 0) + 1
+def _record_version(
+    db: Session,
+    spec: versioning.VersionSpec,
+    document,
+    payload: dict[str, str],
+    user_id: int | None,
+    **columns,
+):
+    digest = versioning.content_hash(spec, payload)
+    latest = versioning.latest_version(db, spec, document.id)
+    if latest is not None and latest.content_hash == digest:
+        versioning.record_write(spec, skipped=True)
+        return latest
+    stored = versioning.encode_payload(db, spec, document.id, payload)
+    next_version = (document.current_version or 0) + 1
     now = datetime.utcnow()
-    agreement.current_version = next_version
-    agreement.updated_at = now
-    agreement.updated_by_user_id = user_id
-    db.commit()
-    db.refresh(agreement)
-    data_json, sla_json = _agreement_snapshot(agreement)
-    version = models.ServiceAgreementVersion(
-        agreement_id=agreement.id,
+    document.current_version = next_version
+    document.updated_at = now
+    document.updated_by_user_id = user_id
+    version = spec.model(
         version_number=next_version,
-        title=agreement.title,
-        data_json=data_json,
-        sla_items_json=sla_json,
         created_at=now,
         created_by_user_id=user_id,
+        content_hash=digest,
+        **{spec.parent_column: document.id},
+        **columns,
+        **stored,
     )
     db.add(version)
     db.commit()
     db.refresh(version)
+    versioning.record_write(spec, skipped=False)
     return version
 
 
+def create_agreement_version(db: Session, agreement: models.ServiceAgreement, user_id: int | None):
+    data_json, sla_json = _agreement_snapshot(agreement)
+    return _record_version(
+        db,
+        versioning.AGREEMENT,
+        agreement,
+        {"data_json": data_json, "sla_items_json": sla_json},
+        user_id,
+        title=agreement.title,
+    )
+
+
 def create_proposal_version(db: Session, proposal: models.Proposal, user_id: int | None):
-    next_version = (proposal.current_version or 0) + 1
-    now = datetime.utcnow()
-    proposal.current_version = next_version
-    proposal.updated_at = now
-    proposal.updated_by_user_id = user_id
-    db.commit()
-    db.refresh(proposal)
     data_json, requirements_json, attachments_json = _proposal_snapshot(proposal)
-    version = models.ProposalVersion(
-        proposal_id=proposal.id,
-        version_number=next_version,
+    return _record_version(
+        db,
+        versioning.PROPOSAL,
+        proposal,
+        {
+            "data_json": data_json,
+            "requirements_json": requirements_json,
+            "attachments_json": attachments_json,
+        },
+        user_id,
         title=proposal.title,
         status=proposal.status,
-        data_json=data_json,
-        requirements_json=requirements_json,
-        attachments_json=attachments_json,
-        created_at=now,
-        created_by_user_id=user_id,
     )
-    db.add(version)
-    db.commit()
-    db.refresh(version)
-    return version
 
 
 def get_user_by_email(db: Session, email: str):
@@ -334,7 +364,6 @@ def create_invoice(db: Session, client_id: int, payload: schemas.InvoiceCreate):
     def build_invoice(
         issue_date: datetime,
         due_date: datetime | None,
-        status_override: str | None = None,
         display_id_override: str | None = None,
         legacy_override: bool | None = None,
     ) -> models.Invoice:
@@ -342,8 +371,6 @@ def create_invoice(db: Session, client_id: int, payload: schemas.InvoiceCreate):
         invoice.issued_at = issue_date
         if due_date:
             invoice.due_date = due_date
-        if status_override:
-            invoice.status = status_override
         db.add(invoice)
         db.commit()
         db.refresh(invoice)
@@ -379,6 +406,7 @@ def create_invoice(db: Session, client_id: int, payload: schemas.InvoiceCreate):
                     invoice.is_legacy = bool(legacy_override)
             db.commit()
             db.refresh(invoice)
+        schedule_prerender("invoice", invoice.id)
         return invoice
 
     issued_at = data.get("issued_at") or datetime.utcnow()
@@ -418,13 +446,11 @@ def create_invoice(db: Session, client_id: int, payload: schemas.InvoiceCreate):
                 next_due = issue_date + due_offset
             else:
                 next_due = None
-            status_override = "sent" if index == 0 and send_now else None
             display_id_override = display_id if index == 0 else None
             legacy_override = bool(is_legacy) if index == 0 and display_id else None
             created = build_invoice(
                 issue_date,
                 next_due,
-                status_override=status_override,
                 display_id_override=display_id_override,
                 legacy_override=legacy_override,
             )
@@ -432,11 +458,9 @@ def create_invoice(db: Session, client_id: int, payload: schemas.InvoiceCreate):
                 first_invoice = created
         return created, first_invoice
 
-    status_override = "sent" if send_now else None
     created = build_invoice(
         issued_at,
         compute_due_date(issued_at) or due_date,
-        status_override=status_override,
         display_id_override=display_id,
         legacy_override=bool(is_legacy) if display_id else None,
     )
@@ -488,14 +512,29 @@ def update_invoice(db: Session, invoice: models.Invoice, payload: schemas.Invoic
         invoice.is_legacy = False
         db.commit()
         db.refresh(invoice)
+    schedule_prerender("invoice", invoice.id)
     return invoice
 
 
+def mark_document_sent(db: Session, entity_type: str, entity):
+    if entity_type == "invoice" and entity.status != "paid":
+        entity.status = "sent"
+    elif entity_type in {"quote", "proposal"} and entity.status == "draft":
+        entity.status = "sent"
+    else:
+        return entity
+    db.commit()
+    db.refresh(entity)
+    schedule_prerender(entity_type, entity.id)
+    return entity
+
+
 def mark_invoice_paid(db: Session, invoice: models.Invoice):
     invoice.status = "paid"
     invoice.paid_at = datetime.utcnow()
     db.commit()
     db.refresh(invoice)
+    schedule_prerender("invoice", invoice.id)
     return invoice
 
 
@@ -533,6 +572,7 @@ def create_quote(db: Session, client_id: int, payload: schemas.QuoteCreate):
             quote.is_legacy = False
         db.commit()
         db.refresh(quote)
+    schedule_prerender("quote", quote.id)
     return quote
 
 
@@ -572,6 +612,7 @@ def update_quote(db: Session, quote: models.Quote, payload: schemas.QuoteUpdate)
         quote.is_legacy = False
         db.commit()
         db.refresh(quote)
+    schedule_prerender("quote", quote.id)
     return quote
 
 
@@ -599,6 +640,7 @@ def create_agreement(db: Session, client_id: int, payload: schemas.AgreementCrea
         db.refresh(agreement)
     agreement.current_version = 0
     create_agreement_version(db, agreement, user_id)
+    schedule_prerender("agreement", agreement.id)
     return agreement
 
 
@@ -609,8 +651,13 @@ def update_agreement(db: Session, agreement: models.ServiceAgreement, payload: s
         ensure_display_id_unique(db, models.ServiceAgreement, display_id, exclude_id=agreement.id)
     sla_items = data.pop("sla_items", None)
     for field, value in data.items():
-        setattr(agreement, field, value)
-    if sla_items is not None:
+        if getattr(agreement, field) != value:
+            setattr(agreement, field, value)
+    # Only replace child rows when they differ, so an unchanged autosave
+    # doesn't delete and reinsert them.
+    if sla_items is not None and [
+        (item.sla, item.timescale) for item in agreement.sla_items
+    ] != [(item["sla"], item["timescale"]) for item in sla_items]:
         agreement.sla_items = []
         for item in sla_items:
             agreement.sla_items.append(
@@ -619,6 +666,7 @@ def update_agreement(db: Session, agreement: models.ServiceAgreement, payload: s
     db.commit()
     db.refresh(agreement)
     create_agreement_version(db, agreement, user_id)
+    schedule_prerender("agreement", agreement.id)
     return agreement
 
 
@@ -655,6 +703,7 @@ def create_proposal(db: Session, client_id: int, payload: schemas.ProposalCreate
         db.refresh(proposal)
     proposal.current_version = 0
     create_proposal_version(db, proposal, user_id)
+    schedule_prerender("proposal", proposal.id)
     return proposal
 
 
@@ -666,12 +715,17 @@ def update_proposal(db: Session, proposal: models.Proposal, payload: schemas.Pro
     requirements = data.pop("requirements", None)
     attachments = data.pop("attachments", None)
     for field, value in data.items():
-        setattr(proposal, field, value)
-    if requirements is not None:
+        if getattr(proposal, field) != value:
+            setattr(proposal, field, value)
+    if requirements is not None and [
+        item.description for item in proposal.requirements
+    ] != [item["description"] for item in requirements]:
         proposal.requirements = [
             models.ProposalRequirement(description=item["description"]) for item in requirements
         ]
-    if attachments is not None:
+    if attachments is not None and [
+        (item.filename, item.file_path) for item in proposal.attachments
+    ] != [(item["filename"], item["file_path"]) for item in attachments]:
         proposal.attachments = [
             models.ProposalAttachment(
                 filename=item["filename"],
@@ -682,6 +736,7 @@ def update_proposal(db: Session, proposal: models.Proposal, payload: schemas.Pro
     db.commit()
     db.refresh(proposal)
     create_proposal_version(db, proposal, user_id)
+    schedule_prerender("proposal", proposal.id)
     return proposal
 
 
@@ -691,8 +746,9 @@ def restore_agreement_version(
     version: models.ServiceAgreementVersion,
     user_id: int | None = None,
 ):
-    data = json.loads(version.data_json or "{}")
-    sla_items = json.loads(version.sla_items_json or "[]")
+    payload = versioning.load_payload(db, versioning.AGREEMENT, version)
+    data = payload["data_json"] or {}
+    sla_items = payload["sla_items_json"] or []
     date_fields = {"start_date", "end_date", "company_signed_date"}
     for field, value in data.items():
         if field in date_fields and value:
@@ -708,6 +764,7 @@ def restore_agreement_version(
     db.commit()
     db.refresh(agreement)
     create_agreement_version(db, agreement, user_id)
+    schedule_prerender("agreement", agreement.id)
     return agreement
 
 
@@ -717,9 +774,10 @@ def restore_proposal_version(
     version: models.ProposalVersion,
     user_id: int | None = None,
 ):
-    data = json.loads(version.data_json or "{}")
-    requirements = json.loads(version.requirements_json or "[]")
-    attachments = json.loads(version.attachments_json or "[]")
+    payload = versioning.load_payload(db, versioning.PROPOSAL, version)
+    data = payload["data_json"] or {}
+    requirements = payload["requirements_json"] or []
+    attachments = payload["attachments_json"] or []
     date_fields = {"submitted_on", "valid_until"}
     for field, value in data.items():
         if field in date_fields and value:
@@ -738,6 +796,7 @@ def restore_proposal_version(
     db.commit()
     db.refresh(proposal)
     create_proposal_version(db, proposal, user_id)
+    schedule_prerender("proposal", proposal.id)
     return proposal
 
 
@@ -769,6 +828,7 @@ def create_expense(db: Session, client_id: int | None, payload: schemas.ExpenseC
             expense.is_legacy = False
         db.commit()
         db.refresh(expense)
+    schedule_prerender("expense", expense.id)
     return expense
 
 
@@ -803,6 +863,7 @@ def update_expense(db: Session, expense: models.Expense, payload: schemas.Expens
         expense.is_legacy = False
         db.commit()
         db.refresh(expense)
+    schedule_prerender("expense", expense.id)
     return expense
 
 
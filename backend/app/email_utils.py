@@ -1,14 +1,18 @@
 from email.message import EmailMessage
-import smtplib
+from functools import lru_cache
 import logging
 from pathlib import Path
+from typing import NamedTuple
 
 from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
 from weasyprint import HTML
 
 from .config import settings as env_settings
 from .crud import get_or_create_settings
+from .pdf_cache import cache_key, get_cached_pdf, store_pdf
 from .security import decrypt_secret
+from .smtp_pool import SMTPConfig, open_connection, pool as smtp_pool
 
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
@@ -18,18 +22,74 @@ _jinja_env = Environment(
     loader=FileSystemLoader(str(TEMPLATES_DIR)),
     autoescape=select_autoescape(["html", "xml"]),
 )
+_email_env = Environment(
+    loader=FileSystemLoader(str(TEMPLATES_DIR / "email")),
+    autoescape=select_autoescape(["html"]),
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+
+_BANK_DETAIL_LABELS = (
+    ("bank_name", "Bank"),
+    ("bank_account_name", "Account name"),
+    ("bank_account_number", "Account number"),
+    ("bank_sort_code", "Sort code"),
+    ("bank_iban", "IBAN"),
+    ("bank_swift", "SWIFT/BIC"),
+    ("bank_reference", "Reference"),
+)
+_FRAGMENT_FIELDS = ("company_name",) + tuple(field for field, _label in _BANK_DETAIL_LABELS)
+
+
+class EmailFragments(NamedTuple):
+    company_name: str
+    bank_details_text: str
+    bank_details_html: Markup | None
+    signature_text: str
+    signature_html: Markup
 
 
 def _format_gbp(value):
     return f"£{float(value or 0):,.2f}"
 
 
-def _format_date(value):
+def _format_date(value, empty="—"):
     if not value:
-        return "—"
+        return empty
     return value.strftime("%d/%m/%Y")
 
 
+@lru_cache(maxsize=8)
+def _build_fragments(values):
+    values = dict(zip(_FRAGMENT_FIELDS, values))
+    company_name = values["company_name"] or "Your Company"
+    bank_lines = [
+        f"{label}: {values[field]}" for field, label in _BANK_DETAIL_LABELS if values[field]
+    ]
+    return EmailFragments(
+        company_name=company_name,
+        bank_details_text="\n".join(bank_lines),
+        bank_details_html=Markup("<br/>").join(bank_lines) if bank_lines else None,
+        signature_text=f"Best,\n{company_name}",
+        signature_html=Markup("<p>Best,<br />{}</p>").format(company_name),
+    )
+
+
+def _settings_fragments(app_settings) -> EmailFragments:
+    # Keyed on the values themselves, so the cache follows settings changes.
+    return _build_fragments(tuple(getattr(app_settings, field) for field in _FRAGMENT_FIELDS))
+
+
+def _write_pdf(html):
+    base_url = str(PUBLIC_DIR)
+    key = cache_key(html, base_url)
+    pdf_bytes = get_cached_pdf(key)
+    if pdf_bytes is None:
+        pdf_bytes = HTML(string=html, base_url=base_url).write_pdf()
+        store_pdf(key, pdf_bytes)
+    return pdf_bytes
+
+
 def render_invoice_pdf(
     company_name,
     invoice,
@@ -72,7 +132,7 @@ def render_invoice_pdf(
     }
     template = _jinja_env.get_template("invoice.html")
     html = template.render(**context)
-    return HTML(string=html, base_url=str(PUBLIC_DIR)).write_pdf()
+    return _write_pdf(html)
 
 
 def render_quote_pdf(company_name, quote, client, company_address="", company_invoice_email=""):
@@ -109,7 +169,7 @@ def render_quote_pdf(company_name, quote, client, company_address="", company_in
     }
     template = _jinja_env.get_template("quote.html")
     html = template.render(**context)
-    return HTML(string=html, base_url=str(PUBLIC_DIR)).write_pdf()
+    return _write_pdf(html)
 
 
 def render_agreement_pdf(
@@ -165,7 +225,7 @@ def render_agreement_pdf(
     }
     template = _jinja_env.get_template("agreement.html")
     html = template.render(**context)
-    return HTML(string=html, base_url=str(PUBLIC_DIR)).write_pdf()
+    return _write_pdf(html)
 
 
 def render_expense_pdf(company_name, expense, client, user, company_address=""):
@@ -193,7 +253,7 @@ def render_expense_pdf(company_name, expense, client, user, company_address=""):
     }
     template = _jinja_env.get_template("expense.html")
     html = template.render(**context)
-    return HTML(string=html, base_url=str(PUBLIC_DIR)).write_pdf()
+    return _write_pdf(html)
 
 
 def render_proposal_pdf(company_name, proposal, client, quote, company_address=""):
@@ -230,70 +290,26 @@ def render_proposal_pdf(company_name, proposal, client, quote, company_address="
     }
     template = _jinja_env.get_template("proposal.html")
     html = template.render(**context)
-    return HTML(string=html, base_url=str(PUBLIC_DIR)).write_pdf()
+    return _write_pdf(html)
 
 
-def generate_email_draft(entity_type, client, entity):
-    from .db import SessionLocal
-    db = SessionLocal()
-    try:
-        app_settings = get_or_create_settings(db)
-    finally:
-        db.close()
-    company_name = app_settings.company_name or "Your Company"
+def render_entity_pdf(entity_type, client, entity, app_settings):
+    fragments = _settings_fragments(app_settings)
+    company_name = fragments.company_name
     company_address = app_settings.company_address or ""
     company_invoice_email = app_settings.company_invoice_email or ""
-    subject = f"{entity_type.title()} update for {client.name}" if client else f"{entity_type.title()} update"
-    greeting_name = client.company or client.name if client else "there"
-    body_lines = [
-        f"Hi {greeting_name},",
-        "",
-    ]
-
-    def format_date(value):
-        if not value:
-            return "Not set"
-        return value.strftime("%d/%m/%Y")
-
-    bank_details = []
-    if app_settings.bank_name:
-        bank_details.append(f"Bank: {app_settings.bank_name}")
-    if app_settings.bank_account_name:
-        bank_details.append(f"Account name: {app_settings.bank_account_name}")
-    if app_settings.bank_account_number:
-        bank_details.append(f"Account number: {app_settings.bank_account_number}")
-    if app_settings.bank_sort_code:
-        bank_details.append(f"Sort code: {app_settings.bank_sort_code}")
-    if app_settings.bank_iban:
-        bank_details.append(f"IBAN: {app_settings.bank_iban}")
-    if app_settings.bank_swift:
-        bank_details.append(f"SWIFT/BIC: {app_settings.bank_swift}")
-    if app_settings.bank_reference:
-        bank_details.append(f"Reference: {app_settings.bank_reference}")
-    bank_details_html = "<br/>".join(bank_details) if bank_details else None
-
-    pdf_bytes = None
-    pdf_filename = None
 
     if entity_type == "invoice":
-        subject = f"{entity.display_id or f'#{entity.id}'} from {company_name}"
-        body_lines.append("Please find your invoice attached.")
-        body_lines.append("")
-        body_lines.append(f"Due date: {format_date(entity.due_date)}")
         pdf_bytes = render_invoice_pdf(
             company_name,
             entity,
             client,
-            bank_details_html,
+            fragments.bank_details_html,
             company_address=company_address,
             company_invoice_email=company_invoice_email,
         )
-        pdf_filename = f"{entity.display_id or f'INV-{entity.id}'}.pdf"
-    elif entity_type == "quote":
-        subject = f"{entity.display_id or f'#{entity.id}'} from {company_name}"
-        body_lines.append("Here's your quote attached.")
-        body_lines.append("")
-        body_lines.append(f"Valid until: {format_date(entity.valid_until)}")
+        return pdf_bytes, f"{entity.display_id or f'INV-{entity.id}'}.pdf"
+    if entity_type == "quote":
         pdf_bytes = render_quote_pdf(
             company_name,
             entity,
@@ -301,10 +317,8 @@ def generate_email_draft(entity_type, client, entity):
             company_address=company_address,
             company_invoice_email=company_invoice_email,
         )
-        pdf_filename = f"{entity.display_id or f'QUOTE-{entity.id}'}.pdf"
-    elif entity_type == "proposal":
-        subject = f"{entity.display_id or f'#{entity.id}'} from {company_name}"
-        body_lines.append("Please find the proposal attached for review.")
+        return pdf_bytes, f"{entity.display_id or f'QUOTE-{entity.id}'}.pdf"
+    if entity_type == "proposal":
         pdf_bytes = render_proposal_pdf(
             company_name,
             entity,
@@ -312,24 +326,18 @@ def generate_email_draft(entity_type, client, entity):
             getattr(entity, "quote", None),
             company_address=company_address,
         )
-        pdf_filename = f"{entity.display_id or f'PROP-{entity.id}'}.pdf"
-    elif entity_type == "agreement":
-        subject = f"{entity.display_id or f'#{entity.id}'} from {company_name}"
-        body_lines.append("Please find the service agreement attached.")
+        return pdf_bytes, f"{entity.display_id or f'PROP-{entity.id}'}.pdf"
+    if entity_type == "agreement":
         pdf_bytes = render_agreement_pdf(
             company_name,
             entity,
             client,
             getattr(entity, "quote", None),
-            bank_details_html,
+            fragments.bank_details_html,
             company_address=company_address,
         )
-        pdf_filename = f"{entity.display_id or f'AGR-{entity.id}'}.pdf"
-    elif entity_type == "expense":
-        subject = f"{entity.display_id or f'#{entity.id}'} from {company_name}"
-        body_lines.append("Here is the expense record attached for your records.")
-        body_lines.append("")
-        body_lines.append(f"Date incurred: {format_date(entity.incurred_date)}")
+        return pdf_bytes, f"{entity.display_id or f'AGR-{entity.id}'}.pdf"
+    if entity_type == "expense":
         pdf_bytes = render_expense_pdf(
             company_name,
             entity,
@@ -337,22 +345,82 @@ def generate_email_draft(entity_type, client, entity):
             entity.user if hasattr(entity, "user") else None,
             company_address=company_address,
         )
-        pdf_filename = f"{entity.display_id or f'EXP-{entity.id}'}.pdf"
-
-    body_lines.extend(
-        [
-            "",
-            "Let me know if you have any questions.",
-            "",
-            "Best,",
-            company_name,
-        ]
-    )
+        return pdf_bytes, f"{entity.display_id or f'EXP-{entity.id}'}.pdf"
+    return None, None
+
+
+def generate_email_draft(entity_type, client, entity):
+    from .db import SessionLocal
+    db = SessionLocal()
+    try:
+        app_settings = get_or_create_settings(db)
+    finally:
+        db.close()
+    fragments = _settings_fragments(app_settings)
+    if entity_type in {"invoice", "quote", "proposal", "agreement", "expense"}:
+        subject = f"{entity.display_id or f'#{entity.id}'} from {fragments.company_name}"
+    elif client:
+        subject = f"{entity_type.title()} update for {client.name}"
+    else:
+        subject = f"{entity_type.title()} update"
+    context = {
+        "entity_type": entity_type,
+        "greeting_name": client.company or client.name if client else "there",
+        "due_date": _format_date(getattr(entity, "due_date", None), empty="Not set"),
+        "valid_until": _format_date(getattr(entity, "valid_until", None), empty="Not set"),
+        "incurred_date": _format_date(getattr(entity, "incurred_date", None), empty="Not set"),
+        "fragments": fragments,
+    }
+    body = _email_env.get_template("document.txt").render(**context)
+    html_body = _email_env.get_template("document.html").render(**context)
+    pdf_bytes, pdf_filename = render_entity_pdf(entity_type, client, entity, app_settings)
+    return subject, body, html_body, pdf_bytes, pdf_filename
+
+
+def generate_reminder_email(client, invoices, app_settings):
+    fragments = _settings_fragments(app_settings)
+    if len(invoices) == 1:
+        subject = f"Payment reminder: {invoices[0].display_id or f'#{invoices[0].id}'} from {fragments.company_name}"
+    else:
+        subject = f"Payment reminder: {len(invoices)} overdue invoices from {fragments.company_name}"
+    context = {
+        "greeting_name": client.company or client.name,
+        "invoices": [
+            {
+                "display_id": invoice.display_id or f"#{invoice.id}",
+                "amount": _format_gbp(invoice.amount),
+                "due_date": _format_date(invoice.due_date),
+            }
+            for invoice in invoices
+        ],
+        "fragments": fragments,
+    }
+    body = _email_env.get_template("reminder.txt").render(**context)
+    html_body = _email_env.get_template("reminder.html").render(**context)
+    return subject, body, html_body
 
-    return subject, "\n".join(body_lines), pdf_bytes, pdf_filename
 
+def generate_mention_email(notification, actor_email, document, app_settings):
+    fragments = _settings_fragments(app_settings)
+    label = document.display_id or f"#{document.id}"
+    if getattr(document, "title", None):
+        label = f"{label} {document.title}"
+    actor = actor_email or "Someone"
+    context = {
+        "actor": actor,
+        "document": label,
+        "entity_type": notification.entity_type,
+        "field_key": notification.field_key,
+        "excerpt": notification.excerpt,
+        "fragments": fragments,
+    }
+    subject = f"{actor} mentioned you on {label}"
+    body = _email_env.get_template("mention.txt").render(**context)
+    html_body = _email_env.get_template("mention.html").render(**context)
+    return subject, body, html_body
 
-def send_email_smtp(to_email, subject, body, attachments=None):
+
+def _resolve_smtp_config():
     from .db import SessionLocal
     db = SessionLocal()
     try:
@@ -374,8 +442,22 @@ def send_email_smtp(to_email, subject, body, attachments=None):
         if app_settings.smtp_use_tls is not None
         else env_settings.smtp_use_tls
     )
-
     if not smtp_host:
+        return None, smtp_from
+    config = SMTPConfig(
+        host=smtp_host,
+        port=smtp_port,
+        username=smtp_username,
+        password=smtp_password,
+        use_tls=bool(smtp_use_tls),
+    )
+    return config, smtp_from
+
+
+def send_email_smtp(to_email, subject, body, attachments=None, html_body=None):
+    smtp_config, smtp_from = _resolve_smtp_config()
+
+    if not smtp_config:
         return False, "SMTP host not configured."
 
     if not to_email:
@@ -386,6 +468,8 @@ def send_email_smtp(to_email, subject, body, attachments=None):
     msg["From"] = smtp_from
     msg["To"] = to_email
     msg.set_content(body)
+    if html_body:
+        msg.add_alternative(html_body, subtype="html")
     if attachments:
         for attachment in attachments:
             msg.add_attachment(
@@ -396,18 +480,7 @@ def send_email_smtp(to_email, subject, body, attachments=None):
             )
 
     try:
-        if smtp_port == 465:
-            with smtplib.SMTP_SSL(smtp_host, smtp_port, timeout=10) as server:
-                if smtp_username and smtp_password:
-                    server.login(smtp_username, smtp_password)
-                server.send_message(msg)
-        else:
-            with smtplib.SMTP(smtp_host, smtp_port, timeout=10) as server:
-                if smtp_use_tls:
-                    server.starttls()
-                if smtp_username and smtp_password:
-                    server.login(smtp_username, smtp_password)
-                server.send_message(msg)
+        smtp_pool.send_message(smtp_config, msg)
         return True, "Email sent via SMTP."
     except Exception as exc:
         return False, f"SMTP send failed: {exc}"
@@ -415,53 +488,24 @@ def send_email_smtp(to_email, subject, body, attachments=None):
 
 def test_smtp_connection():
     logger = logging.getLogger("smtp_test")
-    from .db import SessionLocal
-    db = SessionLocal()
-    try:
-        app_settings = get_or_create_settings(db)
-    finally:
-        db.close()
+    smtp_config, smtp_from = _resolve_smtp_config()
 
-    smtp_host = app_settings.smtp_host or env_settings.smtp_host
-    smtp_port = app_settings.smtp_port or env_settings.smtp_port
-    smtp_username = app_settings.smtp_username or env_settings.smtp_username
-    smtp_password = (
-        decrypt_secret(app_settings.smtp_password)
-        or app_settings.smtp_password
-        or env_settings.smtp_password
-    )
-    smtp_use_tls = (
-        app_settings.smtp_use_tls
-        if app_settings.smtp_use_tls is not None
-        else env_settings.smtp_use_tls
-    )
-
-    if not smtp_host:
+    if not smtp_config:
         logger.warning("SMTP test failed: host missing.")
         return False, "SMTP host not configured."
 
     try:
         logger.warning(
             "SMTP test config: host=%s port=%s tls=%s username=%s from=%s password_set=%s",
-            smtp_host,
-            smtp_port,
-            smtp_use_tls,
-            smtp_username or "",
-            app_settings.smtp_from or env_settings.smtp_from,
-            bool(smtp_password),
+            smtp_config.host,
+            smtp_config.port,
+            smtp_config.use_tls,
+            smtp_config.username or "",
+            smtp_from,
+            bool(smtp_config.password),
         )
-        if smtp_port == 465:
-            with smtplib.SMTP_SSL(smtp_host, smtp_port, timeout=10) as server:
-                if smtp_username and smtp_password:
-                    server.login(smtp_username, smtp_password)
-                server.noop()
-        else:
-            with smtplib.SMTP(smtp_host, smtp_port, timeout=10) as server:
-                if smtp_use_tls:
-                    server.starttls()
-                if smtp_username and smtp_password:
-                    server.login(smtp_username, smtp_password)
-                server.noop()
+        with open_connection(smtp_config) as server:
+            server.noop()
         return True, "SMTP connection successful."
     except Exception as exc:
         logger.exception("SMTP test failed.")
@@ -1,111 +1,94 @@
+import io
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
-from uuid import uuid4
 
-from fastapi import Depends, FastAPI, HTTPException, Request, Response, UploadFile, File
+import anyio
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from . import crud, models, schemas
+from . import backups, comments, crud, models, notifications, outbox, reminders, schemas, uploads, versioning
 from .auth import clear_session, create_session, get_current_user, require_role, require_user
 from .config import settings
 from .db import Base, engine, get_db, SessionLocal
-from .email_utils import generate_email_draft, send_email_smtp, test_smtp_connection
+from .email_utils import generate_email_draft, test_smtp_connection
 from base64 import b64encode
 from .security import password_meets_policy, verify_password
+from .smtp_pool import pool as smtp_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    outbox.start_worker()
+    backups.start_scheduler()
+    yield
+    backups.stop_scheduler()
+    outbox.stop_worker()
+    smtp_pool.invalidate()
 
 
 app = FastAPI(
     title=settings.app_name,
+    lifespan=lifespan,
     docs_url="/docs" if settings.enable_docs else None,
     redoc_url="/redoc" if settings.enable_docs else None,
     openapi_url="/openapi.json" if settings.enable_docs else None,
 )
 
-ROOT_DIR = Path(__file__).resolve().parent.parent.parent
-UPLOADS_DIR = Path(__file__).resolve().parent.parent / "public" / "uploads"
+UPLOADS_DIR = backups.UPLOADS_DIR
 UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 app.mount("/uploads", StaticFiles(directory=str(UPLOADS_DIR)), name="uploads")
-BACKUP_DIR = ROOT_DIR / "backups"
+BACKUP_DIR = backups.BACKUP_DIR
 BACKUP_DIR.mkdir(parents=True, exist_ok=True)
 
 MAX_UPLOAD_BYTES = settings.max_upload_mb * 1024 * 1024
+MAX_BACKUP_UPLOAD_BYTES = settings.backup_max_upload_mb * 1024 * 1024
 _login_rate_cache: dict[str, dict[str, datetime | int]] = {}
 
 
-def _resolve_db_path() -> Path:
-    db_path = Path(__file__).resolve().parent.parent / "app.db"
-    docker_db_path = Path(__file__).resolve().parent.parent / "data" / "app.db"
-    return db_path if db_path.exists() else docker_db_path
-
-
-def _safe_extract(tar, path: Path):
-    for member in tar.getmembers():
-        member_path = Path(member.name)
-        if member_path.is_absolute() or ".." in member_path.parts:
-            raise HTTPException(status_code=400, detail="Unsafe path in backup archive.")
-    tar.extractall(path)
-
-
-def _save_upload_limited(uploaded: UploadFile, destination: Path, max_bytes: int):
-    total = 0
-    with destination.open("wb") as buffer:
-        while True:
-            chunk = uploaded.file.read(1024 * 1024)
-            if not chunk:
-                break
-            total += len(chunk)
-            if total > max_bytes:
-                raise HTTPException(status_code=413, detail="Upload exceeds size limit.")
-            buffer.write(chunk)
-
-
-def _clear_uploads():
-    if not UPLOADS_DIR.exists():
-        return
-    for item in UPLOADS_DIR.iterdir():
-        if item.name == ".gitkeep":
-            continue
-        if item.is_file():
-            item.unlink()
-        elif item.is_dir():
-            for child in item.rglob("*"):
-                if child.is_file():
-                    child.unlink()
-            for child in sorted(item.rglob("*"), reverse=True):
-                if child.is_dir():
-                    child.rmdir()
-            item.rmdir()
-
-
-def _restore_from_archive(archive_path: Path):
-    import tarfile
-    import tempfile
-    import shutil
+class _RequestBodyReader(io.RawIOBase):
+    """Blocking file view of a request body, for code running in the threadpool."""
 
-    if not archive_path.exists():
-        raise HTTPException(status_code=404, detail="Backup not found.")
+    def __init__(self, request: Request, max_bytes: int):
+        self._chunks = request.stream()
+        self._pending = memoryview(b"")
+        self._received = 0
+        self._max_bytes = max_bytes
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_dir_path = Path(temp_dir)
-        with tarfile.open(archive_path, "r:gz") as tar:
-            _safe_extract(tar, temp_dir_path)
+    def readable(self):
+        return True
 
-        extracted_db = temp_dir_path / "app.db"
-        if not extracted_db.exists():
-            raise HTTPException(status_code=400, detail="Backup missing app.db.")
+    def _next_chunk(self) -> bytes:
+        try:
+            return anyio.from_thread.run(self._chunks.__anext__)
+        except StopAsyncIteration:
+            return b""
 
-        target_db = _resolve_db_path()
-        engine.dispose()
-        shutil.copy2(extracted_db, target_db)
+    def readinto(self, buffer) -> int:
+        if not self._pending:
+            chunk = self._next_chunk()
+            self._received += len(chunk)
+            if self._received > self._max_bytes:
+                raise HTTPException(status_code=413, detail="Backup exceeds size limit.")
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
 
-        extracted_uploads = temp_dir_path / "uploads"
-        if extracted_uploads.exists():
-            _clear_uploads()
-            shutil.copytree(extracted_uploads, UPLOADS_DIR, dirs_exist_ok=True)
+
+def _restore_from_archive(source) -> dict:
+    import tarfile
+
+    try:
+        return backups.restore_backup(source)
+    except (ValueError, EOFError, tarfile.TarError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 allowed_origins = [
     origin.strip()
@@ -133,10 +116,14 @@ if settings.enable_docs:
 @app.middleware("http")
 async def upload_size_limit(request: Request, call_next):
     if request.method in {"POST", "PUT"}:
-        if request.url.path in {"/proposals/uploads", "/admin/restore/upload", "/expenses/uploads"}:
-            content_length = request.headers.get("content-length")
-            if content_length and int(content_length) > MAX_UPLOAD_BYTES:
-                return JSONResponse(status_code=413, content={"detail": "Upload exceeds size limit."})
+        limit = None
+        if request.url.path in {"/proposals/uploads", "/expenses/uploads"}:
+            limit = MAX_UPLOAD_BYTES
+        elif request.url.path == "/admin/restore/upload":
+            limit = MAX_BACKUP_UPLOAD_BYTES
+        content_length = request.headers.get("content-length")
+        if limit and content_length and int(content_length) > limit:
+            return JSONResponse(status_code=413, content={"detail": "Upload exceeds size limit."})
     return await call_next(request)
 
 
@@ -174,6 +161,7 @@ def update_settings(
     user=Depends(require_role(["owner", "admin"])),
 ):
     settings_row = crud.update_settings(db, payload)
+    smtp_pool.invalidate()
     settings_row.smtp_password = None
     return settings_row
 
@@ -188,81 +176,85 @@ def test_smtp(user=Depends(require_role(["owner", "admin"]))):
 
 @app.post("/admin/backup")
 def create_backup(payload: schemas.BackupRequest, user=Depends(require_role(["owner", "admin"]))):
-    import tarfile
-    from datetime import datetime
-    import tempfile
-
-    source_db = _resolve_db_path()
-    if not source_db.exists():
+    source_db = backups.resolve_db_path()
+    if source_db is None or not source_db.exists():
         raise HTTPException(status_code=500, detail="Database file not found.")
 
     if not payload.download and not payload.store:
         raise HTTPException(status_code=400, detail="Select download and/or store.")
 
-    timestamp = datetime.utcnow().strftime("%Y-%m-%d")
-    backup_name = f"cms-{timestamp}.tar.gz"
-
-    if payload.store:
-        backup_path = BACKUP_DIR / backup_name
-    else:
-        temp_file = tempfile.NamedTemporaryFile(prefix="cms-", suffix=".tar.gz", delete=False)
-        backup_path = Path(temp_file.name)
-        temp_file.close()
-
-    with tarfile.open(backup_path, "w:gz") as tar:
-        tar.add(str(source_db), arcname="app.db")
-        if UPLOADS_DIR.exists():
-            tar.add(str(UPLOADS_DIR), arcname="uploads")
-
-    if payload.download:
-        background = None
-        if not payload.store:
-            background = BackgroundTask(lambda: backup_path.unlink(missing_ok=True))
-        return FileResponse(
-            path=str(backup_path),
-            filename=backup_name,
-            media_type="application/gzip",
-            background=background,
+    if not payload.download:
+        return backups.start_backup()
+
+    backup_name = backups.backup_filename(reserve=payload.store)
+    if not payload.store:
+        try:
+            chunks = backups.stream_backup()
+        except ValueError as exc:
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
+        return StreamingResponse(
+            chunks,
+            media_type="application/x-tar",
+            headers={"Content-Disposition": f'attachment; filename="{backup_name}"'},
         )
 
-    return {"status": "stored", "filename": backup_name}
+    backup_path = BACKUP_DIR / backup_name
+    try:
+        # This copy is also downloaded, so it must not depend on older backups.
+        backups.store_backup(backup_name, incremental=False)
+    except ValueError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    except OSError as exc:
+        raise HTTPException(status_code=500, detail=f"Unable to write backup: {exc.strerror or exc}") from exc
+    return FileResponse(path=str(backup_path), filename=backup_name, media_type="application/x-tar")
+
+
+@app.get("/admin/backups/jobs/{job_id}", response_model=schemas.BackupJobOut)
+def get_backup_job(job_id: str, user=Depends(require_role(["owner", "admin"]))):
+    job = backups.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Backup job not found")
+    return job
 
 
 @app.get("/admin/backups")
-def list_backups(user=Depends(require_role(["owner", "admin"]))):
-    files = sorted(
-        [p.name for p in BACKUP_DIR.glob("*.tar.gz") if p.is_file()],
-        reverse=True,
-    )
-    return {"backups": files}
+def list_backups(db: Session = Depends(get_db), user=Depends(require_role(["owner", "admin"]))):
+    records = backups.list_catalog(db)
+    return {
+        "backups": [record.filename for record in records],
+        "records": [schemas.BackupRecordOut.model_validate(record) for record in records],
+    }
 
 
 @app.post("/admin/restore")
 def restore_backup(payload: schemas.RestoreRequest, user=Depends(require_role(["owner", "admin"]))):
     archive_path = BACKUP_DIR / payload.filename
-    _restore_from_archive(archive_path)
-    return {"status": "restored", "source": "server", "filename": payload.filename}
+    if not archive_path.exists():
+        raise HTTPException(status_code=404, detail="Backup not found.")
+    result = _restore_from_archive(archive_path)
+    return {"status": "restored", "source": "server", "filename": payload.filename, **result}
 
 
 @app.post("/admin/restore/upload")
-def restore_backup_upload(file: UploadFile = File(...), user=Depends(require_role(["owner", "admin"]))):
-    import tempfile
-    filename = file.filename or ""
-    if not filename.endswith(".tar.gz"):
-        raise HTTPException(status_code=400, detail="Only .tar.gz backups are supported.")
-    temp_file = tempfile.NamedTemporaryFile(prefix="cms-restore-", suffix=".tar.gz", delete=False)
-    temp_path = Path(temp_file.name)
-    temp_file.close()
-    _save_upload_limited(file, temp_path, MAX_UPLOAD_BYTES)
-    try:
-        _restore_from_archive(temp_path)
-    finally:
-        temp_path.unlink(missing_ok=True)
-    return {"status": "restored", "source": "upload"}
+async def restore_backup_upload(
+    request: Request,
+    filename: str = Query(...),
+    user=Depends(require_role(["owner", "admin"])),
+):
+    # The archive is the raw request body and is unpacked as it arrives, so
+    # no copy of the upload is written before the restore starts.
+    if not filename.endswith(backups.ARCHIVE_SUFFIXES):
+        raise HTTPException(status_code=400, detail="Only .tar and .tar.gz backups are supported.")
+    body = io.BufferedReader(_RequestBodyReader(request, MAX_BACKUP_UPLOAD_BYTES), 1024 * 1024)
+    result = await run_in_threadpool(_restore_from_archive, body)
+    return {"status": "restored", "source": "upload", **result}
 
 
 @app.post("/admin/reset")
 def reset_data(db: Session = Depends(get_db), user=Depends(require_role(["owner", "admin"]))):
+    db.query(models.EmailOutbox).delete()
+    db.query(models.Notification).delete()
+    db.query(models.User).update({models.User.unread_notifications: 0}, synchronize_session=False)
     db.query(models.AgreementVersionCommentReaction).delete()
     db.query(models.AgreementVersionComment).delete()
     db.query(models.ProposalVersionCommentReaction).delete()
@@ -271,6 +263,7 @@ def reset_data(db: Session = Depends(get_db), user=Depends(require_role(["owner"
     db.query(models.ProposalVersion).delete()
     db.query(models.ExpenseReceipt).delete()
     db.query(models.ProposalAttachment).delete()
+    db.query(models.UploadBlob).delete()
     db.query(models.ProposalRequirement).delete()
     db.query(models.ServiceAgreementSLA).delete()
     db.query(models.InvoiceLineItem).delete()
@@ -479,6 +472,14 @@ def delete_client(client_id: int, db: Session = Depends(get_db)):
     client = crud.get_client(db, client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
+    notifications.discard_for_entities(
+        db,
+        "agreement",
+        select(models.ServiceAgreement.id).where(models.ServiceAgreement.client_id == client.id),
+    )
+    notifications.discard_for_entities(
+        db, "proposal", select(models.Proposal.id).where(models.Proposal.client_id == client.id)
+    )
     crud.delete_client(db, client)
     return {"status": "deleted"}
 
@@ -498,31 +499,27 @@ def create_invoice(client_id: int, payload: schemas.InvoiceCreate, db: Session =
         if payload.send_now and first_invoice:
             to_email = client.invoice_email or client.contact_email or client.email
             if to_email:
-                subject, body, pdf_bytes, pdf_filename = generate_email_draft(
-                    "invoice", client, first_invoice
-                )
-                attachments = []
-                if pdf_bytes:
-                    attachments.append(
-                        {
-                            "content": pdf_bytes,
-                            "filename": pdf_filename or "invoice.pdf",
-                            "maintype": "application",
-                            "subtype": "pdf",
-                        }
-                    )
-                sent, _message = send_email_smtp(to_email, subject, body, attachments=attachments)
-                if not sent:
-                    first_invoice.status = "draft"
-                    db.commit()
-            else:
-                first_invoice.status = "draft"
-                db.commit()
+                outbox.enqueue_email(db, "invoice", first_invoice.id, to_email)
         return created
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
+@app.post("/invoices/reminders", response_model=schemas.ReminderRunOut)
+def start_invoice_reminders(payload: schemas.ReminderRunRequest, user=Depends(require_user)):
+    if payload.rate_per_minute is not None and payload.rate_per_minute < 1:
+        raise HTTPException(status_code=400, detail="Rate must be at least one email per minute.")
+    return reminders.start_run(payload.invoice_ids, payload.rate_per_minute)
+
+
+@app.get("/invoices/reminders/{run_id}", response_model=schemas.ReminderRunOut)
+def get_invoice_reminder_run(run_id: str, user=Depends(require_user)):
+    run = reminders.get_run(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Reminder run not found")
+    return run
+
+
 @app.get("/invoices/{invoice_id}", response_model=schemas.InvoiceOut)
 def get_invoice(invoice_id: int, db: Session = Depends(get_db)):
     invoice = db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
@@ -660,33 +657,55 @@ def delete_agreement(agreement_id: int, db: Session = Depends(get_db)):
     agreement = db.query(models.ServiceAgreement).filter(models.ServiceAgreement.id == agreement_id).first()
     if not agreement:
         raise HTTPException(status_code=404, detail="Agreement not found")
+    notifications.discard_for_entities(db, "agreement", [agreement.id])
     db.delete(agreement)
     db.commit()
     return {"status": "deleted"}
 
 
+@app.get("/versions/stats", response_model=dict[str, schemas.VersionWriteStats])
+def get_version_write_stats(user=Depends(require_role(["owner", "admin"]))):
+    return versioning.write_stats()
+
+
 @app.get("/agreements/{agreement_id}/versions", response_model=list[schemas.AgreementVersionOut])
 def list_agreement_versions(
     agreement_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_db),
     user=Depends(require_user),
 ):
-    agreement = db.query(models.ServiceAgreement).filter(models.ServiceAgreement.id == agreement_id).first()
-    if not agreement:
+    exists = db.query(models.ServiceAgreement.id).filter(models.ServiceAgreement.id == agreement_id).first()
+    if not exists:
         raise HTTPException(status_code=404, detail="Agreement not found")
-    versions = (
-        db.query(models.ServiceAgreementVersion)
-        .filter(models.ServiceAgreementVersion.agreement_id == agreement_id)
-        .order_by(models.ServiceAgreementVersion.version_number.desc())
-        .all()
+    return versioning.list_versions(db, versioning.AGREEMENT, agreement_id, limit, offset)
+
+
+@app.get("/agreements/{agreement_id}/versions/diff", response_model=schemas.VersionDiffOut)
+def diff_agreement_versions(
+    agreement_id: int,
+    from_version: int = Query(..., alias="from"),
+    to_version: int = Query(..., alias="to"),
+    db: Session = Depends(get_db),
+    user=Depends(require_user),
+):
+    exists = db.query(models.ServiceAgreement.id).filter(models.ServiceAgreement.id == agreement_id).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Agreement not found")
+    before = versioning.get_version_by_number(db, versioning.AGREEMENT, agreement_id, from_version)
+    after = versioning.get_version_by_number(db, versioning.AGREEMENT, agreement_id, to_version)
+    if not before or not after:
+        raise HTTPException(status_code=404, detail="Version not found")
+    return schemas.VersionDiffOut(
+        from_version=from_version,
+        to_version=to_version,
+        changes=versioning.diff_versions(db, versioning.AGREEMENT, before, after),
     )
-    for version in versions:
-        version.is_current = version.version_number == agreement.current_version
-    return versions
 
 
-@app.post("/agreements/{agreement_id}/versions/{version_id}/restore", response_model=schemas.AgreementOut)
-def restore_agreement_version(
+@app.get("/agreements/{agreement_id}/versions/{version_id}", response_model=schemas.AgreementVersionSnapshotOut)
+def get_agreement_version(
     agreement_id: int,
     version_id: int,
     db: Session = Depends(get_db),
@@ -702,150 +721,200 @@ def restore_agreement_version(
     )
     if not version or version.agreement_id != agreement_id:
         raise HTTPException(status_code=404, detail="Version not found")
-    return crud.restore_agreement_version(db, agreement, version, user_id=user.id)
+    payload = versioning.load_payload(db, versioning.AGREEMENT, version)
+    return schemas.AgreementVersionSnapshotOut(
+        id=version.id,
+        agreement_id=version.agreement_id,
+        version_number=version.version_number,
+        title=version.title,
+        created_at=version.created_at,
+        created_by_email=version.created_by_email,
+        is_current=version.version_number == agreement.current_version,
+        data=payload["data_json"] or {},
+        sla_items=payload["sla_items_json"] or [],
+    )
 
 
-@app.get("/agreements/versions/{version_id}/comments", response_model=list[schemas.AgreementCommentOut])
-def list_agreement_comments(
+@app.post("/agreements/{agreement_id}/versions/{version_id}/restore", response_model=schemas.AgreementOut)
+def restore_agreement_version(
+    agreement_id: int,
     version_id: int,
-    field_key: str | None = None,
-    all_versions: bool = False,
     db: Session = Depends(get_db),
     user=Depends(require_user),
 ):
+    agreement = db.query(models.ServiceAgreement).filter(models.ServiceAgreement.id == agreement_id).first()
+    if not agreement:
+        raise HTTPException(status_code=404, detail="Agreement not found")
     version = (
         db.query(models.ServiceAgreementVersion)
         .filter(models.ServiceAgreementVersion.id == version_id)
         .first()
     )
-    if not version:
+    if not version or version.agreement_id != agreement_id:
         raise HTTPException(status_code=404, detail="Version not found")
-    query = db.query(models.AgreementVersionComment)
-    if all_versions:
-        query = query.join(
-            models.ServiceAgreementVersion,
-            models.AgreementVersionComment.agreement_version_id
-            == models.ServiceAgreementVersion.id,
-        ).filter(models.ServiceAgreementVersion.agreement_id == version.agreement_id)
-    else:
-        query = query.filter(models.AgreementVersionComment.agreement_version_id == version_id)
-    if field_key:
-        query = query.filter(models.AgreementVersionComment.field_key == field_key)
-    return query.order_by(models.AgreementVersionComment.created_at.asc()).all()
+    return crud.restore_agreement_version(db, agreement, version, user_id=user.id)
 
 
-@app.post("/agreements/versions/{version_id}/comments", response_model=schemas.AgreementCommentOut)
-def add_agreement_comment(
-    version_id: int,
-    payload: schemas.AgreementCommentCreate,
+def _add_comment_routes(spec: comments.CommentSpec):
+    """Register the version comment endpoints for one commentable entity."""
+    prefix = f"/{spec.entity_type}s"
+    entity = spec.entity_type
+    out_schema = spec.out_schema
+
+    def _version_or_404(db: Session, version_id: int):
+        version = comments.get_version(db, spec, version_id)
+        if not version:
+            raise HTTPException(status_code=404, detail="Version not found")
+        return version
+
+    def _comment_or_404(db: Session, comment_id: int):
+        comment = comments.get_comment(db, spec, comment_id)
+        if not comment:
+            raise HTTPException(status_code=404, detail="Comment not found")
+        return comment
+
+    @app.get(
+        f"{prefix}/versions/{{version_id}}/comments",
+        response_model=list[out_schema],
+        name=f"list_{entity}_comments",
+    )
+    def list_comments(
+        version_id: int,
+        field_key: str | None = None,
+        all_versions: bool = False,
+        db: Session = Depends(get_db),
+        user=Depends(require_user),
+    ):
+        version = _version_or_404(db, version_id)
+        return comments.list_comments(db, spec, version, field_key=field_key, all_versions=all_versions)
+
+    @app.get(
+        f"{prefix}/versions/{{version_id}}/comments/summary",
+        response_model=list[schemas.CommentFieldSummary],
+        name=f"summarize_{entity}_comments",
+    )
+    def summarize_comments(
+        version_id: int,
+        all_versions: bool = False,
+        db: Session = Depends(get_db),
+        user=Depends(require_user),
+    ):
+        version = _version_or_404(db, version_id)
+        return comments.summarize_comments(db, spec, version, all_versions=all_versions)
+
+    @app.post(
+        f"{prefix}/versions/{{version_id}}/comments",
+        response_model=out_schema,
+        name=f"add_{entity}_comment",
+    )
+    def add_comment(
+        version_id: int,
+        payload: schemas.CommentCreate,
+        db: Session = Depends(get_db),
+        user=Depends(require_user),
+    ):
+        _version_or_404(db, version_id)
+        comment = comments.add_comment(db, spec, version_id, payload, user.id)
+        return comments.comment_out(db, spec, comment.id)
+
+    @app.patch(
+        f"{prefix}/comments/{{comment_id}}",
+        response_model=out_schema,
+        name=f"update_{entity}_comment_status",
+    )
+    def update_comment_status(
+        comment_id: int,
+        payload: schemas.CommentStatusUpdate,
+        db: Session = Depends(get_db),
+        user=Depends(require_user),
+    ):
+        comment = _comment_or_404(db, comment_id)
+        comments.set_implemented(db, comment, payload.implemented)
+        return comments.comment_out(db, spec, comment_id)
+
+    @app.delete(f"{prefix}/comments/{{comment_id}}", name=f"delete_{entity}_comment")
+    def delete_comment(
+        comment_id: int,
+        db: Session = Depends(get_db),
+        user=Depends(require_user),
+    ):
+        comment = _comment_or_404(db, comment_id)
+        if comment.created_by_user_id != user.id and user.role not in ("owner", "admin"):
+            raise HTTPException(status_code=403, detail="Not allowed to delete this comment")
+        comments.delete_comment(db, spec, comment)
+        return {"detail": "Comment deleted"}
+
+    @app.post(
+        f"{prefix}/comments/{{comment_id}}/reaction",
+        response_model=out_schema,
+        name=f"react_{entity}_comment",
+    )
+    def react_comment(
+        comment_id: int,
+        payload: schemas.CommentReactionRequest,
+        db: Session = Depends(get_db),
+        user=Depends(require_user),
+    ):
+        _comment_or_404(db, comment_id)
+        try:
+            comments.toggle_reaction(db, spec, comment_id, user.id, payload.reaction)
+        except ValueError as exc:
+            raise HTTPException(status_code=409, detail=str(exc)) from exc
+        return comments.comment_out(db, spec, comment_id)
+
+
+_add_comment_routes(comments.AGREEMENT)
+
+
+@app.post("/comments/reactions/reconcile")
+def reconcile_comment_reactions(
     db: Session = Depends(get_db),
-    user=Depends(require_user),
+    user=Depends(require_role(["owner", "admin"])),
 ):
-    comment = models.AgreementVersionComment(
-        agreement_version_id=version_id,
-        field_key=payload.field_key,
-        comment=payload.comment,
-        mentions=payload.mentions or [],
-        created_by_user_id=user.id,
-    )
-    db.add(comment)
-    db.commit()
-    db.refresh(comment)
-    return comment
+    return {"fixed": comments.reconcile_reaction_counts(db)}
 
 
-@app.patch("/agreements/comments/{comment_id}", response_model=schemas.AgreementCommentOut)
-def update_agreement_comment_status(
-    comment_id: int,
-    payload: schemas.CommentStatusUpdate,
+@app.post("/admin/uploads/gc")
+def collect_upload_garbage(
+    adopt: bool = False,
     db: Session = Depends(get_db),
-    user=Depends(require_user),
+    user=Depends(require_role(["owner", "admin"])),
 ):
-    comment = (
-        db.query(models.AgreementVersionComment)
-        .filter(models.AgreementVersionComment.id == comment_id)
-        .first()
-    )
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    comment.implemented = payload.implemented
-    db.commit()
-    db.refresh(comment)
-    return comment
+    adopted = uploads.adopt_untracked(db, UPLOADS_DIR) if adopt else 0
+    return {"adopted": adopted, **uploads.collect_garbage(db, UPLOADS_DIR)}
 
 
-@app.delete("/agreements/comments/{comment_id}")
-def delete_agreement_comment(
-    comment_id: int,
+@app.get("/notifications", response_model=list[schemas.NotificationOut])
+def list_notifications(
+    unread_only: bool = False,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_db),
     user=Depends(require_user),
 ):
-    comment = (
-        db.query(models.AgreementVersionComment)
-        .filter(models.AgreementVersionComment.id == comment_id)
-        .first()
-    )
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    if comment.created_by_user_id != user.id and user.role not in ("owner", "admin"):
-        raise HTTPException(status_code=403, detail="Not allowed to delete this comment")
-    db.delete(comment)
-    db.commit()
-    return {"detail": "Comment deleted"}
+    return notifications.list_notifications(db, user.id, unread_only=unread_only, limit=limit, offset=offset)
 
 
-@app.post("/agreements/comments/{comment_id}/reaction", response_model=schemas.AgreementCommentOut)
-def react_agreement_comment(
-    comment_id: int,
-    payload: schemas.CommentReactionRequest,
+@app.get("/notifications/unread-count", response_model=schemas.NotificationCountOut)
+def unread_notification_count(db: Session = Depends(get_db), user=Depends(require_user)):
+    return {"unread": notifications.unread_count(db, user.id)}
+
+
+@app.post("/notifications/{notification_id}/read", response_model=schemas.NotificationCountOut)
+def mark_notification_read(
+    notification_id: int,
     db: Session = Depends(get_db),
     user=Depends(require_user),
 ):
-    comment = (
-        db.query(models.AgreementVersionComment)
-        .filter(models.AgreementVersionComment.id == comment_id)
-        .first()
-    )
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    reaction = payload.reaction
-    existing = (
-        db.query(models.AgreementVersionCommentReaction)
-        .filter(
-            models.AgreementVersionCommentReaction.comment_id == comment_id,
-            models.AgreementVersionCommentReaction.user_id == user.id,
-        )
-        .first()
-    )
-    if existing and existing.reaction == reaction:
-        if reaction == "like":
-            comment.like_count = max(0, comment.like_count - 1)
-        else:
-            comment.dislike_count = max(0, comment.dislike_count - 1)
-        db.delete(existing)
-    elif existing:
-        if existing.reaction == "like":
-            comment.like_count = max(0, comment.like_count - 1)
-        else:
-            comment.dislike_count = max(0, comment.dislike_count - 1)
-        if reaction == "like":
-            comment.like_count += 1
-        else:
-            comment.dislike_count += 1
-        existing.reaction = reaction
-    else:
-        if reaction == "like":
-            comment.like_count += 1
-        else:
-            comment.dislike_count += 1
-        db.add(
-            models.AgreementVersionCommentReaction(
-                comment_id=comment_id, user_id=user.id, reaction=reaction
-            )
-        )
-    db.commit()
-    db.refresh(comment)
-    return comment
+    if not notifications.mark_read(db, user.id, notification_id):
+        raise HTTPException(status_code=404, detail="Notification not found")
+    return {"unread": notifications.unread_count(db, user.id)}
+
+
+@app.post("/notifications/read-all", response_model=schemas.NotificationCountOut)
+def mark_all_notifications_read(db: Session = Depends(get_db), user=Depends(require_user)):
+    notifications.mark_all_read(db, user.id)
+    return {"unread": notifications.unread_count(db, user.id)}
 
 
 @app.get("/proposals", response_model=list[schemas.ProposalOut])
@@ -904,6 +973,7 @@ def delete_proposal(proposal_id: int, db: Session = Depends(get_db)):
     proposal = db.query(models.Proposal).filter(models.Proposal.id == proposal_id).first()
     if not proposal:
         raise HTTPException(status_code=404, detail="Proposal not found")
+    notifications.discard_for_entities(db, "proposal", [proposal.id])
     db.delete(proposal)
     db.commit()
     return {"status": "deleted"}
@@ -912,25 +982,41 @@ def delete_proposal(proposal_id: int, db: Session = Depends(get_db)):
 @app.get("/proposals/{proposal_id}/versions", response_model=list[schemas.ProposalVersionOut])
 def list_proposal_versions(
     proposal_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_db),
     user=Depends(require_user),
 ):
-    proposal = db.query(models.Proposal).filter(models.Proposal.id == proposal_id).first()
-    if not proposal:
+    exists = db.query(models.Proposal.id).filter(models.Proposal.id == proposal_id).first()
+    if not exists:
         raise HTTPException(status_code=404, detail="Proposal not found")
-    versions = (
-        db.query(models.ProposalVersion)
-        .filter(models.ProposalVersion.proposal_id == proposal_id)
-        .order_by(models.ProposalVersion.version_number.desc())
-        .all()
+    return versioning.list_versions(db, versioning.PROPOSAL, proposal_id, limit, offset)
+
+
+@app.get("/proposals/{proposal_id}/versions/diff", response_model=schemas.VersionDiffOut)
+def diff_proposal_versions(
+    proposal_id: int,
+    from_version: int = Query(..., alias="from"),
+    to_version: int = Query(..., alias="to"),
+    db: Session = Depends(get_db),
+    user=Depends(require_user),
+):
+    exists = db.query(models.Proposal.id).filter(models.Proposal.id == proposal_id).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Proposal not found")
+    before = versioning.get_version_by_number(db, versioning.PROPOSAL, proposal_id, from_version)
+    after = versioning.get_version_by_number(db, versioning.PROPOSAL, proposal_id, to_version)
+    if not before or not after:
+        raise HTTPException(status_code=404, detail="Version not found")
+    return schemas.VersionDiffOut(
+        from_version=from_version,
+        to_version=to_version,
+        changes=versioning.diff_versions(db, versioning.PROPOSAL, before, after),
     )
-    for version in versions:
-        version.is_current = version.version_number == proposal.current_version
-    return versions
 
 
-@app.post("/proposals/{proposal_id}/versions/{version_id}/restore", response_model=schemas.ProposalOut)
-def restore_proposal_version(
+@app.get("/proposals/{proposal_id}/versions/{version_id}", response_model=schemas.ProposalVersionSnapshotOut)
+def get_proposal_version(
     proposal_id: int,
     version_id: int,
     db: Session = Depends(get_db),
@@ -946,190 +1032,80 @@ def restore_proposal_version(
     )
     if not version or version.proposal_id != proposal_id:
         raise HTTPException(status_code=404, detail="Version not found")
-    return crud.restore_proposal_version(db, proposal, version, user_id=user.id)
+    payload = versioning.load_payload(db, versioning.PROPOSAL, version)
+    return schemas.ProposalVersionSnapshotOut(
+        id=version.id,
+        proposal_id=version.proposal_id,
+        version_number=version.version_number,
+        title=version.title,
+        status=version.status,
+        created_at=version.created_at,
+        created_by_email=version.created_by_email,
+        is_current=version.version_number == proposal.current_version,
+        data=payload["data_json"] or {},
+        requirements=payload["requirements_json"] or [],
+        attachments=payload["attachments_json"] or [],
+    )
 
 
-@app.get("/proposals/versions/{version_id}/comments", response_model=list[schemas.ProposalCommentOut])
-def list_proposal_comments(
+@app.post("/proposals/{proposal_id}/versions/{version_id}/restore", response_model=schemas.ProposalOut)
+def restore_proposal_version(
+    proposal_id: int,
     version_id: int,
-    field_key: str | None = None,
-    all_versions: bool = False,
     db: Session = Depends(get_db),
     user=Depends(require_user),
 ):
+    proposal = db.query(models.Proposal).filter(models.Proposal.id == proposal_id).first()
+    if not proposal:
+        raise HTTPException(status_code=404, detail="Proposal not found")
     version = (
         db.query(models.ProposalVersion)
         .filter(models.ProposalVersion.id == version_id)
         .first()
     )
-    if not version:
+    if not version or version.proposal_id != proposal_id:
         raise HTTPException(status_code=404, detail="Version not found")
-    query = db.query(models.ProposalVersionComment)
-    if all_versions:
-        query = query.join(
-            models.ProposalVersion,
-            models.ProposalVersionComment.proposal_version_id == models.ProposalVersion.id,
-        ).filter(models.ProposalVersion.proposal_id == version.proposal_id)
-    else:
-        query = query.filter(models.ProposalVersionComment.proposal_version_id == version_id)
-    if field_key:
-        query = query.filter(models.ProposalVersionComment.field_key == field_key)
-    return query.order_by(models.ProposalVersionComment.created_at.asc()).all()
-
-
-@app.post("/proposals/versions/{version_id}/comments", response_model=schemas.ProposalCommentOut)
-def add_proposal_comment(
-    version_id: int,
-    payload: schemas.ProposalCommentCreate,
-    db: Session = Depends(get_db),
-    user=Depends(require_user),
-):
-    comment = models.ProposalVersionComment(
-        proposal_version_id=version_id,
-        field_key=payload.field_key,
-        comment=payload.comment,
-        mentions=payload.mentions or [],
-        created_by_user_id=user.id,
-    )
-    db.add(comment)
-    db.commit()
-    db.refresh(comment)
-    return comment
-
-
-@app.patch("/proposals/comments/{comment_id}", response_model=schemas.ProposalCommentOut)
-def update_proposal_comment_status(
-    comment_id: int,
-    payload: schemas.CommentStatusUpdate,
-    db: Session = Depends(get_db),
-    user=Depends(require_user),
-):
-    comment = (
-        db.query(models.ProposalVersionComment)
-        .filter(models.ProposalVersionComment.id == comment_id)
-        .first()
-    )
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    comment.implemented = payload.implemented
-    db.commit()
-    db.refresh(comment)
-    return comment
+    return crud.restore_proposal_version(db, proposal, version, user_id=user.id)
 
 
-@app.delete("/proposals/comments/{comment_id}")
-def delete_proposal_comment(
-    comment_id: int,
-    db: Session = Depends(get_db),
-    user=Depends(require_user),
-):
-    comment = (
-        db.query(models.ProposalVersionComment)
-        .filter(models.ProposalVersionComment.id == comment_id)
-        .first()
-    )
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    if comment.created_by_user_id != user.id and user.role not in ("owner", "admin"):
-        raise HTTPException(status_code=403, detail="Not allowed to delete this comment")
-    db.delete(comment)
-    db.commit()
-    return {"detail": "Comment deleted"}
+_add_comment_routes(comments.PROPOSAL)
 
 
-@app.post("/proposals/comments/{comment_id}/reaction", response_model=schemas.ProposalCommentOut)
-def react_proposal_comment(
-    comment_id: int,
-    payload: schemas.CommentReactionRequest,
-    db: Session = Depends(get_db),
-    user=Depends(require_user),
-):
-    comment = (
-        db.query(models.ProposalVersionComment)
-        .filter(models.ProposalVersionComment.id == comment_id)
-        .first()
-    )
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    reaction = payload.reaction
-    existing = (
-        db.query(models.ProposalVersionCommentReaction)
-        .filter(
-            models.ProposalVersionCommentReaction.comment_id == comment_id,
-            models.ProposalVersionCommentReaction.user_id == user.id,
-        )
-        .first()
-    )
-    if existing and existing.reaction == reaction:
-        if reaction == "like":
-            comment.like_count = max(0, comment.like_count - 1)
-        else:
-            comment.dislike_count = max(0, comment.dislike_count - 1)
-        db.delete(existing)
-    elif existing:
-        if existing.reaction == "like":
-            comment.like_count = max(0, comment.like_count - 1)
-        else:
-            comment.dislike_count = max(0, comment.dislike_count - 1)
-        if reaction == "like":
-            comment.like_count += 1
-        else:
-            comment.dislike_count += 1
-        existing.reaction = reaction
-    else:
-        if reaction == "like":
-            comment.like_count += 1
-        else:
-            comment.dislike_count += 1
-        db.add(
-            models.ProposalVersionCommentReaction(
-                comment_id=comment_id, user_id=user.id, reaction=reaction
-            )
+async def _store_uploads(request: Request, db: Session, allowed: set[str], error: str) -> list[dict]:
+    try:
+        received = await uploads.receive_uploads(
+            db,
+            request.stream(),
+            request.headers.get("content-type", ""),
+            UPLOADS_DIR,
+            allowed,
+            error,
+            MAX_UPLOAD_BYTES,
         )
-    db.commit()
-    db.refresh(comment)
-    return comment
+    except uploads.UploadTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return [
+        {
+            "filename": original,
+            "file_path": file_path,
+        }
+        for original, file_path, _size, _written in received
+    ]
 
 
 @app.post("/proposals/uploads")
-def upload_proposal_assets(files: list[UploadFile] = File(...)):
-    saved = []
-    for uploaded in files:
-        if not uploaded.filename:
-            continue
-        suffix = Path(uploaded.filename).suffix.lower()
-        if suffix not in {".png", ".jpg", ".jpeg", ".webp"}:
-            raise HTTPException(status_code=400, detail="Only image files are supported.")
-        filename = f"{uuid4().hex}{suffix}"
-        destination = UPLOADS_DIR / filename
-        _save_upload_limited(uploaded, destination, MAX_UPLOAD_BYTES)
-        saved.append(
-            {
-                "filename": uploaded.filename,
-                "file_path": f"uploads/{filename}",
-            }
-        )
+async def upload_proposal_assets(request: Request, db: Session = Depends(get_db)):
+    saved = await _store_uploads(request, db, {".png", ".jpg", ".jpeg", ".webp"}, "Only image files are supported.")
     return {"files": saved}
 
 
 @app.post("/expenses/uploads")
-def upload_expense_receipts(files: list[UploadFile] = File(...)):
-    saved = []
-    for uploaded in files:
-        if not uploaded.filename:
-            continue
-        suffix = Path(uploaded.filename).suffix.lower()
-        if suffix not in {".png", ".jpg", ".jpeg", ".webp", ".pdf"}:
-            raise HTTPException(status_code=400, detail="Only PDF or image files are supported.")
-        filename = f"{uuid4().hex}{suffix}"
-        destination = UPLOADS_DIR / filename
-        _save_upload_limited(uploaded, destination, MAX_UPLOAD_BYTES)
-        saved.append(
-            {
-                "filename": uploaded.filename,
-                "file_path": f"uploads/{filename}",
-            }
-        )
+async def upload_expense_receipts(request: Request, db: Session = Depends(get_db)):
+    saved = await _store_uploads(
+        request, db, {".png", ".jpg", ".jpeg", ".webp", ".pdf"}, "Only PDF or image files are supported."
+    )
     return {"files": saved}
 
 
@@ -1188,29 +1164,8 @@ def delete_expense(expense_id: int, db: Session = Depends(get_db)):
 
 def create_email_draft(payload: schemas.EmailDraftRequest, db: Session = Depends(get_db)):
     entity_type = payload.entity_type.lower()
-    entity = None
-    client = None
-
-    if entity_type == "invoice":
-        entity = db.query(models.Invoice).filter(models.Invoice.id == payload.entity_id).first()
-        if entity:
-            client = entity.client
-    elif entity_type == "quote":
-        entity = db.query(models.Quote).filter(models.Quote.id == payload.entity_id).first()
-        if entity:
-            client = entity.client
-    elif entity_type == "proposal":
-        entity = db.query(models.Proposal).filter(models.Proposal.id == payload.entity_id).first()
-        if entity:
-            client = entity.client
-    elif entity_type == "agreement":
-        entity = db.query(models.ServiceAgreement).filter(models.ServiceAgreement.id == payload.entity_id).first()
-        if entity:
-            client = entity.client
-    elif entity_type == "expense":
-        entity = db.query(models.Expense).filter(models.Expense.id == payload.entity_id).first()
-        if entity:
-            client = entity.client
+    entity = crud.get_document(db, entity_type, payload.entity_id)
+    client = entity.client if entity else None
     if entity_type == "expense":
         if not entity:
             raise HTTPException(status_code=404, detail="Entity not found")
@@ -1218,38 +1173,54 @@ def create_email_draft(payload: schemas.EmailDraftRequest, db: Session = Depends
         if not entity or not client:
             raise HTTPException(status_code=404, detail="Entity not found")
 
-    subject, body, pdf_bytes, pdf_filename = generate_email_draft(entity_type, client, entity)
-
     if payload.send:
-        attachments = []
-        if pdf_bytes:
-            attachments.append(
-                {
-                    "content": pdf_bytes,
-                    "filename": pdf_filename or "document.pdf",
-                    "maintype": "application",
-                    "subtype": "pdf",
-                }
-            )
-        sent, message = send_email_smtp(payload.to_email, subject, body, attachments=attachments)
-        if sent:
-            if entity_type == "invoice" and entity.status != "paid":
-                entity.status = "sent"
-                db.commit()
-            elif entity_type == "quote" and entity.status == "draft":
-                entity.status = "sent"
-                db.commit()
-            elif entity_type == "proposal" and entity.status == "draft":
-                entity.status = "sent"
-                db.commit()
-    else:
-        sent, message = False, "Draft generated."
+        # Rendering is left to the outbox worker, so queueing costs the same
+        # however large the document is.
+        if not payload.to_email:
+            raise HTTPException(status_code=400, detail="Recipient email is required for sending.")
+        queued_entry = outbox.enqueue_email(db, entity_type, entity.id, payload.to_email)
+        return schemas.EmailDraftResponse(
+            sent=False,
+            queued=True,
+            outbox_id=queued_entry.id,
+            message="Email queued for delivery.",
+        )
 
+    subject, body, _html_body, pdf_bytes, pdf_filename = generate_email_draft(
+        entity_type, client, entity
+    )
     return schemas.EmailDraftResponse(
         subject=subject,
         body=body,
-        sent=sent,
-        message=message,
+        sent=False,
+        message="Draft generated.",
         pdf_base64=b64encode(pdf_bytes).decode("utf-8") if pdf_bytes else None,
         pdf_filename=pdf_filename,
     )
+
+
+@app.get("/email/outbox", response_model=list[schemas.EmailOutboxOut])
+def list_email_outbox(
+    status: str | None = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    user=Depends(require_role(["owner", "admin"])),
+):
+    query = db.query(models.EmailOutbox)
+    if status:
+        query = query.filter(models.EmailOutbox.status == status)
+    return query.order_by(models.EmailOutbox.created_at.desc()).limit(min(limit, 500)).all()
+
+
+@app.post("/email/outbox/{entry_id}/retry", response_model=schemas.EmailOutboxOut)
+def retry_email_outbox(
+    entry_id: int,
+    db: Session = Depends(get_db),
+    user=Depends(require_role(["owner", "admin"])),
+):
+    entry = db.query(models.EmailOutbox).filter(models.EmailOutbox.id == entry_id).first()
+    if not entry:
+        raise HTTPException(status_code=404, detail="Outbox entry not found")
+    if entry.status != "dead":
+        raise HTTPException(status_code=400, detail="Only failed emails can be retried.")
+    return outbox.retry_dead_letter(db, entry)
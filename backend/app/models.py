@@ -1,8 +1,9 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, Numeric, String, Text, UniqueConstraint, JSON
+from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Index, Integer, Numeric, String, Text, UniqueConstraint, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from .compression import CompressedText
 from .db import Base
 
 
@@ -41,6 +42,7 @@ class Client(Base):
 
 class Invoice(Base):
     __tablename__ = "invoices"
+    __table_args__ = (Index("ix_invoices_due_date_status", "due_date", "status"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     display_id: Mapped[str | None] = mapped_column(String(30), unique=True, index=True)
@@ -250,13 +252,17 @@ class ProposalAttachment(Base):
         ForeignKey("proposals.id", ondelete="CASCADE"), nullable=False
     )
     filename: Mapped[str] = mapped_column(String(300), nullable=False)
-    file_path: Mapped[str] = mapped_column(String(500), nullable=False)
+    file_path: Mapped[str] = mapped_column(String(500), nullable=False, index=True)
 
     proposal: Mapped["Proposal"] = relationship("Proposal", back_populates="attachments")
 
 
 class ServiceAgreementVersion(Base):
     __tablename__ = "agreement_versions"
+    __table_args__ = (
+        Index("ix_agreement_versions_agreement_version", "agreement_id", "version_number"),
+        Index("ix_agreement_versions_agreement_hash", "agreement_id", "content_hash"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     agreement_id: Mapped[int] = mapped_column(
@@ -264,8 +270,16 @@ class ServiceAgreementVersion(Base):
     )
     version_number: Mapped[int] = mapped_column(Integer, nullable=False)
     title: Mapped[str | None] = mapped_column(String(200))
-    data_json: Mapped[str] = mapped_column(Text(), nullable=False)
-    sla_items_json: Mapped[str] = mapped_column(Text(), nullable=False)
+    data_json: Mapped[str] = mapped_column(
+        CompressedText(), nullable=False, deferred=True, deferred_group="payload"
+    )
+    sla_items_json: Mapped[str] = mapped_column(
+        CompressedText(), nullable=False, deferred=True, deferred_group="payload"
+    )
+    # Checkpoints hold full snapshots; other rows hold deltas against the
+    # previous version (see app/versioning.py).
+    is_checkpoint: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    content_hash: Mapped[str | None] = mapped_column(String(64))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     created_by_user_id: Mapped[int | None] = mapped_column(
         ForeignKey("users.id", ondelete="SET NULL")
@@ -281,6 +295,10 @@ class ServiceAgreementVersion(Base):
 
 class ProposalVersion(Base):
     __tablename__ = "proposal_versions"
+    __table_args__ = (
+        Index("ix_proposal_versions_proposal_version", "proposal_id", "version_number"),
+        Index("ix_proposal_versions_proposal_hash", "proposal_id", "content_hash"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     proposal_id: Mapped[int] = mapped_column(
@@ -289,9 +307,17 @@ class ProposalVersion(Base):
     version_number: Mapped[int] = mapped_column(Integer, nullable=False)
     title: Mapped[str | None] = mapped_column(String(200))
     status: Mapped[str | None] = mapped_column(String(50))
-    data_json: Mapped[str] = mapped_column(Text(), nullable=False)
-    requirements_json: Mapped[str] = mapped_column(Text(), nullable=False)
-    attachments_json: Mapped[str] = mapped_column(Text(), nullable=False)
+    data_json: Mapped[str] = mapped_column(
+        CompressedText(), nullable=False, deferred=True, deferred_group="payload"
+    )
+    requirements_json: Mapped[str] = mapped_column(
+        CompressedText(), nullable=False, deferred=True, deferred_group="payload"
+    )
+    attachments_json: Mapped[str] = mapped_column(
+        CompressedText(), nullable=False, deferred=True, deferred_group="payload"
+    )
+    is_checkpoint: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    content_hash: Mapped[str | None] = mapped_column(String(64))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     created_by_user_id: Mapped[int | None] = mapped_column(
         ForeignKey("users.id", ondelete="SET NULL")
@@ -307,6 +333,14 @@ class ProposalVersion(Base):
 
 class AgreementVersionComment(Base):
     __tablename__ = "agreement_version_comments"
+    __table_args__ = (
+        Index(
+            "ix_agreement_version_comments_version_field_created",
+            "agreement_version_id",
+            "field_key",
+            "created_at",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     agreement_version_id: Mapped[int] = mapped_column(
@@ -336,7 +370,9 @@ class AgreementVersionComment(Base):
 
     @property
     def is_current(self) -> bool:
-        return bool(self.version.is_current) if self.version else False
+        if not self.version:
+            return False
+        return self.version.version_number == self.version.agreement.current_version
 
 
 class AgreementVersionCommentReaction(Base):
@@ -354,6 +390,14 @@ class AgreementVersionCommentReaction(Base):
 
 class ProposalVersionComment(Base):
     __tablename__ = "proposal_version_comments"
+    __table_args__ = (
+        Index(
+            "ix_proposal_version_comments_version_field_created",
+            "proposal_version_id",
+            "field_key",
+            "created_at",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     proposal_version_id: Mapped[int] = mapped_column(
@@ -383,7 +427,9 @@ class ProposalVersionComment(Base):
 
     @property
     def is_current(self) -> bool:
-        return bool(self.version.is_current) if self.version else False
+        if not self.version:
+            return False
+        return self.version.version_number == self.version.proposal.current_version
 
 
 class ProposalVersionCommentReaction(Base):
@@ -430,11 +476,47 @@ class ExpenseReceipt(Base):
         ForeignKey("expenses.id", ondelete="CASCADE"), nullable=False
     )
     filename: Mapped[str] = mapped_column(String(300), nullable=False)
-    file_path: Mapped[str] = mapped_column(String(500), nullable=False)
+    file_path: Mapped[str] = mapped_column(String(500), nullable=False, index=True)
 
     expense: Mapped["Expense"] = relationship("Expense", back_populates="receipts")
 
 
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    entity_type: Mapped[str] = mapped_column(String(30), nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    to_email: Mapped[str] = mapped_column(String(200), nullable=False)
+    subject: Mapped[str | None] = mapped_column(String(300))
+    body: Mapped[str | None] = mapped_column(Text())
+    status: Mapped[str] = mapped_column(String(20), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_error: Mapped[str | None] = mapped_column(Text())
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    __table_args__ = (Index("ix_notifications_user_read_created", "user_id", "read_at", "created_at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind: Mapped[str] = mapped_column(String(30), default="mention")
+    entity_type: Mapped[str] = mapped_column(String(30), nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    version_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    comment_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    field_key: Mapped[str] = mapped_column(String(200), nullable=False)
+    excerpt: Mapped[str] = mapped_column(Text(), nullable=False)
+    actor_user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    read_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+
 class Settings(Base):
     __tablename__ = "settings"
 
@@ -485,6 +567,7 @@ class User(Base):
     password_hash: Mapped[str] = mapped_column(String(255))
     role: Mapped[str] = mapped_column(String(20), default="user")
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    unread_notifications: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     bank_account_name: Mapped[str | None] = mapped_column(String(200))
     bank_account_number: Mapped[str | None] = mapped_column(String(50))
     bank_sort_code: Mapped[str | None] = mapped_column(String(50))
@@ -504,3 +587,32 @@ class UserSession(Base):
     expires_at: Mapped[datetime] = mapped_column(DateTime)
 
     user: Mapped["User"] = relationship("User", back_populates="sessions")
+
+
+class BackupRecord(Base):
+    __tablename__ = "backup_catalog"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    filename: Mapped[str] = mapped_column(String(200), unique=True, nullable=False)
+    kind: Mapped[str] = mapped_column(String(20), default="full")
+    trigger: Mapped[str] = mapped_column(String(20), default="manual")
+    parent: Mapped[str | None] = mapped_column(String(200))
+    requires: Mapped[list[str] | None] = mapped_column(JSON, default=list)
+    size_bytes: Mapped[int] = mapped_column(Integer, default=0)
+    duration_seconds: Mapped[float | None] = mapped_column(Float)
+    checksum: Mapped[str | None] = mapped_column(String(64))
+    new_objects: Mapped[int | None] = mapped_column(Integer)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class UploadBlob(Base):
+    __tablename__ = "upload_blobs"
+    __table_args__ = (Index("ix_upload_blobs_ref_count_uploaded", "ref_count", "last_uploaded_at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    file_path: Mapped[str] = mapped_column(String(500), unique=True, nullable=False)
+    size_bytes: Mapped[int] = mapped_column(Integer, default=0)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_uploaded_at: Mapped[datetime | None] = mapped_column(DateTime)
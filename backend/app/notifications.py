@@ -0,0 +1,204 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased
+
+from . import models, outbox
+from .config import settings
+from .db import SessionLocal
+
+logger = logging.getLogger("notifications")
+
+# Fan-out runs off the request path on a single worker, so comment writes
+# never wait on recipient lookups and fan-out writes never contend with each
+# other. Each user's unread counter is kept on the users row and moved by
+# SQL-side deltas alongside the notification rows.
+_fanout_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mention-fanout")
+
+_EXCERPT_CHARS = 280
+
+
+def _normalize_mentions(mentions) -> list[str]:
+    emails = []
+    for mention in mentions or []:
+        email = str(mention).strip().lstrip("@").lower()
+        if email and email not in emails:
+            emails.append(email)
+    return emails
+
+
+def schedule_mentions(spec, comment_id: int):
+    _fanout_pool.submit(_fan_out_safely, spec, comment_id)
+
+
+def _fan_out_safely(spec, comment_id: int):
+    try:
+        fan_out_mentions(spec, comment_id)
+    except Exception:
+        logger.exception("Mention fan-out failed for %s comment %s.", spec.entity_type, comment_id)
+
+
+def fan_out_mentions(spec, comment_id: int) -> int:
+    """Create notifications for the users mentioned in a comment; returns how many."""
+    db = SessionLocal()
+    try:
+        comment_model = spec.comment_model
+        version_model = spec.versions.model
+        row = (
+            db.query(comment_model, getattr(version_model, spec.versions.parent_column))
+            .join(version_model, version_model.id == getattr(comment_model, spec.version_column))
+            .filter(comment_model.id == comment_id)
+            .first()
+        )
+        if not row:
+            return 0
+        comment, parent_id = row
+        emails = _normalize_mentions(comment.mentions)
+        if not emails:
+            return 0
+        already_notified = {
+            user_id
+            for (user_id,) in db.query(models.Notification.user_id).filter(
+                models.Notification.entity_type == spec.entity_type,
+                models.Notification.comment_id == comment_id,
+            )
+        }
+        recipients = [
+            (user_id, email)
+            for user_id, email in db.query(models.User.id, models.User.email).filter(
+                func.lower(models.User.email).in_(emails),
+                models.User.is_active.is_(True),
+            )
+            if user_id != comment.created_by_user_id and user_id not in already_notified
+        ]
+        if not recipients:
+            return 0
+        notifications = [
+            models.Notification(
+                user_id=user_id,
+                kind="mention",
+                entity_type=spec.entity_type,
+                entity_id=parent_id,
+                version_id=getattr(comment, spec.version_column),
+                comment_id=comment_id,
+                field_key=comment.field_key,
+                excerpt=comment.comment[:_EXCERPT_CHARS],
+                actor_user_id=comment.created_by_user_id,
+            )
+            for user_id, _email in recipients
+        ]
+        db.add_all(notifications)
+        db.query(models.User).filter(models.User.id.in_([user_id for user_id, _email in recipients])).update(
+            {models.User.unread_notifications: models.User.unread_notifications + 1},
+            synchronize_session=False,
+        )
+        if settings.mention_emails_enabled:
+            db.flush()
+            for notification, (_user_id, email) in zip(notifications, recipients):
+                outbox.stage_email(db, "notification", notification.id, email)
+        db.commit()
+        if settings.mention_emails_enabled:
+            outbox.wake()
+        return len(notifications)
+    finally:
+        db.close()
+
+
+def _discard(db: Session, *match):
+    # Unread rows come off their users' counters in the same transaction as
+    # the delete, one statement each, however many rows match.
+    notification = models.Notification
+    unread = (notification.read_at.is_(None), *match)
+    per_user = (
+        select(func.count(notification.id))
+        .where(notification.user_id == models.User.id, *unread)
+        .scalar_subquery()
+    )
+    db.query(models.User).filter(models.User.id.in_(select(notification.user_id).where(*unread))).update(
+        {models.User.unread_notifications: models.User.unread_notifications - per_user},
+        synchronize_session=False,
+    )
+    db.query(notification).filter(*match).delete(synchronize_session=False)
+
+
+def discard_for_comment(db: Session, entity_type: str, comment_id: int):
+    """Remove a deleted comment's notifications; the caller commits."""
+    _discard(
+        db,
+        models.Notification.entity_type == entity_type,
+        models.Notification.comment_id == comment_id,
+    )
+
+
+def discard_for_entities(db: Session, entity_type: str, entity_ids):
+    """Remove the notifications of deleted agreements or proposals; the caller commits.
+
+    Their comments go with them through ON DELETE CASCADE, so discard_for_comment
+    never runs for those. ``entity_ids`` may be a list or a select of ids.
+    """
+    _discard(
+        db,
+        models.Notification.entity_type == entity_type,
+        models.Notification.entity_id.in_(entity_ids),
+    )
+
+
+def _adjust_unread(db: Session, user_id: int, delta: int):
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.unread_notifications: models.User.unread_notifications + delta},
+        synchronize_session=False,
+    )
+
+
+def list_notifications(
+    db: Session, user_id: int, unread_only: bool = False, limit: int = 50, offset: int = 0
+) -> list[dict]:
+    actor = aliased(models.User)
+    query = (
+        db.query(models.Notification, actor.email.label("actor_email"))
+        .outerjoin(actor, actor.id == models.Notification.actor_user_id)
+        .filter(models.Notification.user_id == user_id)
+    )
+    if unread_only:
+        query = query.filter(models.Notification.read_at.is_(None))
+    columns = [column.key for column in models.Notification.__table__.columns]
+    return [
+        {**{column: getattr(notification, column) for column in columns}, "actor_email": actor_email}
+        for notification, actor_email in query.order_by(models.Notification.created_at.desc())
+        .offset(offset)
+        .limit(limit)
+    ]
+
+
+def unread_count(db: Session, user_id: int) -> int:
+    count = db.query(models.User.unread_notifications).filter(models.User.id == user_id).scalar()
+    return max(0, count or 0)
+
+
+def mark_read(db: Session, user_id: int, notification_id: int) -> bool:
+    """Mark one notification read; returns False if the user has no such notification."""
+    match = (models.Notification.id == notification_id, models.Notification.user_id == user_id)
+    updated = (
+        db.query(models.Notification)
+        .filter(*match, models.Notification.read_at.is_(None))
+        .update({"read_at": datetime.utcnow()}, synchronize_session=False)
+    )
+    if updated:
+        _adjust_unread(db, user_id, -1)
+        db.commit()
+        return True
+    return db.query(models.Notification.id).filter(*match).first() is not None
+
+
+def mark_all_read(db: Session, user_id: int) -> int:
+    updated = (
+        db.query(models.Notification)
+        .filter(models.Notification.user_id == user_id, models.Notification.read_at.is_(None))
+        .update({"read_at": datetime.utcnow()}, synchronize_session=False)
+    )
+    if updated:
+        _adjust_unread(db, user_id, -updated)
+    db.commit()
+    return updated
@@ -0,0 +1,255 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .config import settings
+from .db import SessionLocal
+
+logger = logging.getLogger("outbox")
+
+# A claimed row is leased for this long; rows still "sending" after the lease
+# (e.g. the process died mid-delivery) are retried as a failed attempt.
+_CLAIM_LEASE = timedelta(minutes=5)
+_MAX_BACKOFF_SECONDS = 6 * 3600
+
+_wake = threading.Event()
+_stop = threading.Event()
+_worker: threading.Thread | None = None
+
+
+def stage_email(
+    db: Session,
+    entity_type: str,
+    entity_id: int,
+    to_email: str,
+    subject: str | None = None,
+    body: str | None = None,
+) -> models.EmailOutbox:
+    """Add an outbox entry to the caller's transaction; call wake() after commit."""
+    entry = models.EmailOutbox(
+        entity_type=entity_type,
+        entity_id=entity_id,
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(entry)
+    return entry
+
+
+def enqueue_email(
+    db: Session,
+    entity_type: str,
+    entity_id: int,
+    to_email: str,
+    subject: str | None = None,
+    body: str | None = None,
+) -> models.EmailOutbox:
+    entry = stage_email(db, entity_type, entity_id, to_email, subject, body)
+    db.commit()
+    db.refresh(entry)
+    _wake.set()
+    return entry
+
+
+def wake():
+    _wake.set()
+
+
+def retry_dead_letter(db: Session, entry: models.EmailOutbox) -> models.EmailOutbox:
+    entry.status = "pending"
+    entry.attempts = 0
+    entry.next_attempt_at = datetime.utcnow()
+    db.commit()
+    db.refresh(entry)
+    _wake.set()
+    return entry
+
+
+def start_worker():
+    global _worker
+    if _worker and _worker.is_alive():
+        return
+    _stop.clear()
+    _worker = threading.Thread(target=_run, name="email-outbox", daemon=True)
+    _worker.start()
+
+
+def stop_worker(timeout: float = 10):
+    _stop.set()
+    _wake.set()
+    if _worker:
+        _worker.join(timeout)
+
+
+def _run():
+    batch_size = max(1, settings.outbox_workers) * 2
+    with ThreadPoolExecutor(
+        max_workers=max(1, settings.outbox_workers),
+        thread_name_prefix="outbox-send",
+    ) as executor:
+        while not _stop.is_set():
+            try:
+                claimed = _claim_due(batch_size)
+            except Exception:
+                logger.exception("Unable to claim outbox entries.")
+                claimed = []
+            if claimed:
+                list(executor.map(_deliver, claimed))
+                continue
+            _wake.wait(settings.outbox_poll_seconds)
+            _wake.clear()
+
+
+def _claim_due(limit: int) -> list[int]:
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        # An expired lease means the delivery crashed or hung, so it counts as
+        # a failed attempt; otherwise such a message would be retried forever.
+        expired = db.query(models.EmailOutbox).filter(
+            models.EmailOutbox.status == "sending",
+            models.EmailOutbox.next_attempt_at <= now,
+        )
+        for entry in expired:
+            _record_failure(entry, "Delivery did not finish before its lease expired.")
+        db.flush()
+        due_ids = [
+            row.id
+            for row in db.query(models.EmailOutbox.id)
+            .filter(
+                models.EmailOutbox.status == "pending",
+                models.EmailOutbox.next_attempt_at <= now,
+            )
+            .order_by(models.EmailOutbox.next_attempt_at.asc())
+            .limit(limit)
+        ]
+        claimed = []
+        for entry_id in due_ids:
+            updated = (
+                db.query(models.EmailOutbox)
+                .filter(models.EmailOutbox.id == entry_id, models.EmailOutbox.status == "pending")
+                .update(
+                    {"status": "sending", "next_attempt_at": now + _CLAIM_LEASE},
+                    synchronize_session=False,
+                )
+            )
+            if updated:
+                claimed.append(entry_id)
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+
+def _record_failure(entry: models.EmailOutbox, error: str):
+    entry.attempts = (entry.attempts or 0) + 1
+    entry.last_error = error
+    if entry.attempts >= settings.outbox_max_attempts:
+        entry.status = "dead"
+        logger.warning("Outbox entry %s dead-lettered: %s", entry.id, error)
+        return
+    delay = min(settings.outbox_retry_base_seconds * 2 ** (entry.attempts - 1), _MAX_BACKOFF_SECONDS)
+    entry.status = "pending"
+    entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+
+def _deliver(entry_id: int):
+    from .email_utils import generate_email_draft, send_email_smtp
+
+    db = SessionLocal()
+    try:
+        entry = db.query(models.EmailOutbox).filter(models.EmailOutbox.id == entry_id).first()
+        if not entry:
+            return
+        if entry.entity_type == "notification":
+            _deliver_notification(db, entry)
+            return
+        entity = crud.get_document(db, entry.entity_type, entry.entity_id)
+        if not entity:
+            entry.status = "dead"
+            entry.last_error = "Document no longer exists."
+            db.commit()
+            return
+        try:
+            subject, body, html_body, pdf_bytes, pdf_filename = generate_email_draft(
+                entry.entity_type, entity.client, entity
+            )
+            if entry.body and entry.body != body:
+                # The queued text no longer matches the template output, so
+                # an HTML part rendered now would disagree with it.
+                html_body = None
+            attachments = []
+            if pdf_bytes:
+                attachments.append(
+                    {
+                        "content": pdf_bytes,
+                        "filename": pdf_filename or "document.pdf",
+                        "maintype": "application",
+                        "subtype": "pdf",
+                    }
+                )
+            sent, message = send_email_smtp(
+                entry.to_email,
+                entry.subject or subject,
+                entry.body or body,
+                attachments=attachments,
+                html_body=html_body,
+            )
+        except Exception as exc:
+            logger.exception("Outbox entry %s failed to render.", entry_id)
+            sent, message = False, f"Render failed: {exc}"
+        if sent:
+            entry.status = "sent"
+            entry.sent_at = datetime.utcnow()
+            entry.last_error = None
+            db.commit()
+            crud.mark_document_sent(db, entry.entity_type, entity)
+        else:
+            _record_failure(entry, message)
+            db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Outbox entry %s could not be processed.", entry_id)
+    finally:
+        db.close()
+
+
+def _deliver_notification(db: Session, entry: models.EmailOutbox):
+    from .email_utils import generate_mention_email, send_email_smtp
+
+    notification = db.get(models.Notification, entry.entity_id)
+    document = (
+        crud.get_document(db, notification.entity_type, notification.entity_id) if notification else None
+    )
+    if not document:
+        entry.status = "dead"
+        entry.last_error = "Notification no longer exists."
+        db.commit()
+        return
+    try:
+        actor = db.get(models.User, notification.actor_user_id) if notification.actor_user_id else None
+        subject, body, html_body = generate_mention_email(
+            notification,
+            actor.email if actor else None,
+            document,
+            crud.get_or_create_settings(db),
+        )
+        sent, message = send_email_smtp(entry.to_email, subject, body, html_body=html_body)
+    except Exception as exc:
+        logger.exception("Outbox entry %s failed to render.", entry.id)
+        sent, message = False, f"Render failed: {exc}"
+    if sent:
+        entry.status = "sent"
+        entry.sent_at = datetime.utcnow()
+        entry.last_error = None
+    else:
+        _record_failure(entry, message)
+    db.commit()
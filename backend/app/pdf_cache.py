@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import settings
+
+logger = logging.getLogger("pdf_cache")
+
+_MAX_CACHE_BYTES = settings.pdf_cache_max_mb * 1024 * 1024
+
+_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+# Shared pool for PDF rendering so background work never competes with more
+# than a fixed number of WeasyPrint renders at once.
+render_pool = ThreadPoolExecutor(
+    max_workers=max(1, settings.pdf_render_workers),
+    thread_name_prefix="pdf-render",
+)
+
+_pending_prerenders: dict[tuple[str, int], threading.Timer] = {}
+_pending_lock = threading.Lock()
+
+
+def cache_key(html: str, base_url: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(base_url.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(html.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_cached_pdf(key: str) -> bytes | None:
+    with _cache_lock:
+        pdf_bytes = _cache.get(key)
+        if pdf_bytes is not None:
+            _cache.move_to_end(key)
+        return pdf_bytes
+
+
+def store_pdf(key: str, pdf_bytes: bytes):
+    global _cache_bytes
+    size = len(pdf_bytes)
+    if size > _MAX_CACHE_BYTES:
+        return
+    with _cache_lock:
+        previous = _cache.pop(key, None)
+        if previous is not None:
+            _cache_bytes -= len(previous)
+        _cache[key] = pdf_bytes
+        _cache_bytes += size
+        while _cache_bytes > _MAX_CACHE_BYTES and _cache:
+            _evicted_key, evicted = _cache.popitem(last=False)
+            _cache_bytes -= len(evicted)
+
+
+def clear_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+def _is_draft(entity_type: str, entity) -> bool:
+    if entity_type == "agreement":
+        return entity.company_signed_date is None
+    return getattr(entity, "status", None) == "draft"
+
+
+def schedule_prerender(entity_type: str, entity_id: int | None):
+    if not settings.pdf_prerender_enabled or not entity_id:
+        return
+    key = (entity_type, entity_id)
+    with _pending_lock:
+        existing = _pending_prerenders.pop(key, None)
+        if existing:
+            existing.cancel()
+        timer = threading.Timer(
+            settings.pdf_prerender_debounce_seconds,
+            _submit_prerender,
+            args=key,
+        )
+        timer.daemon = True
+        _pending_prerenders[key] = timer
+        timer.start()
+
+
+def _submit_prerender(entity_type: str, entity_id: int):
+    with _pending_lock:
+        _pending_prerenders.pop((entity_type, entity_id), None)
+    render_pool.submit(_prerender, entity_type, entity_id)
+
+
+def _prerender(entity_type: str, entity_id: int):
+    from . import crud
+    from .db import SessionLocal
+    from .email_utils import render_entity_pdf
+
+    db = SessionLocal()
+    try:
+        entity = crud.get_document(db, entity_type, entity_id)
+        if not entity:
+            return
+        if settings.pdf_prerender_skip_drafts and _is_draft(entity_type, entity):
+            return
+        app_settings = crud.get_or_create_settings(db)
+        render_entity_pdf(entity_type, entity.client, entity, app_settings)
+    except Exception:
+        logger.exception("PDF pre-render failed for %s %s.", entity_type, entity_id)
+    finally:
+        db.close()
@@ -0,0 +1,202 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from sqlalchemy.orm import Session, joinedload
+
+from . import crud, models
+from .config import settings
+from .db import SessionLocal
+from .pdf_cache import render_pool, schedule_prerender
+
+logger = logging.getLogger("reminders")
+
+_RUN_RETENTION = timedelta(days=1)
+_RENDER_LOOKAHEAD = 3
+
+
+@dataclass
+class ReminderRun:
+    id: str
+    rate_per_minute: int
+    status: str = "running"
+    total_invoices: int = 0
+    total_clients: int = 0
+    sent_clients: int = 0
+    sent_invoices: int = 0
+    failed_clients: int = 0
+    skipped_invoices: int = 0
+    errors: list[str] = field(default_factory=list)
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: datetime | None = None
+
+
+_runs: dict[str, ReminderRun] = {}
+_runs_lock = threading.Lock()
+
+
+def select_overdue_invoices(db: Session, invoice_ids: list[int] | None = None, now: datetime | None = None):
+    query = (
+        db.query(models.Invoice)
+        .options(joinedload(models.Invoice.client), joinedload(models.Invoice.line_items))
+        .filter(
+            models.Invoice.due_date < (now or datetime.utcnow()),
+            models.Invoice.status != "paid",
+        )
+    )
+    if invoice_ids is not None:
+        query = query.filter(models.Invoice.id.in_(invoice_ids))
+    return query.order_by(models.Invoice.client_id, models.Invoice.due_date).all()
+
+
+def get_run(run_id: str) -> ReminderRun | None:
+    with _runs_lock:
+        return _runs.get(run_id)
+
+
+def start_run(invoice_ids: list[int] | None = None, rate_per_minute: int | None = None) -> ReminderRun:
+    run = ReminderRun(
+        id=uuid4().hex,
+        rate_per_minute=max(1, rate_per_minute or settings.reminder_rate_per_minute),
+    )
+    cutoff = datetime.utcnow() - _RUN_RETENTION
+    with _runs_lock:
+        for run_id, existing in list(_runs.items()):
+            if existing.finished_at and existing.finished_at < cutoff:
+                del _runs[run_id]
+        _runs[run.id] = run
+    thread = threading.Thread(
+        target=_execute,
+        args=(run, invoice_ids),
+        name=f"reminders-{run.id[:8]}",
+        daemon=True,
+    )
+    thread.start()
+    return run
+
+
+def _recipient(client: models.Client) -> str | None:
+    return client.invoice_email or client.contact_email or client.email
+
+
+def _mark_sent(invoice_ids: list[int]):
+    # Uses its own session, so the run's session is only ever read from.
+    if not invoice_ids:
+        return
+    db = SessionLocal()
+    try:
+        db.query(models.Invoice).filter(
+            models.Invoice.id.in_(invoice_ids),
+            models.Invoice.status != "paid",
+        ).update({"status": "sent"}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    for invoice_id in invoice_ids:
+        schedule_prerender("invoice", invoice_id)
+
+
+def _render_invoice(invoice_id: int) -> tuple[bytes, str]:
+    # Runs on the render pool with its own session; the run's session stays
+    # on the run thread, since sessions are not thread-safe.
+    from .email_utils import render_entity_pdf
+
+    db = SessionLocal()
+    try:
+        invoice = crud.get_document(db, "invoice", invoice_id)
+        if not invoice:
+            raise ValueError(f"Invoice {invoice_id} no longer exists.")
+        app_settings = crud.get_or_create_settings(db)
+        return render_entity_pdf("invoice", invoice.client, invoice, app_settings)
+    finally:
+        db.close()
+
+
+def _execute(run: ReminderRun, invoice_ids: list[int] | None):
+    from .email_utils import generate_reminder_email, send_email_smtp
+
+    db = SessionLocal()
+    try:
+        app_settings = crud.get_or_create_settings(db)
+        invoices = select_overdue_invoices(db, invoice_ids)
+        groups: dict[int, list[models.Invoice]] = {}
+        for invoice in invoices:
+            groups.setdefault(invoice.client_id, []).append(invoice)
+        run.total_invoices = len(invoices)
+        run.total_clients = len(groups)
+
+        # PDFs are rendered on the shared pool a few clients ahead of the
+        # throttled sends, so sending rarely waits on WeasyPrint while only a
+        # handful of PDFs are held in memory and pre-renders are not starved.
+        client_groups = list(groups.values())
+        renders = {}
+
+        def _submit_renders(index: int):
+            if index < len(client_groups) and _recipient(client_groups[index][0].client):
+                for invoice in client_groups[index]:
+                    renders[invoice.id] = render_pool.submit(_render_invoice, invoice.id)
+
+        for index in range(_RENDER_LOOKAHEAD):
+            _submit_renders(index)
+
+        interval = 60.0 / run.rate_per_minute
+        last_sent_at = None
+        for index, client_invoices in enumerate(client_groups):
+            _submit_renders(index + _RENDER_LOOKAHEAD)
+            client = client_invoices[0].client
+            to_email = _recipient(client)
+            if not to_email:
+                run.skipped_invoices += len(client_invoices)
+                run.errors.append(f"{client.name}: no email address on file.")
+                continue
+            futures = [renders.pop(invoice.id) for invoice in client_invoices]
+            try:
+                attachments = []
+                for future in futures:
+                    pdf_bytes, pdf_filename = future.result()
+                    attachments.append(
+                        {
+                            "content": pdf_bytes,
+                            "filename": pdf_filename,
+                            "maintype": "application",
+                            "subtype": "pdf",
+                        }
+                    )
+                subject, body, html_body = generate_reminder_email(
+                    client, client_invoices, app_settings
+                )
+                if last_sent_at is not None:
+                    wait = interval - (time.monotonic() - last_sent_at)
+                    if wait > 0:
+                        time.sleep(wait)
+                sent, message = send_email_smtp(
+                    to_email, subject, body, attachments=attachments, html_body=html_body
+                )
+                last_sent_at = time.monotonic()
+            except Exception as exc:
+                logger.exception("Reminder for client %s failed.", client.id)
+                sent, message = False, str(exc)
+            if sent:
+                run.sent_clients += 1
+                run.sent_invoices += len(client_invoices)
+                # Recorded as each email goes out, so a run that stops early
+                # never reminds these clients twice.
+                try:
+                    _mark_sent([invoice.id for invoice in client_invoices])
+                except Exception:
+                    logger.exception("Unable to update invoice status for client %s.", client.id)
+                    run.errors.append(f"{client.name}: reminder sent, but invoice status was not updated.")
+            else:
+                run.failed_clients += 1
+                run.errors.append(f"{client.name}: {message}")
+        run.status = "completed"
+    except Exception as exc:
+        logger.exception("Reminder run %s failed.", run.id)
+        run.status = "failed"
+        run.errors.append(str(exc))
+    finally:
+        run.finished_at = datetime.utcnow()
+        db.close()
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, Literal
+from typing import Any, Optional, Literal
 
 from pydantic import BaseModel, EmailStr, ConfigDict, field_validator
 
@@ -231,7 +231,31 @@ class AgreementVersionOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
-class AgreementCommentCreate(BaseModel):
+class AgreementVersionSnapshotOut(AgreementVersionOut):
+    data: dict[str, Any]
+    sla_items: list[dict[str, Any]] = []
+
+
+class VersionFieldDiff(BaseModel):
+    field: str
+    change: Literal["added", "removed", "modified"]
+    old: Any = None
+    new: Any = None
+    lines: Optional[list[str]] = None
+
+
+class VersionDiffOut(BaseModel):
+    from_version: int
+    to_version: int
+    changes: list[VersionFieldDiff]
+
+
+class VersionWriteStats(BaseModel):
+    created: int = 0
+    skipped: int = 0
+
+
+class CommentCreate(BaseModel):
     field_key: str
     comment: str
     mentions: list[str] | None = None
@@ -241,9 +265,8 @@ class CommentStatusUpdate(BaseModel):
     implemented: bool
 
 
-class AgreementCommentOut(BaseModel):
+class CommentOut(BaseModel):
     id: int
-    agreement_version_id: Optional[int] = None
     field_key: str
     comment: str
     mentions: list[str] | None = None
@@ -258,6 +281,10 @@ class AgreementCommentOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class AgreementCommentOut(CommentOut):
+    agreement_version_id: Optional[int] = None
+
+
 class ProposalBase(BaseModel):
     title: str
     status: Optional[str] = "draft"
@@ -340,33 +367,46 @@ class ProposalVersionOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
-class ProposalCommentCreate(BaseModel):
-    field_key: str
-    comment: str
-    mentions: list[str] | None = None
+class ProposalVersionSnapshotOut(ProposalVersionOut):
+    data: dict[str, Any]
+    requirements: list[dict[str, Any]] = []
+    attachments: list[dict[str, Any]] = []
 
 
-class ProposalCommentOut(BaseModel):
-    id: int
+class ProposalCommentOut(CommentOut):
     proposal_version_id: Optional[int] = None
-    field_key: str
-    comment: str
-    mentions: list[str] | None = None
-    implemented: bool = False
-    version_number: Optional[int] = None
-    is_current: bool = False
-    created_at: datetime
-    created_by_email: Optional[str] = None
-    like_count: int
-    dislike_count: int
 
-    model_config = ConfigDict(from_attributes=True)
+
+class CommentFieldSummary(BaseModel):
+    field_key: str
+    total: int
+    unresolved: int
+    implemented: int
+    last_activity_at: Optional[datetime] = None
 
 
 class CommentReactionRequest(BaseModel):
     reaction: Literal["like", "dislike"]
 
 
+class NotificationOut(BaseModel):
+    id: int
+    kind: str
+    entity_type: str
+    entity_id: int
+    version_id: int
+    comment_id: int
+    field_key: str
+    excerpt: str
+    actor_email: Optional[str] = None
+    created_at: datetime
+    read_at: Optional[datetime] = None
+
+
+class NotificationCountOut(BaseModel):
+    unread: int
+
+
 class UserSearchOut(BaseModel):
     id: int
     name: Optional[str] = None
@@ -513,14 +553,54 @@ class AuthStatus(BaseModel):
 
 
 class EmailDraftResponse(BaseModel):
-    subject: str
-    body: str
+    subject: Optional[str] = None
+    body: Optional[str] = None
     sent: bool
+    queued: bool = False
+    outbox_id: Optional[int] = None
     message: str
     pdf_base64: Optional[str] = None
     pdf_filename: Optional[str] = None
 
 
+class EmailOutboxOut(BaseModel):
+    id: int
+    entity_type: str
+    entity_id: int
+    to_email: str
+    subject: Optional[str] = None
+    status: str
+    attempts: int
+    next_attempt_at: datetime
+    last_error: Optional[str] = None
+    created_at: datetime
+    sent_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ReminderRunRequest(BaseModel):
+    invoice_ids: Optional[list[int]] = None
+    rate_per_minute: Optional[int] = None
+
+
+class ReminderRunOut(BaseModel):
+    id: str
+    status: str
+    rate_per_minute: int
+    total_invoices: int
+    total_clients: int
+    sent_clients: int
+    sent_invoices: int
+    failed_clients: int
+    skipped_invoices: int
+    errors: list[str] = []
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class BackupRequest(BaseModel):
     download: bool = True
     store: bool = True
@@ -530,6 +610,37 @@ class RestoreRequest(BaseModel):
     filename: str
 
 
+class BackupJobOut(BaseModel):
+    id: str
+    filename: str
+    trigger: str = "manual"
+    status: str
+    stage: str
+    progress: float
+    size_bytes: Optional[int] = None
+    parent: Optional[str] = None
+    new_objects: int = 0
+    error: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class BackupRecordOut(BaseModel):
+    filename: str
+    kind: str
+    trigger: str
+    parent: Optional[str] = None
+    size_bytes: int
+    duration_seconds: Optional[float] = None
+    checksum: Optional[str] = None
+    new_objects: Optional[int] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class SettingsBase(BaseModel):
     company_name: str
     company_address: Optional[str] = None
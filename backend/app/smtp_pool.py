@@ -0,0 +1,124 @@
+import logging
+import smtplib
+import threading
+import time
+from dataclasses import dataclass
+
+from .config import settings
+
+logger = logging.getLogger("smtp_pool")
+
+# Connections idle for longer than this are checked with NOOP before reuse.
+_NOOP_AFTER_SECONDS = 5
+
+
+@dataclass(frozen=True)
+class SMTPConfig:
+    host: str
+    port: int
+    username: str | None = None
+    password: str | None = None
+    use_tls: bool = True
+    timeout: float = 10
+
+
+def open_connection(config: SMTPConfig) -> smtplib.SMTP:
+    if config.port == 465:
+        server = smtplib.SMTP_SSL(config.host, config.port, timeout=config.timeout)
+    else:
+        server = smtplib.SMTP(config.host, config.port, timeout=config.timeout)
+    try:
+        if config.port != 465 and config.use_tls:
+            server.starttls()
+        if config.username and config.password:
+            server.login(config.username, config.password)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def _close(server: smtplib.SMTP):
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+
+class SMTPConnectionPool:
+    def __init__(self, max_size: int, max_idle_seconds: float):
+        self.max_size = max(0, max_size)
+        self.max_idle_seconds = max_idle_seconds
+        self._lock = threading.Lock()
+        self._config: SMTPConfig | None = None
+        self._idle: list[tuple[smtplib.SMTP, float]] = []
+
+    def invalidate(self):
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+            self._config = None
+        for server, _last_used in idle:
+            _close(server)
+
+    def _acquire(self, config: SMTPConfig) -> smtplib.SMTP:
+        stale = []
+        server = None
+        last_used = 0.0
+        with self._lock:
+            if config != self._config:
+                stale.extend(self._idle)
+                self._idle = []
+                self._config = config
+            now = time.monotonic()
+            while self._idle:
+                candidate, candidate_used = self._idle.pop()
+                if now - candidate_used > self.max_idle_seconds:
+                    stale.append((candidate, candidate_used))
+                    continue
+                server, last_used = candidate, candidate_used
+                break
+        for stale_server, _last_used in stale:
+            _close(stale_server)
+
+        if server is not None:
+            if time.monotonic() - last_used < _NOOP_AFTER_SECONDS:
+                return server
+            try:
+                code, _message = server.noop()
+                if code == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            server.close()
+        return open_connection(config)
+
+    def _release(self, config: SMTPConfig, server: smtplib.SMTP):
+        with self._lock:
+            if config == self._config and len(self._idle) < self.max_size:
+                self._idle.append((server, time.monotonic()))
+                return
+        _close(server)
+
+    def send_message(self, config: SMTPConfig, msg):
+        # A pooled connection can be dropped by the server between the health
+        # check and the send, so retry once on a fresh connection. Other idle
+        # connections may have been dropped too, so the retry skips the pool.
+        for attempt in range(2):
+            server = open_connection(config) if attempt else self._acquire(config)
+            try:
+                server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                server.close()
+                if attempt:
+                    raise
+                logger.info("Pooled SMTP connection dropped; reconnecting.")
+                continue
+            except Exception:
+                server.close()
+                raise
+            self._release(config, server)
+            return
+
+
+pool = SMTPConnectionPool(settings.smtp_pool_size, settings.smtp_pool_idle_seconds)
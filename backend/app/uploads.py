@@ -0,0 +1,413 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+from python_multipart import MultipartParser
+from python_multipart.multipart import parse_options_header
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+from .config import settings
+
+logger = logging.getLogger("uploads")
+
+# Uploaded files are stored under the SHA-256 of their content, so the same
+# file uploaded twice is kept once. Each stored file has an upload_blobs row
+# whose ref_count tracks the attachment and receipt rows pointing at it, plus
+# the proposal version snapshots that list it.
+
+_CHUNK_BYTES = 1024 * 1024
+_QUEUED_CHUNKS = 4
+_REFERENCING_MODELS = (models.ProposalAttachment, models.ExpenseReceipt)
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class _UploadWriter:
+    """Writes one streamed file beside its final location, hashing as it goes."""
+
+    def __init__(self, directory: Path, suffix: str):
+        self._directory = directory
+        self._suffix = suffix
+        self._partial = directory / f".{uuid4().hex}{suffix}.part"
+        self._digest = hashlib.sha256()
+        self._handle = None
+        self.filename = None
+        self.size = 0
+
+    def open(self):
+        self._handle = self._partial.open("wb")
+
+    def write(self, chunk: bytes):
+        self._digest.update(chunk)
+        self._handle.write(chunk)
+        self.size += len(chunk)
+
+    def close(self):
+        self._handle.close()
+        self.filename = f"{self._digest.hexdigest()}{self._suffix}"
+
+    def commit(self) -> bool:
+        """Rename into place; returns False if the content was already stored."""
+        if (self._directory / self.filename).exists():
+            self.discard()
+            return False
+        os.replace(self._partial, self._directory / self.filename)
+        return True
+
+    def discard(self):
+        if self._handle:
+            self._handle.close()
+        self._partial.unlink(missing_ok=True)
+
+
+async def _drain(queue: asyncio.Queue, writer: _UploadWriter):
+    await run_in_threadpool(writer.open)
+    while (chunk := await queue.get()) is not None:
+        await run_in_threadpool(writer.write, chunk)
+    await run_in_threadpool(writer.close)
+
+
+def _part_filename(headers: dict[bytes, bytes]) -> str | None:
+    _kind, options = parse_options_header(headers.get(b"content-disposition", b""))
+    if options.get(b"name") != b"files" or b"filename" not in options:
+        return None
+    return options[b"filename"].decode("utf-8", "replace")
+
+
+def _store(db: Session, writer: _UploadWriter) -> bool:
+    # The blob row is registered, or its grace period restarted, before the
+    # existing file is trusted, so the collector cannot remove that file
+    # after this upload has thrown its own copy away.
+    register_blob(db, f"uploads/{writer.filename}", writer.size)
+    return writer.commit()
+
+
+async def receive_uploads(
+    db: Session,
+    chunks,
+    content_type: str,
+    directory: Path,
+    allowed: set[str],
+    error: str,
+    max_bytes: int,
+) -> list[tuple[str, str, int, bool]]:
+    """Store the files of a streamed multipart body under their content hashes.
+
+    The body is parsed as it arrives and each file part is written and hashed
+    by its own task, so a file can still be flushing while the next one
+    streams in. max_bytes applies to the bytes actually received. Files are
+    renamed into place only once the whole body has been read, so a rejected
+    upload leaves nothing behind. Each file is registered in upload_blobs.
+    Returns (original name, file path, size, whether anything was written)
+    for each file.
+    """
+    kind, options = parse_options_header(content_type)
+    if kind != b"multipart/form-data" or b"boundary" not in options:
+        raise ValueError("Expected a multipart/form-data upload.")
+    events = []
+    header = {"field": bytearray(), "value": bytearray()}
+    headers = {}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        headers[bytes(header["field"]).lower()] = bytes(header["value"])
+        header["field"].clear()
+        header["value"].clear()
+
+    def on_headers_finished():
+        events.append(("part", dict(headers)))
+        headers.clear()
+
+    def on_part_data(data, start, end):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = MultipartParser(
+        options[b"boundary"],
+        {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+    received = []
+    tasks = []
+    writers = []
+    queue = None
+    buffer = bytearray()
+    total = 0
+    try:
+        async for chunk in chunks:
+            total += len(chunk)
+            if total > max_bytes:
+                raise UploadTooLarge("Upload exceeds size limit.")
+            parser.write(chunk)
+            for event, value in events:
+                if event == "part":
+                    name = _part_filename(value)
+                    if not name:
+                        continue
+                    suffix = Path(name).suffix.lower()
+                    if suffix not in allowed:
+                        raise ValueError(error)
+                    writer = _UploadWriter(directory, suffix)
+                    queue = asyncio.Queue(maxsize=_QUEUED_CHUNKS)
+                    writers.append(writer)
+                    received.append(name)
+                    tasks.append(asyncio.create_task(_drain(queue, writer)))
+                elif queue is None:
+                    continue
+                elif event == "data":
+                    buffer += value
+                    if len(buffer) >= _CHUNK_BYTES:
+                        await queue.put(bytes(buffer))
+                        buffer.clear()
+                else:
+                    if buffer:
+                        await queue.put(bytes(buffer))
+                        buffer.clear()
+                    await queue.put(None)
+                    queue = None
+            events.clear()
+        parser.finalize()
+        if queue is not None:
+            raise ValueError("Upload ended before the last file was complete.")
+        await asyncio.gather(*tasks)
+        written = [await run_in_threadpool(_store, db, writer) for writer in writers]
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for writer in writers:
+            writer.discard()
+        raise
+    return [
+        (name, f"uploads/{writer.filename}", writer.size, was_written)
+        for name, writer, was_written in zip(received, writers, written)
+    ]
+
+
+def register_blob(db: Session, file_path: str, size: int):
+    """Record a stored upload, or mark known content as uploaded again."""
+    model = models.UploadBlob
+    now = datetime.utcnow()
+    # Uploading known content again restarts its grace period, so the
+    # collector cannot remove it before the form using it is saved.
+    if db.query(model).filter(model.file_path == file_path).update(
+        {model.last_uploaded_at: now}, synchronize_session=False
+    ):
+        db.commit()
+        return
+    sha256 = Path(file_path).stem
+    db.add(model(sha256=sha256, file_path=file_path, size_bytes=size, created_at=now, last_uploaded_at=now))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request registered the same content first.
+        db.rollback()
+
+
+def _adjust_refs(connection, file_paths, delta: int):
+    if not file_paths:
+        return
+    blob = models.UploadBlob.__table__
+    connection.execute(
+        blob.update().where(blob.c.file_path.in_(file_paths)).values(ref_count=blob.c.ref_count + delta)
+    )
+
+
+def _count_reference(mapper, connection, target):
+    _adjust_refs(connection, [target.file_path], 1)
+
+
+def _release_reference(mapper, connection, target):
+    _adjust_refs(connection, [target.file_path], -1)
+
+
+for _model in _REFERENCING_MODELS:
+    event.listen(_model, "after_insert", _count_reference)
+    event.listen(_model, "after_delete", _release_reference)
+
+
+def _snapshot_paths(attachments_json: str | None) -> set[str]:
+    # Snapshot list columns hold either null (unchanged) or the full list, so
+    # every path a version can restore is counted once by some non-null row.
+    return {item["file_path"] for item in json.loads(attachments_json or "null") or []}
+
+
+def _count_snapshot(mapper, connection, target):
+    _adjust_refs(connection, _snapshot_paths(target.attachments_json), 1)
+
+
+def _release_snapshot(mapper, connection, target):
+    # The payload is deferred and may not be loaded, so it is read from the
+    # row itself before the delete runs.
+    table = models.ProposalVersion.__table__
+    stored = connection.execute(select(table.c.attachments_json).where(table.c.id == target.id)).scalar()
+    _adjust_refs(connection, _snapshot_paths(stored), -1)
+
+
+event.listen(models.ProposalVersion, "after_insert", _count_snapshot)
+event.listen(models.ProposalVersion, "before_delete", _release_snapshot)
+
+
+def reconcile_ref_counts(db: Session) -> int:
+    """Recompute ref_count from attachments, receipts and proposal version
+    snapshots; returns rows fixed.
+
+    Needed after bulk deletes, which bypass the ORM events that keep the
+    counts current. Reads every version snapshot, so it is a repair tool
+    rather than something to run routinely.
+    """
+    expected: dict[str, int] = {}
+    for model in _REFERENCING_MODELS:
+        for path, count in db.query(model.file_path, func.count(model.id)).group_by(model.file_path):
+            expected[path] = expected.get(path, 0) + count
+    version = models.ProposalVersion
+    for (attachments_json,) in db.query(version.attachments_json).yield_per(500):
+        for path in _snapshot_paths(attachments_json):
+            expected[path] = expected.get(path, 0) + 1
+    blob = models.UploadBlob
+    fixed = 0
+    for blob_id, file_path, ref_count in db.query(blob.id, blob.file_path, blob.ref_count).all():
+        count = expected.get(file_path, 0)
+        if ref_count != count:
+            db.query(blob).filter(blob.id == blob_id).update({blob.ref_count: count}, synchronize_session=False)
+            fixed += 1
+    db.commit()
+    return fixed
+
+
+def _live_paths(db: Session, candidates: list[str]) -> set[str]:
+    live = set()
+    for model in _REFERENCING_MODELS:
+        live.update(path for (path,) in db.query(model.file_path).filter(model.file_path.in_(candidates)))
+    return live
+
+
+def collect_garbage(
+    db: Session,
+    directory: Path,
+    grace: timedelta | None = None,
+    batch_size: int | None = None,
+) -> dict:
+    """Delete stored uploads nothing refers to any more.
+
+    Candidates come from upload_blobs rows with no references that were last
+    uploaded before the grace period, so neither the uploads folder nor the
+    version history is walked. Each batch is re-checked against attachments
+    and receipts before anything is removed.
+    """
+    grace = grace if grace is not None else timedelta(hours=settings.upload_gc_grace_hours)
+    batch_size = batch_size or settings.upload_gc_batch_size
+    cutoff = datetime.utcnow() - grace
+    blob = models.UploadBlob
+    report = {"checked": 0, "deleted": 0, "reclaimed_bytes": 0, "still_referenced": 0}
+    last_id = 0
+    while True:
+        batch = (
+            db.query(blob.id, blob.file_path, blob.size_bytes)
+            .filter(
+                blob.id > last_id,
+                blob.ref_count <= 0,
+                blob.last_uploaded_at < cutoff,
+            )
+            .order_by(blob.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        live = _live_paths(db, [row.file_path for row in batch])
+        report["checked"] += len(batch)
+        report["still_referenced"] += sum(1 for row in batch if row.file_path in live)
+        for row in batch:
+            if row.file_path in live:
+                continue
+            # The row goes first and only if it is still unreferenced, so a
+            # concurrent attach or re-upload keeps the file.
+            removed = (
+                db.query(blob)
+                .filter(
+                    blob.id == row.id,
+                    blob.ref_count <= 0,
+                    blob.last_uploaded_at < cutoff,
+                )
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            if not removed:
+                continue
+            target = directory / Path(row.file_path).name
+            if target.exists():
+                # Moved aside before the final check: an upload of the same
+                # content may have registered it again since the row went,
+                # and may already rely on the existing file.
+                doomed = directory / f".{target.name}.{uuid4().hex}.gc"
+                os.replace(target, doomed)
+                if db.query(blob.id).filter(blob.file_path == row.file_path).first():
+                    os.replace(doomed, target)
+                    report["still_referenced"] += 1
+                    continue
+                report["reclaimed_bytes"] += doomed.stat().st_size
+                doomed.unlink()
+            report["deleted"] += 1
+    if report["deleted"]:
+        logger.info("Removed %s unused upload(s), %s bytes.", report["deleted"], report["reclaimed_bytes"])
+    return report
+
+
+def adopt_untracked(db: Session, directory: Path) -> int:
+    """Register files that have no upload_blobs row, such as uploads from before
+    content addressing, so the collector can see them. Walks the folder once;
+    returns how many files were added.
+    """
+    known = {path for (path,) in db.query(models.UploadBlob.file_path)}
+    added = 0
+    for path in sorted(directory.iterdir()):
+        if not path.is_file() or path.name.startswith("."):
+            continue
+        file_path = f"uploads/{path.name}"
+        if file_path in known:
+            continue
+        stat = path.stat()
+        modified = datetime.utcfromtimestamp(stat.st_mtime)
+        digest = hashlib.sha256()
+        with path.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        db.add(
+            models.UploadBlob(
+                sha256=digest.hexdigest(),
+                file_path=file_path,
+                size_bytes=stat.st_size,
+                created_at=modified,
+                last_uploaded_at=modified,
+            )
+        )
+        added += 1
+    db.commit()
+    reconcile_ref_counts(db)
+    return added
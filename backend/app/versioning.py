@@ -0,0 +1,288 @@
+import difflib
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, undefer_group
+
+from . import models
+from .config import settings
+
+# Version rows are stored as a full checkpoint every
+# VERSION_CHECKPOINT_INTERVAL versions. The rows in between hold deltas
+# against the previous version:
+#   - record columns (a JSON object of fields) store {"set": {...}, "unset": [...]}
+#     with only the fields that changed;
+#   - list columns store null when unchanged, otherwise the full list.
+
+
+@dataclass(frozen=True)
+class VersionSpec:
+    name: str
+    model: type
+    parent_model: type
+    parent_column: str
+    summary_columns: tuple[str, ...]
+    record_columns: tuple[str, ...]
+    list_columns: tuple[str, ...]
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        return self.record_columns + self.list_columns
+
+
+AGREEMENT = VersionSpec(
+    name="agreement",
+    model=models.ServiceAgreementVersion,
+    parent_model=models.ServiceAgreement,
+    parent_column="agreement_id",
+    summary_columns=("title",),
+    record_columns=("data_json",),
+    list_columns=("sla_items_json",),
+)
+PROPOSAL = VersionSpec(
+    name="proposal",
+    model=models.ProposalVersion,
+    parent_model=models.Proposal,
+    parent_column="proposal_id",
+    summary_columns=("title", "status"),
+    record_columns=("data_json",),
+    list_columns=("requirements_json", "attachments_json"),
+)
+
+_MISSING = object()
+
+_DIFF_CACHE_SIZE = 256
+_DIFF_CONTEXT_LINES = 2
+
+_diff_cache: "OrderedDict[tuple, list[dict]]" = OrderedDict()
+_diff_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_write_stats: dict[str, dict[str, int]] = {}
+
+
+def _dump(value) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _chain(db: Session, spec: VersionSpec, parent_id: int, upto: int | None = None):
+    model = spec.model
+    parent = getattr(model, spec.parent_column)
+    checkpoint_query = db.query(func.max(model.version_number)).filter(
+        parent == parent_id, model.is_checkpoint.is_(True)
+    )
+    if upto is not None:
+        checkpoint_query = checkpoint_query.filter(model.version_number <= upto)
+    start = checkpoint_query.scalar()
+    if start is None:
+        return []
+    query = (
+        db.query(model)
+        .options(undefer_group("payload"))
+        .filter(parent == parent_id, model.version_number >= start)
+    )
+    if upto is not None:
+        query = query.filter(model.version_number <= upto)
+    return query.order_by(model.version_number.asc()).all()
+
+
+def _apply(state: dict | None, version, spec: VersionSpec) -> dict:
+    if version.is_checkpoint or state is None:
+        return {column: json.loads(getattr(version, column)) for column in spec.columns}
+    state = dict(state)
+    for column in spec.record_columns:
+        delta = json.loads(getattr(version, column))
+        record = dict(state[column])
+        record.update(delta.get("set", {}))
+        for key in delta.get("unset", []):
+            record.pop(key, None)
+        state[column] = record
+    for column in spec.list_columns:
+        value = json.loads(getattr(version, column))
+        if value is not None:
+            state[column] = value
+    return state
+
+
+def _replay(versions, spec: VersionSpec) -> dict | None:
+    state = None
+    for version in versions:
+        state = _apply(state, version, spec)
+    return state
+
+
+def load_payload(db: Session, spec: VersionSpec, version) -> dict:
+    """Return the decoded full snapshot of ``version``, keyed by column name."""
+    if version.is_checkpoint:
+        return _apply(None, version, spec)
+    versions = _chain(db, spec, getattr(version, spec.parent_column), version.version_number)
+    return _replay(versions, spec)
+
+
+def encode_payload(
+    db: Session,
+    spec: VersionSpec,
+    parent_id: int,
+    payload: dict[str, str],
+    checkpoint_interval: int | None = None,
+) -> dict:
+    """Return column values for a new version row holding ``payload``.
+
+    ``payload`` maps each column to its full JSON snapshot.
+    """
+    interval = checkpoint_interval or settings.version_checkpoint_interval
+    versions = _chain(db, spec, parent_id)
+    if not versions or len(versions) >= max(1, interval):
+        return {**payload, "is_checkpoint": True}
+    previous = _replay(versions, spec)
+    values = {"is_checkpoint": False}
+    for column in spec.record_columns:
+        old = previous[column]
+        new = json.loads(payload[column])
+        delta = {}
+        changed = {key: value for key, value in new.items() if old.get(key, _MISSING) != value}
+        removed = [key for key in old if key not in new]
+        if changed:
+            delta["set"] = changed
+        if removed:
+            delta["unset"] = removed
+        values[column] = _dump(delta)
+    for column in spec.list_columns:
+        new = json.loads(payload[column])
+        values[column] = "null" if new == previous[column] else payload[column]
+    return values
+
+
+def list_versions(db: Session, spec: VersionSpec, parent_id: int, limit: int, offset: int) -> list[dict]:
+    """Summary rows, newest first, without touching the payload columns."""
+    model = spec.model
+    parent = spec.parent_model
+    parent_column = getattr(model, spec.parent_column)
+    rows = (
+        db.query(
+            model.id,
+            parent_column,
+            model.version_number,
+            *(getattr(model, column) for column in spec.summary_columns),
+            model.created_at,
+            models.User.email.label("created_by_email"),
+            (model.version_number == parent.current_version).label("is_current"),
+        )
+        .join(parent, parent.id == parent_column)
+        .outerjoin(models.User, models.User.id == model.created_by_user_id)
+        .filter(parent_column == parent_id)
+        .order_by(model.version_number.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    return [row._asdict() for row in rows]
+
+
+def get_version_by_number(db: Session, spec: VersionSpec, parent_id: int, version_number: int):
+    model = spec.model
+    return (
+        db.query(model)
+        .filter(getattr(model, spec.parent_column) == parent_id, model.version_number == version_number)
+        .first()
+    )
+
+
+def _field_changes(old: dict, new: dict, prefix: str = "") -> list[dict]:
+    changes = []
+    for key in list(old) + [key for key in new if key not in old]:
+        before = old.get(key)
+        after = new.get(key)
+        if key in old and key in new and before == after:
+            continue
+        change = {
+            "field": f"{prefix}{key}",
+            "change": "added" if key not in old else "removed" if key not in new else "modified",
+        }
+        if isinstance(before, str) and isinstance(after, str) and ("\n" in before or "\n" in after):
+            # Long text: send only the changed lines with a little context.
+            change["lines"] = list(
+                difflib.unified_diff(
+                    before.splitlines(),
+                    after.splitlines(),
+                    n=_DIFF_CONTEXT_LINES,
+                    lineterm="",
+                )
+            )[2:]
+        else:
+            change["old"] = before
+            change["new"] = after
+        changes.append(change)
+    return changes
+
+
+def diff_versions(db: Session, spec: VersionSpec, from_version, to_version) -> list[dict]:
+    """Field-level changes between two versions, memoised per version pair."""
+    # Ids alone can name different content after a restore or reset, so the
+    # stored hashes are part of the key.
+    key = (spec.name, from_version.id, from_version.content_hash, to_version.id, to_version.content_hash)
+    with _diff_lock:
+        cached = _diff_cache.get(key)
+        if cached is not None:
+            _diff_cache.move_to_end(key)
+            return cached
+    before = load_payload(db, spec, from_version)
+    after = load_payload(db, spec, to_version)
+    changes = []
+    for column in spec.record_columns:
+        changes.extend(_field_changes(before[column] or {}, after[column] or {}))
+    for column in spec.list_columns:
+        if before[column] != after[column]:
+            changes.append(
+                {
+                    "field": column.removesuffix("_json"),
+                    "change": "modified",
+                    "old": before[column],
+                    "new": after[column],
+                }
+            )
+    with _diff_lock:
+        _diff_cache[key] = changes
+        while len(_diff_cache) > _DIFF_CACHE_SIZE:
+            _diff_cache.popitem(last=False)
+    return changes
+
+
+def clear_diff_cache():
+    with _diff_lock:
+        _diff_cache.clear()
+
+
+def content_hash(spec: VersionSpec, payload: dict[str, str]) -> str:
+    digest = hashlib.sha256()
+    for column in spec.columns:
+        digest.update(payload[column].encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def latest_version(db: Session, spec: VersionSpec, parent_id: int):
+    model = spec.model
+    return (
+        db.query(model)
+        .filter(getattr(model, spec.parent_column) == parent_id)
+        .order_by(model.version_number.desc())
+        .first()
+    )
+
+
+def record_write(spec: VersionSpec, skipped: bool):
+    with _stats_lock:
+        counts = _write_stats.setdefault(spec.name, {"created": 0, "skipped": 0})
+        counts["skipped" if skipped else "created"] += 1
+
+
+def write_stats() -> dict[str, dict[str, int]]:
+    with _stats_lock:
+        return {
+            spec.name: dict(_write_stats.get(spec.name, {"created": 0, "skipped": 0}))
+            for spec in (AGREEMENT, PROPOSAL)
+        }
@@ -0,0 +1,88 @@
+"""Measure SMTP throughput with and without the connection pool.
+
+Runs a local aiosmtpd server (``pip install aiosmtpd``) and sends the same
+batch of messages over fresh connections and over the pooled transport.
+
+    python scripts/bench_smtp.py --messages 200
+"""
+from argparse import ArgumentParser
+from email.message import EmailMessage
+from pathlib import Path
+import socket
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.smtp_pool import SMTPConfig, SMTPConnectionPool, open_connection  # noqa: E402
+
+
+class _CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 Message accepted for delivery"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _build_message(index: int) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = f"Benchmark {index}"
+    msg["From"] = "bench@localhost"
+    msg["To"] = "client@localhost"
+    msg.set_content("Reminder body\n" * 20)
+    return msg
+
+
+def _send_unpooled(config: SMTPConfig, count: int):
+    for index in range(count):
+        with open_connection(config) as server:
+            server.send_message(_build_message(index))
+
+
+def _send_pooled(config: SMTPConfig, count: int):
+    smtp_pool = SMTPConnectionPool(max_size=2, max_idle_seconds=60)
+    for index in range(count):
+        smtp_pool.send_message(config, _build_message(index))
+    smtp_pool.invalidate()
+
+
+def main():
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        print("aiosmtpd is required: pip install aiosmtpd")
+        return 1
+
+    parser = ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    handler = _CountingHandler()
+    port = _free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        config = SMTPConfig(host="127.0.0.1", port=port, use_tls=False)
+        for label, runner in (("new connection per message", _send_unpooled), ("pooled", _send_pooled)):
+            received_before = handler.received
+            started = time.perf_counter()
+            runner(config, args.messages)
+            elapsed = time.perf_counter() - started
+            delivered = handler.received - received_before
+            print(f"{label}: {delivered} messages in {elapsed:.2f}s ({delivered / elapsed:.1f} msg/s)")
+    finally:
+        controller.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Measure agreement version storage and restore latency.
+
+Creates a throwaway SQLite database, saves an agreement with long text fields
+``--versions`` times (editing one field per save), then reports stored size
+against full snapshots and how long reconstructing/restoring versions takes.
+
+    python scripts/bench_versions.py --versions 200 --interval 20 --compression zlib
+"""
+from argparse import ArgumentParser
+import json
+import os
+from pathlib import Path
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+LONG_FIELDS = (
+    "scope_of_services",
+    "availability",
+    "access_requirements",
+    "fees_payments",
+    "data_protection",
+    "termination",
+    "content",
+)
+
+
+def _paragraphs(rng: random.Random, count: int) -> str:
+    words = ("service", "client", "data", "support", "hours", "notice", "party", "term", "fees")
+    return "\n\n".join(
+        " ".join(rng.choice(words) for _ in range(80)) for _ in range(count)
+    )
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--versions", type=int, default=200)
+    parser.add_argument("--interval", type=int, default=20)
+    parser.add_argument("--compression", choices=("zlib", "zstd", "none"), default="zlib")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-versions-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.environ["VERSION_CHECKPOINT_INTERVAL"] = str(args.interval)
+    os.environ["VERSION_COMPRESSION"] = args.compression
+
+    from sqlalchemy import func
+
+    from app import crud, models, schemas, versioning
+    from app.db import Base, SessionLocal, engine
+
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    db = SessionLocal()
+    try:
+        client = crud.create_client(db, schemas.ClientCreate(name="Benchmark Ltd"))
+        agreement = crud.create_agreement(
+            db,
+            client.id,
+            schemas.AgreementCreate(
+                title="Managed services agreement",
+                sla_items=[{"sla": "Priority 1 response", "timescale": "1 hour"}],
+                **{field: _paragraphs(rng, 6) for field in LONG_FIELDS},
+            ),
+        )
+
+        save_times = []
+        for index in range(args.versions - 1):
+            field = rng.choice(LONG_FIELDS)
+            text = getattr(agreement, field)
+            cut = rng.randrange(len(text))
+            update = {field: f"{text[:cut]} amended {index} {text[cut:]}"}
+            started = time.perf_counter()
+            agreement = crud.update_agreement(db, agreement, schemas.AgreementUpdate(**update))
+            save_times.append(time.perf_counter() - started)
+
+        versions = (
+            db.query(models.ServiceAgreementVersion)
+            .filter(models.ServiceAgreementVersion.agreement_id == agreement.id)
+            .order_by(models.ServiceAgreementVersion.version_number)
+            .all()
+        )
+        stored_bytes = (
+            db.query(
+                func.sum(
+                    sum(
+                        func.length(getattr(models.ServiceAgreementVersion, column))
+                        for column in versioning.AGREEMENT.columns
+                    )
+                )
+            )
+            .filter(models.ServiceAgreementVersion.agreement_id == agreement.id)
+            .scalar()
+        )
+        checkpoints = sum(1 for version in versions if version.is_checkpoint)
+        load_times = []
+        full_bytes = 0
+        for version in versions:
+            started = time.perf_counter()
+            payload = versioning.load_payload(db, versioning.AGREEMENT, version)
+            load_times.append(time.perf_counter() - started)
+            full_bytes += sum(len(json.dumps(value)) for value in payload.values())
+
+        restore_times = []
+        for version in rng.sample(versions, min(20, len(versions))):
+            started = time.perf_counter()
+            agreement = crud.restore_agreement_version(db, agreement, version)
+            restore_times.append(time.perf_counter() - started)
+    finally:
+        db.close()
+
+    print(
+        f"versions: {len(versions)} ({checkpoints} checkpoints, interval {args.interval}, "
+        f"{args.compression} compression)"
+    )
+    print(
+        f"storage: {stored_bytes / 1024:.1f} KiB on disk vs {full_bytes / 1024:.1f} KiB as full snapshots "
+        f"({stored_bytes / full_bytes:.1%})"
+    )
+    print(f"save: mean {statistics.mean(save_times) * 1000:.2f} ms")
+    print(
+        f"reconstruct: mean {statistics.mean(load_times) * 1000:.2f} ms, "
+        f"max {max(load_times) * 1000:.2f} ms"
+    )
+    print(
+        f"restore: mean {statistics.mean(restore_times) * 1000:.2f} ms, "
+        f"max {max(restore_times) * 1000:.2f} ms"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Hammer comment reactions from many threads and verify the counters.
+
+Creates a throwaway SQLite database, lets ``--users`` users toggle like and
+dislike on one comment concurrently, then checks that like_count and
+dislike_count match the reaction rows (and that reconciliation agrees).
+
+    python scripts/check_reaction_concurrency.py --users 20 --clicks 25
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import random
+import sys
+import tempfile
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--clicks", type=int, default=25)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="reaction-concurrency-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/check.db"
+
+    from app import comments, crud, models, schemas
+    from app.db import Base, SessionLocal, engine
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        users = [
+            models.User(email=f"user{index}@example.com", password_hash="x", role="user")
+            for index in range(args.users)
+        ]
+        db.add_all(users)
+        client = crud.create_client(db, schemas.ClientCreate(name="Concurrency Ltd"))
+        agreement = crud.create_agreement(db, client.id, schemas.AgreementCreate(title="Agreement"))
+        comment = models.AgreementVersionComment(
+            agreement_version_id=agreement.versions[0].id, field_key="title", comment="Check"
+        )
+        db.add(comment)
+        db.commit()
+        user_ids = [user.id for user in users]
+        comment_id = comment.id
+    finally:
+        db.close()
+
+    def click(user_id: int):
+        rng = random.Random(user_id)
+        session = SessionLocal()
+        try:
+            for _ in range(args.clicks):
+                comments.toggle_reaction(
+                    session, comments.AGREEMENT, comment_id, user_id, rng.choice(("like", "dislike"))
+                )
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        list(executor.map(click, user_ids))
+
+    db = SessionLocal()
+    try:
+        comment = db.get(models.AgreementVersionComment, comment_id)
+        reactions = (
+            db.query(models.AgreementVersionCommentReaction)
+            .filter(models.AgreementVersionCommentReaction.comment_id == comment_id)
+            .all()
+        )
+        likes = sum(1 for reaction in reactions if reaction.reaction == "like")
+        dislikes = len(reactions) - likes
+        counters = (comment.like_count, comment.dislike_count)
+        fixed = comments.reconcile_reaction_counts(db)
+    finally:
+        db.close()
+
+    print(f"{args.users} users x {args.clicks} clicks")
+    print(f"counters: likes={counters[0]} dislikes={counters[1]}")
+    print(f"reaction rows: likes={likes} dislikes={dislikes}")
+    print(f"rows fixed by reconciliation: {fixed}")
+    if counters != (likes, dislikes) or fixed:
+        print("FAIL: counters drifted from reaction rows")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""Delete stored uploads that nothing refers to any more.
+
+    python scripts/gc_uploads.py [--adopt]
+
+--adopt first registers files in the uploads folder that the collector does
+not know about yet, such as uploads from before content addressing.
+"""
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app import backups, uploads  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+
+
+def main():
+    db = SessionLocal()
+    try:
+        if "--adopt" in sys.argv[1:]:
+            print(f"Registered {uploads.adopt_untracked(db, backups.UPLOADS_DIR)} untracked upload(s).")
+        report = uploads.collect_garbage(db, backups.UPLOADS_DIR)
+    finally:
+        db.close()
+    print(
+        f"Checked {report['checked']} unreferenced upload(s): deleted {report['deleted']}, "
+        f"{report['still_referenced']} still in use, {report['reclaimed_bytes']} bytes reclaimed."
+    )
+
+
+if __name__ == "__main__":
+    main()
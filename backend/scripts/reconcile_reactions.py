@@ -0,0 +1,25 @@
+"""Recompute comment like/dislike counters from the reaction tables.
+
+    python scripts/reconcile_reactions.py
+"""
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app import comments  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+
+
+def main():
+    db = SessionLocal()
+    try:
+        fixed = comments.reconcile_reaction_counts(db)
+    finally:
+        db.close()
+    print(f"Reconciled {fixed} comment(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""Recompute stored upload reference counts from attachments, receipts and version snapshots.
+
+    python scripts/reconcile_uploads.py
+"""
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app import uploads  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+
+
+def main():
+    db = SessionLocal()
+    try:
+        fixed = uploads.reconcile_ref_counts(db)
+    finally:
+        db.close()
+    print(f"Reconciled {fixed} upload(s).")
+
+
+if __name__ == "__main__":
+    main()
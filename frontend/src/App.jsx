@@ -263,14 +263,14 @@ export default function App() {
         const url = URL.createObjectURL(blob);
         const link = document.createElement("a");
         link.href = url;
-        link.download = filename || "cms-backup.tar.gz";
+        link.download = filename || "cms-backup.tar";
         link.click();
         URL.revokeObjectURL(url);
       }
       if (store && download) {
         handleSettingsSaved("Backup created and stored.");
       } else if (store) {
-        handleSettingsSaved("Backup stored.");
+        handleSettingsSaved("Backup started. It will appear in the restore list once complete.");
       } else {
         handleSettingsSaved("Backup created.");
       }
@@ -843,31 +843,33 @@ export default function App() {
     async (rows) => {
       if (!rows?.length) return;
       try {
-        const results = await Promise.allSettled(
-          rows.map((row) =>
-            api.draftEmail({
-              entity_type: "invoice",
-              entity_id: row.id,
-              to_email: getEntityEmail("invoice", row.id),
-              send: true,
-            })
-          )
-        );
-        const successes = results.filter((result) => result.status === "fulfilled").length;
-        const failures = results.length - successes;
+        let run = await api.startInvoiceReminders({
+          invoice_ids: rows.map((row) => row.id),
+        });
+        while (run.status === "running") {
+          await new Promise((resolve) => setTimeout(resolve, 1000));
+          run = await api.getInvoiceReminderRun(run.id);
+        }
+        const successes = run.sent_invoices;
+        const failures = run.total_invoices - successes;
+        // Only overdue, unpaid invoices are picked up by the run.
+        const notOverdue = rows.length - run.total_invoices;
+        const skippedNote = notOverdue ? ` Skipped ${notOverdue} not overdue.` : "";
         if (successes) {
           await loadAll();
         }
-        if (failures) {
-          toast.error(`Sent ${successes}. ${failures} failed.`);
+        if (!run.total_invoices) {
+          toast.error("No overdue invoices selected.");
+        } else if (failures) {
+          toast.error(`Sent ${successes}. ${failures} failed.${skippedNote}`);
         } else {
-          toast.success(`Sent ${successes} reminder${successes === 1 ? "" : "s"}.`);
+          toast.success(`Sent ${successes} reminder${successes === 1 ? "" : "s"}.${skippedNote}`);
         }
       } catch (error) {
         toast.error(error.message || "Unable to send reminders.");
       }
     },
-    [getEntityEmail, loadAll]
+    [loadAll]
   );
 
   const handleBulkDeleteQuotes = useCallback(
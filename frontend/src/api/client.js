@@ -78,9 +78,12 @@ const api = {
   updateAgreement: (id, payload) =>
     request(`/agreements/${id}`, { method: "PUT", body: JSON.stringify(payload) }),
   deleteAgreement: (id) => request(`/agreements/${id}`, { method: "DELETE" }),
-  listAgreementVersions: (id) => request(`/agreements/${id}/versions`),
+  listAgreementVersions: (id, { limit = 50, offset = 0 } = {}) =>
+    request(`/agreements/${id}/versions?limit=${limit}&offset=${offset}`),
+  getAgreementVersion: (agreementId, versionId) => request(`/agreements/${agreementId}/versions/${versionId}`),
   restoreAgreementVersion: (agreementId, versionId) =>
     request(`/agreements/${agreementId}/versions/${versionId}/restore`, { method: "POST" }),
+  summarizeAgreementComments: (versionId) => request(`/agreements/versions/${versionId}/comments/summary`),
   listAgreementComments: (versionId, fieldKey) =>
     request(
       `/agreements/versions/${versionId}/comments${
@@ -118,9 +121,12 @@ const api = {
   updateProposal: (id, payload) =>
     request(`/proposals/${id}`, { method: "PUT", body: JSON.stringify(payload) }),
   deleteProposal: (id) => request(`/proposals/${id}`, { method: "DELETE" }),
-  listProposalVersions: (id) => request(`/proposals/${id}/versions`),
+  listProposalVersions: (id, { limit = 50, offset = 0 } = {}) =>
+    request(`/proposals/${id}/versions?limit=${limit}&offset=${offset}`),
+  getProposalVersion: (proposalId, versionId) => request(`/proposals/${proposalId}/versions/${versionId}`),
   restoreProposalVersion: (proposalId, versionId) =>
     request(`/proposals/${proposalId}/versions/${versionId}/restore`, { method: "POST" }),
+  summarizeProposalComments: (versionId) => request(`/proposals/versions/${versionId}/comments/summary`),
   listProposalComments: (versionId, fieldKey) =>
     request(
       `/proposals/versions/${versionId}/comments${
@@ -150,6 +156,11 @@ const api = {
     }),
   deleteProposalComment: (commentId) =>
     request(`/proposals/comments/${commentId}`, { method: "DELETE" }),
+  listNotifications: ({ unreadOnly = false, limit = 50, offset = 0 } = {}) =>
+    request(`/notifications?unread_only=${unreadOnly}&limit=${limit}&offset=${offset}`),
+  getUnreadNotificationCount: () => request("/notifications/unread-count"),
+  markNotificationRead: (id) => request(`/notifications/${id}/read`, { method: "POST" }),
+  markAllNotificationsRead: () => request("/notifications/read-all", { method: "POST" }),
   uploadProposalAssets: (files) => {
     const formData = new FormData();
     files.forEach((file) => formData.append("files", file));
@@ -172,6 +183,9 @@ const api = {
   deleteExpense: (id) => request(`/expenses/${id}`, { method: "DELETE" }),
   draftEmail: (payload) =>
     request("/email/draft", { method: "POST", body: JSON.stringify(payload) }),
+  startInvoiceReminders: (payload) =>
+    request("/invoices/reminders", { method: "POST", body: JSON.stringify(payload) }),
+  getInvoiceReminderRun: (runId) => request(`/invoices/reminders/${runId}`),
   createBackup: async ({ download = true, store = true } = {}) => {
     if (download) {
       const response = await fetch(`${API_URL}/admin/backup`, {
@@ -186,7 +200,7 @@ const api = {
       }
       const disposition = response.headers.get("content-disposition") || "";
       const filenameMatch = disposition.match(/filename="?([^"]+)"?/);
-      const filename = filenameMatch ? filenameMatch[1] : "cms-backup.tar.gz";
+      const filename = filenameMatch ? filenameMatch[1] : "cms-backup.tar";
       const blob = await response.blob();
       return { blob, filename, stored: store };
     }
@@ -197,13 +211,15 @@ const api = {
     });
   },
   listBackups: () => request("/admin/backups"),
+  getBackupJob: (jobId) => request(`/admin/backups/jobs/${jobId}`),
   restoreBackup: (filename) =>
     request("/admin/restore", { method: "POST", body: JSON.stringify({ filename }) }),
-  restoreBackupUpload: (file) => {
-    const formData = new FormData();
-    formData.append("file", file);
-    return requestForm("/admin/restore/upload", formData);
-  },
+  restoreBackupUpload: (file) =>
+    request(`/admin/restore/upload?filename=${encodeURIComponent(file.name)}`, {
+      method: "POST",
+      headers: { "Content-Type": "application/octet-stream" },
+      body: file,
+    }),
   resetData: () => request("/admin/reset", { method: "POST" }),
   resetWorkspace: () => request("/admin/reset-workspace", { method: "POST" }),
   authStatus: () => request("/auth/status"),
@@ -28,8 +28,9 @@ const useEmailDraft = ({ onError, onCopySuccess, onCopyError, onSendSuccess, isA
           send: emailForm.send,
         };
         const response = await api.draftEmail(payload);
-        setEmailResponse(response);
-        if (response?.sent && onSendSuccess) {
+        // Queued emails are rendered by the outbox worker, so there is no draft to show.
+        setEmailResponse(response?.queued ? null : response);
+        if ((response?.sent || response?.queued) && onSendSuccess) {
           onSendSuccess(response.message || "Email sent.");
         }
         setEmailDialogOpen(false);
@@ -17,6 +17,8 @@ import { formatDate } from "@/utils/format";
 import { parseISO } from "date-fns";
 import { MessageSquare } from "lucide-react";
 
+const VERSION_PAGE_SIZE = 50;
+
 export default function AgreementsPage({
   agreements,
   clients,
@@ -36,6 +38,7 @@ export default function AgreementsPage({
   const [stepIndex, setStepIndex] = useState(0);
   const [versionDialogOpen, setVersionDialogOpen] = useState(false);
   const [versions, setVersions] = useState([]);
+  const [hasMoreVersions, setHasMoreVersions] = useState(false);
   const [commentDialog, setCommentDialog] = useState({ open: false, fieldKey: "", fieldLabel: "" });
   const [commentCounts, setCommentCounts] = useState({});
   const [prefetchedComments, setPrefetchedComments] = useState({});
@@ -140,8 +143,9 @@ export default function AgreementsPage({
     if (!agreementDialogOpen || !editingAgreementId) return;
     const loadVersions = async () => {
       try {
-        const data = await api.listAgreementVersions(editingAgreementId);
+        const data = await api.listAgreementVersions(editingAgreementId, { limit: VERSION_PAGE_SIZE });
         setVersions(data || []);
+        setHasMoreVersions((data || []).length === VERSION_PAGE_SIZE);
       } catch (error) {
         toast.error(error.message || "Unable to load agreement versions.");
       }
@@ -149,13 +153,25 @@ export default function AgreementsPage({
     loadVersions();
   }, [agreementDialogOpen, editingAgreementId]);
 
+  const handleLoadMoreVersions = async () => {
+    try {
+      const data = await api.listAgreementVersions(editingAgreementId, {
+        limit: VERSION_PAGE_SIZE,
+        offset: versions.length,
+      });
+      setVersions((prev) => [...prev, ...(data || [])]);
+      setHasMoreVersions((data || []).length === VERSION_PAGE_SIZE);
+    } catch (error) {
+      toast.error(error.message || "Unable to load agreement versions.");
+    }
+  };
+
   const loadCommentCounts = async (versionId) => {
     if (!versionId) return;
     try {
-      const data = await api.listAgreementComments(versionId);
-      const counts = (data || []).reduce((acc, comment) => {
-        const key = comment.field_key || "unknown";
-        acc[key] = (acc[key] || 0) + 1;
+      const data = await api.summarizeAgreementComments(versionId);
+      const counts = (data || []).reduce((acc, summary) => {
+        acc[summary.field_key || "unknown"] = summary.total;
         return acc;
       }, {});
       setCommentCounts(counts);
@@ -253,8 +269,9 @@ export default function AgreementsPage({
         setAgreementForm(nextForm);
         setInitialSnapshot(normalizeAgreement(nextForm));
       }
-      const data = await api.listAgreementVersions(editingAgreementId);
+      const data = await api.listAgreementVersions(editingAgreementId, { limit: VERSION_PAGE_SIZE });
       setVersions(data || []);
+      setHasMoreVersions((data || []).length === VERSION_PAGE_SIZE);
       await loadCommentCounts(data?.find((item) => item.is_current)?.id);
     } catch (error) {
       toast.error(error.message || "Unable to restore version.");
@@ -788,6 +805,11 @@ export default function AgreementsPage({
             ) : (
               <p className="text-sm text-muted-foreground">No versions yet.</p>
             )}
+            {hasMoreVersions ? (
+              <Button type="button" size="sm" variant="ghost" onClick={handleLoadMoreVersions}>
+                Load older versions
+              </Button>
+            ) : null}
           </div>
         </DialogContent>
       </Dialog>
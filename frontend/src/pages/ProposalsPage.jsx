@@ -25,6 +25,8 @@ import FieldCommentsDialog from "@/components/field-comments-dialog";
 import { parseISO } from "date-fns";
 import { MessageSquare } from "lucide-react";
 
+const VERSION_PAGE_SIZE = 50;
+
 export default function ProposalsPage({
   proposals,
   clients,
@@ -47,6 +49,7 @@ export default function ProposalsPage({
   const [uploading, setUploading] = useState(false);
   const [versionDialogOpen, setVersionDialogOpen] = useState(false);
   const [versions, setVersions] = useState([]);
+  const [hasMoreVersions, setHasMoreVersions] = useState(false);
   const [commentDialog, setCommentDialog] = useState({ open: false, fieldKey: "", fieldLabel: "" });
   const [commentCounts, setCommentCounts] = useState({});
   const [prefetchedComments, setPrefetchedComments] = useState({});
@@ -224,8 +227,9 @@ export default function ProposalsPage({
     if (!proposalDialogOpen || !editingProposalId) return;
     const loadVersions = async () => {
       try {
-        const data = await api.listProposalVersions(editingProposalId);
+        const data = await api.listProposalVersions(editingProposalId, { limit: VERSION_PAGE_SIZE });
         setVersions(data || []);
+        setHasMoreVersions((data || []).length === VERSION_PAGE_SIZE);
       } catch (error) {
         toast.error(error.message || "Unable to load proposal versions.");
       }
@@ -233,13 +237,25 @@ export default function ProposalsPage({
     loadVersions();
   }, [proposalDialogOpen, editingProposalId]);
 
+  const handleLoadMoreVersions = async () => {
+    try {
+      const data = await api.listProposalVersions(editingProposalId, {
+        limit: VERSION_PAGE_SIZE,
+        offset: versions.length,
+      });
+      setVersions((prev) => [...prev, ...(data || [])]);
+      setHasMoreVersions((data || []).length === VERSION_PAGE_SIZE);
+    } catch (error) {
+      toast.error(error.message || "Unable to load proposal versions.");
+    }
+  };
+
   const loadCommentCounts = async (versionId) => {
     if (!versionId) return;
     try {
-      const data = await api.listProposalComments(versionId);
-      const counts = (data || []).reduce((acc, comment) => {
-        const key = comment.field_key || "unknown";
-        acc[key] = (acc[key] || 0) + 1;
+      const data = await api.summarizeProposalComments(versionId);
+      const counts = (data || []).reduce((acc, summary) => {
+        acc[summary.field_key || "unknown"] = summary.total;
         return acc;
       }, {});
       setCommentCounts(counts);
@@ -324,8 +340,9 @@ export default function ProposalsPage({
         setProposalForm(nextForm);
         setInitialSnapshot(normalizeProposal(nextForm));
       }
-      const data = await api.listProposalVersions(editingProposalId);
+      const data = await api.listProposalVersions(editingProposalId, { limit: VERSION_PAGE_SIZE });
       setVersions(data || []);
+      setHasMoreVersions((data || []).length === VERSION_PAGE_SIZE);
       await loadCommentCounts(data?.find((item) => item.is_current)?.id);
     } catch (error) {
       toast.error(error.message || "Unable to restore version.");
@@ -757,6 +774,11 @@ export default function ProposalsPage({
             ) : (
               <p className="text-sm text-muted-foreground">No versions yet.</p>
             )}
+            {hasMoreVersions ? (
+              <Button type="button" size="sm" variant="ghost" onClick={handleLoadMoreVersions}>
+                Load older versions
+              </Button>
+            ) : null}
           </div>
         </DialogContent>
       </Dialog>
@@ -390,7 +390,7 @@ export default function SettingsPage({
               <div>
                 <p className="font-medium text-foreground">Download backup</p>
                 <p className="text-sm text-muted-foreground">
-                  Creates a tar.gz of the database and uploads.
+                  Creates a backup archive of the database and uploads.
                 </p>
               </div>
             <Dialog open={backupDialogOpen} onOpenChange={setBackupDialogOpen}>
@@ -409,7 +409,7 @@ export default function SettingsPage({
                     <div>
                       <p className="font-medium text-foreground">Download now</p>
                       <p className="text-sm text-muted-foreground">
-                        Exports a tar.gz to your device.
+                        Exports a backup archive to your device.
                       </p>
                     </div>
                     <Switch checked={backupDownload} onCheckedChange={setBackupDownload} />
@@ -454,7 +454,7 @@ export default function SettingsPage({
             <div>
               <p className="font-medium text-foreground">Restore backup</p>
               <p className="text-sm text-muted-foreground">
-                Restore from a server backup or upload a tar.gz file.
+                Restore from a server backup or upload a backup file.
               </p>
             </div>
             <Dialog
@@ -527,7 +527,7 @@ export default function SettingsPage({
                     <p className="text-sm font-medium text-foreground">Restore from upload</p>
                     <Input
                       type="file"
-                      accept=".tar.gz"
+                      accept=".tar,.tar.gz"
                       onChange={(event) => setRestoreFile(event.target.files?.[0] || null)}
                     />
                     <Button